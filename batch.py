@@ -0,0 +1,170 @@
+import argparse
+import fnmatch
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from cache import ProgramCache, DEFAULT_CACHE_DIR, text_digest
+from spi import BulkLexer, RecoveringParser, SemanticAnalyzer, LEXERS, PARSERS, make_interpreter
+
+_options = None
+_program_cache = None
+
+
+def init_worker(options):
+    global _options, _program_cache
+    _options = options
+    _program_cache = None
+    if options["cache_dir"] is not None:
+        _program_cache = ProgramCache(options["cache_dir"])
+
+
+def find_programs(paths, pattern):
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, file_names in os.walk(path):
+                subdirectories.sort()
+                for file_name in sorted(fnmatch.filter(file_names, pattern)):
+                    yield os.path.join(directory, file_name)
+        else:
+            yield path
+
+
+def run_program(path):
+    options = _options
+    program_cache = _program_cache
+    result = {"path": path, "ok": False, "memory": None, "error": None, "timings": {}}
+    timings = result["timings"]
+    phase = "read"
+    try:
+        start = time.perf_counter()
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        timings[phase] = time.perf_counter() - start
+
+        tree = source_digest = None
+        if program_cache is not None and not options["check"]:
+            phase = "load"
+            start = time.perf_counter()
+            source_digest = text_digest(text)
+            entry = program_cache.get(source_digest, options["optimize"])
+            if entry is not None:
+                tree = entry[0]
+            result["cached"] = tree is not None
+            timings[phase] = time.perf_counter() - start
+
+        if tree is None:
+            lexer = LEXERS[options["lexer"]](text)
+            if isinstance(lexer, BulkLexer) and not options["check"]:
+                phase = "lex"
+                start = time.perf_counter()
+                lexer.tokenize()
+                timings[phase] = time.perf_counter() - start
+
+            phase = "parse"
+            start = time.perf_counter()
+            if options["check"]:
+                parser = RecoveringParser(lexer)
+                parser.parse()
+                timings[phase] = time.perf_counter() - start
+                result["diagnostics"] = [{"line": line, "column": column, "message": message}
+                                         for line, column, message in parser.diagnostics()]
+                result["ok"] = not parser.errors
+                return result
+            tree = PARSERS[options["parser"]](lexer).parse()
+            timings[phase] = time.perf_counter() - start
+
+            phase = "analyze"
+            start = time.perf_counter()
+            SemanticAnalyzer().visit(tree)
+            if options["optimize"]:
+                from optimizer import ConstantFolder, CommonSubexpressionEliminator, DeadStoreEliminator
+                tree = CommonSubexpressionEliminator().optimize(ConstantFolder().optimize(tree))
+                tree = DeadStoreEliminator().optimize(tree)
+            timings[phase] = time.perf_counter() - start
+
+            if source_digest is not None:
+                phase = "store"
+                start = time.perf_counter()
+                program_cache.put(source_digest, tree, optimized=options["optimize"])
+                timings[phase] = time.perf_counter() - start
+
+        phase = "compile"
+        start = time.perf_counter()
+        interpreter = make_interpreter(tree, options["backend"])
+        timings[phase] = time.perf_counter() - start
+
+        phase = "interpret"
+        start = time.perf_counter()
+        interpreter.interpret()
+        timings[phase] = time.perf_counter() - start
+    except Exception as e:
+        result["error"] = {"phase": phase, "type": type(e).__name__, "message": str(e)}
+        return result
+
+    result["ok"] = True
+    result["memory"] = dict(interpreter.GLOBAL_MEMORY)
+    return result
+
+
+def run_batch(paths, options, workers=None, chunksize=1, ordered=False):
+    if workers == 1:
+        init_worker(options)
+        for result in map(run_program, paths):
+            yield result
+        return
+
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(options,)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(run_program, paths, chunksize):
+            yield result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run many Pascal programs and stream the results as JSON lines")
+    arg_parser.add_argument("paths", nargs="+", help="program files or directories to search for programs")
+    arg_parser.add_argument("--pattern", default="*.pas", help="file name pattern used inside directories")
+    arg_parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                            help="number of worker processes (1 runs everything in this process)")
+    arg_parser.add_argument("--chunksize", type=int, default=1, help="programs handed to a worker at a time")
+    arg_parser.add_argument("--ordered", action="store_true", help="report results in input order")
+    arg_parser.add_argument("--backend", choices=("tree", "stackless", "vm", "closure"), default="tree")
+    arg_parser.add_argument("--parser", choices=sorted(PARSERS), default="recursive")
+    arg_parser.add_argument("--lexer", choices=sorted(LEXERS), default="bulk")
+    arg_parser.add_argument("-O", "--optimize", action="store_true",
+                            help="fold constant expressions and reuse common subexpressions")
+    arg_parser.add_argument("--check", action="store_true",
+                            help="only parse each program and report every syntax error instead of running it")
+    arg_parser.add_argument("--cache-dir", help="directory of the compiled program cache (default ~/.cache/spi)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="always lex, parse and analyze from scratch")
+    arg_parser.add_argument("-o", "--output", help="write JSON lines to this file instead of stdout")
+    args = arg_parser.parse_args()
+
+    options = {"backend": args.backend, "parser": args.parser, "lexer": args.lexer, "optimize": args.optimize,
+               "check": args.check, "cache_dir": None if args.no_cache else args.cache_dir or DEFAULT_CACHE_DIR}
+    output = open(args.output, "w") if args.output else sys.stdout
+    start = time.perf_counter()
+    total = failed = cached = 0
+    try:
+        for result in run_batch(find_programs(args.paths, args.pattern), options, args.workers, args.chunksize,
+                                args.ordered):
+            total += 1
+            if not result["ok"]:
+                failed += 1
+            if result.get("cached"):
+                cached += 1
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print("%d programs, %d from cache, %d failed in %.2fs" % (total, cached, failed, time.perf_counter() - start),
+          file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
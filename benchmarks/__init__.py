@@ -0,0 +1,3 @@
+from benchmarks.generator import ProgramGenerator, generate_program
+
+__all__ = ["ProgramGenerator", "generate_program"]
@@ -0,0 +1,110 @@
+import random
+
+
+class ProgramGenerator(object):
+    def __init__(self, statements=1000, expression_depth=3, variables=20, procedure_depth=2, seed=0,
+                 call_ratio=0.05, recursion_depth=50):
+        self.statements = statements
+        self.expression_depth = expression_depth
+        self.variables = max(variables, 2)
+        self.procedure_depth = procedure_depth
+        self.call_ratio = call_ratio if procedure_depth > 0 else 0.0
+        self.recursion_depth = recursion_depth
+        self.random = random.Random(seed)
+        real_count = max(self.variables // 4, 1)
+        self.integer_vars = ["v%d" % i for i in range(self.variables - real_count)]
+        self.real_vars = ["r%d" % i for i in range(real_count)]
+
+    def linear_expression(self, names, depth):
+        # Builds a linear combination of variables and returns it together with the
+        # sum of its coefficients, so the caller can divide the result back down and
+        # keep values from growing across statements.
+        rand = self.random
+        if depth <= 0 or rand.random() < 0.15:
+            name = rand.choice(names)
+            coefficient = rand.randint(1, 3)
+            if coefficient == 1:
+                return name, 1
+            return "%d * %s" % (coefficient, name), coefficient
+        left, left_weight = self.linear_expression(names, depth - 1)
+        right, right_weight = self.linear_expression(names, depth - 1)
+        op = rand.choice(("+", "-"))
+        if rand.random() < 0.3:
+            return "(%s %s %s)" % (left, op, right), left_weight + right_weight
+        return "%s %s %s" % (left, op, right), left_weight + right_weight
+
+    def integer_assignment(self, target, names):
+        expression, weight = self.linear_expression(names, self.expression_depth)
+        return "%s := (%s + %d) div %d" % (target, expression, self.random.randint(0, 9), weight + 1)
+
+    def real_assignment(self, target, names):
+        expression, weight = self.linear_expression(names, self.expression_depth)
+        return "%s := (%s) / %d.5" % (target, expression, weight)
+
+    def procedure(self, level, indent, visible):
+        param = "p%d" % level
+        local = "l%d" % level
+        names = visible + [param, local]
+        lines = [
+            "%sprocedure Proc%d(%s : integer);" % (indent, level, param),
+            "%s   var %s : integer;" % (indent, local),
+        ]
+        if level < self.procedure_depth:
+            lines.extend(self.procedure(level + 1, indent + "   ", names))
+        lines.append("%sbegin" % indent)
+        lines.append("%s   %s := %s;" % (indent, local, param))
+        if level < self.procedure_depth:
+            lines.append("%s   %s;" % (indent, self.integer_assignment(local, names)))
+            lines.append("%s   Proc%d(%s)" % (indent, level + 1, local))
+        else:
+            lines.append("%s   %s" % (indent, self.integer_assignment(local, names)))
+        lines.append("%send;" % indent)
+        return lines
+
+    def recursive_procedure(self):
+        # Every call pushes a fresh frame, so deep calls exercise the call stack
+        # rather than the expression evaluator.
+        return [
+            "   procedure Recurse(n : integer);",
+            "      var depth : integer;",
+            "   begin",
+            "      depth := n - 1;",
+            "      if depth > 0 then",
+            "         Recurse(depth)",
+            "   end;",
+        ]
+
+    def call(self):
+        if self.recursion_depth > 0 and self.random.random() < 0.5:
+            return "Recurse(%d)" % self.recursion_depth
+        expression, weight = self.linear_expression(self.integer_vars, self.expression_depth)
+        return "Proc1((%s) div %d)" % (expression, weight)
+
+    def generate(self):
+        lines = ["program Bench;"]
+        lines.append("   var %s : integer;" % ", ".join(self.integer_vars))
+        lines.append("   var %s : real;" % ", ".join(self.real_vars))
+        if self.procedure_depth > 0:
+            lines.extend(self.procedure(1, "   ", list(self.integer_vars)))
+        if self.call_ratio > 0 and self.recursion_depth > 0:
+            lines.extend(self.recursive_procedure())
+        lines.append("begin")
+        statements = ["%s := %d" % (name, index + 1) for index, name in enumerate(self.integer_vars)]
+        statements.extend("%s := %d.25" % (name, index + 1) for index, name in enumerate(self.real_vars))
+        all_vars = self.integer_vars + self.real_vars
+        for _ in range(self.statements):
+            if self.random.random() < self.call_ratio:
+                statements.append(self.call())
+            elif self.random.random() < 0.75:
+                statements.append(self.integer_assignment(self.random.choice(self.integer_vars), self.integer_vars))
+            else:
+                statements.append(self.real_assignment(self.random.choice(self.real_vars), all_vars))
+        lines.append(";\n".join("   " + statement for statement in statements))
+        lines.append("end.")
+        return "\n".join(lines)
+
+
+def generate_program(statements=1000, expression_depth=3, variables=20, procedure_depth=2, seed=0, call_ratio=0.05,
+                     recursion_depth=50):
+    return ProgramGenerator(statements, expression_depth, variables, procedure_depth, seed, call_ratio,
+                            recursion_depth).generate()
@@ -0,0 +1,93 @@
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from spi import BulkLexer, Parser, SemanticAnalyzer, AST
+from flatast import FlatAST, FlatInterpreter
+from benchmarks.generator import generate_program
+
+
+class DictNode(object):
+    # stands in for the AST classes before they declared __slots__: the same attributes,
+    # kept in a per-instance dictionary
+    def __init__(self, fields):
+        for name, value in fields:
+            setattr(self, name, value)
+
+
+def tree_parts(tree):
+    nodes = []
+    lists = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            lists.append(node)
+            stack.extend(node)
+        elif isinstance(node, AST):
+            nodes.append(node)
+            for name in node.__slots__:
+                value = getattr(node, name, None)
+                if isinstance(value, (AST, list)):
+                    stack.append(value)
+    return nodes, lists
+
+
+def fields(node):
+    return [(name, getattr(node, name)) for name in node.__slots__ if hasattr(node, name)]
+
+
+def traced(function, *args):
+    # bytes still allocated by function's result once it returns
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def measure(text):
+    tree = Parser(BulkLexer(text)).parse()
+    SemanticAnalyzer().visit(tree)
+    nodes, lists = tree_parts(tree)
+    list_bytes = sum(sys.getsizeof(children) for children in lists)
+    dict_bytes, copies = traced(lambda: [DictNode(fields(node)) for node in nodes])
+    dict_bytes -= sys.getsizeof(copies)
+    slot_bytes = sum(sys.getsizeof(node) for node in nodes) + list_bytes
+    flat_bytes, flat = traced(FlatAST.from_tree, tree)
+    return {
+        "nodes": len(nodes),
+        "flat_nodes": len(flat),
+        "dict": (dict_bytes + list_bytes) / len(nodes),
+        "slots": slot_bytes / len(nodes),
+        "flat": flat_bytes / len(flat),
+        "flat_columns": flat.nbytes() / len(flat),
+        "tree": tree,
+        "flat_ast": flat,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure the memory per node of the AST representations")
+    arg_parser.add_argument("--statements", type=int, default=20000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    sys.setrecursionlimit(100000)
+    result = measure(generate_program(args.statements, seed=args.seed))
+    print("%d tree nodes, %d flat nodes (declarations are not flattened)" % (result["nodes"], result["flat_nodes"]))
+    print("%-22s %14s" % ("Representation", "Bytes/node"))
+    print("%-22s %14.1f" % ("dict-based nodes", result["dict"]))
+    print("%-22s %14.1f" % ("slotted nodes", result["slots"]))
+    print("%-22s %14.1f" % ("flat arrays", result["flat"]))
+    print("%-22s %14.1f" % ("  of which columns", result["flat_columns"]))
+    interpreter = FlatInterpreter(result["flat_ast"])
+    interpreter.interpret()
+    print("flat interpreter ran, %d variables set" % len(interpreter.GLOBAL_MEMORY))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from spi import Parser, SemanticAnalyzer, AST, EOF, LEXERS, make_interpreter
+from src2srccompiler import SourceToSourceCompiler
+from benchmarks.generator import generate_program
+
+
+class ReplayLexer(object):
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek_token(self):
+        return self.tokens[self.pos]
+
+    def get_next_token(self):
+        token = self.tokens[self.pos]
+        if token.type != EOF:
+            self.pos += 1
+        return token
+
+
+def tokenize(lexer_class, text):
+    lexer = lexer_class(text)
+    get_next_token = lexer.get_next_token
+    tokens = []
+    append = tokens.append
+    while True:
+        token = get_next_token()
+        append(token)
+        if token.type == EOF:
+            return tokens
+
+
+def count_nodes(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, AST):
+            count += 1
+            for name in node.__slots__:
+                value = getattr(node, name, None)
+                if isinstance(value, (AST, list)):
+                    stack.append(value)
+    return count
+
+
+class PhaseTimer(object):
+    def __init__(self, measure_memory):
+        self.measure_memory = measure_memory
+        self.results = {}
+
+    def run(self, phase, function, *args):
+        gc.collect()
+        if self.measure_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        stats = {"seconds": elapsed}
+        if self.measure_memory:
+            stats["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results[phase] = stats
+        return result
+
+
+def parse(tokens):
+    return Parser(ReplayLexer(tokens)).parse()
+
+
+def analyze(tree):
+    SemanticAnalyzer().visit(tree)
+    return tree
+
+
+def interpret(interpreter):
+    interpreter.interpret()
+    return interpreter
+
+
+def translate(tree):
+    compiler = SourceToSourceCompiler()
+    compiler.visit(tree)
+    return compiler.output
+
+
+def run_once(text, lexer_class, backend, measure_memory):
+    timer = PhaseTimer(measure_memory)
+    tokens = timer.run("lex", tokenize, lexer_class, text)
+    tree = timer.run("parse", parse, tokens)
+    timer.run("analyze", analyze, tree)
+    interpreter = timer.run("compile", make_interpreter, tree, backend)
+    timer.run("interpret", interpret, interpreter)
+    timer.run("src2src", translate, parse(tokens))
+    return timer.results, len(tokens), count_nodes(tree)
+
+
+def benchmark(config, lexer="bulk", backend="tree", repeat=3, measure_memory=True):
+    text = generate_program(**config)
+    phases = {}
+    for _ in range(repeat):
+        results, token_count, node_count = run_once(text, LEXERS[lexer], backend, False)
+        for phase, stats in results.items():
+            best = phases.setdefault(phase, stats)
+            if stats["seconds"] < best["seconds"]:
+                phases[phase] = stats
+    if measure_memory:
+        results = run_once(text, LEXERS[lexer], backend, True)[0]
+        for phase, stats in results.items():
+            phases[phase]["peak_memory_bytes"] = stats["peak_memory_bytes"]
+    for phase, stats in phases.items():
+        seconds = stats["seconds"] or float("inf")
+        if phase == "lex":
+            stats["tokens_per_sec"] = token_count / seconds
+        else:
+            stats["nodes_per_sec"] = node_count / seconds
+    return {
+        "config": config,
+        "lexer": lexer,
+        "backend": backend,
+        "source_bytes": len(text),
+        "tokens": token_count,
+        "nodes": node_count,
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "phases": phases,
+    }
+
+
+def format_report(result, baseline=None):
+    lines = ["%d tokens, %d nodes, %d bytes of source (lexer=%s, backend=%s)" % (
+        result["tokens"], result["nodes"], result["source_bytes"], result["lexer"], result["backend"])]
+    lines.append("%-10s %10s %14s %14s %12s" % ("Phase", "Seconds", "Tokens/sec", "Nodes/sec", "Peak MiB"))
+    for phase, stats in result["phases"].items():
+        line = "%-10s %10.4f %14s %14s %12s" % (
+            phase, stats["seconds"],
+            "%.0f" % stats["tokens_per_sec"] if "tokens_per_sec" in stats else "-",
+            "%.0f" % stats["nodes_per_sec"] if "nodes_per_sec" in stats else "-",
+            "%.2f" % (stats["peak_memory_bytes"] / 2 ** 20) if "peak_memory_bytes" in stats else "-")
+        if baseline is not None and phase in baseline["phases"]:
+            line += "   x%.2f vs baseline" % (baseline["phases"][phase]["seconds"] / stats["seconds"])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the phases of spi.py on a generated program")
+    arg_parser.add_argument("--statements", type=int, default=10000)
+    arg_parser.add_argument("--expression-depth", type=int, default=3)
+    arg_parser.add_argument("--variables", type=int, default=20)
+    arg_parser.add_argument("--procedure-depth", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--call-ratio", type=float, default=0.05,
+                            help="fraction of main program statements that are procedure calls")
+    arg_parser.add_argument("--recursion-depth", type=int, default=50,
+                            help="depth of the recursive procedure calls (0 leaves them out)")
+    arg_parser.add_argument("--lexer", choices=sorted(LEXERS), default="bulk")
+    arg_parser.add_argument("--backend", choices=("tree", "stackless", "vm", "closure"), default="tree")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory pass")
+    arg_parser.add_argument("--output", help="write the results as JSON to this file")
+    arg_parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = arg_parser.parse_args()
+
+    config = {
+        "statements": args.statements,
+        "expression_depth": args.expression_depth,
+        "variables": args.variables,
+        "procedure_depth": args.procedure_depth,
+        "seed": args.seed,
+        "call_ratio": args.call_ratio,
+        "recursion_depth": args.recursion_depth,
+    }
+    result = benchmark(config, args.lexer, args.backend, args.repeat, not args.no_memory)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(result, baseline))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
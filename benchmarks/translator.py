@@ -0,0 +1,60 @@
+import argparse
+import io
+import random
+import sys
+import time
+
+from postfix_translator import PostfixTranslator
+from lisp_translator import LispTranslator
+
+TRANSLATORS = {
+    "postfix": PostfixTranslator,
+    "lisp": LispTranslator,
+}
+
+OPERATORS = ("+", "-", "*", "/", "div")
+
+
+def make_expression(rand, depth):
+    if depth <= 0 or rand.random() < 0.2:
+        return rand.choice(("a", "b", "c", str(rand.randint(0, 99))))
+    if rand.random() < 0.2:
+        return "(%s)" % make_expression(rand, depth - 1)
+    return "%s %s %s" % (make_expression(rand, depth - 1), rand.choice(OPERATORS), make_expression(rand, depth - 1))
+
+
+def make_source(lines, depth, seed):
+    rand = random.Random(seed)
+    return "".join(make_expression(rand, depth) + "\n" for _ in range(lines))
+
+
+def translate(translator_class, source):
+    output = io.StringIO()
+    count = translator_class().translate_stream(io.StringIO(source), output)
+    return count, output.getvalue()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure the throughput of the expression translators")
+    arg_parser.add_argument("--lines", type=int, default=200000)
+    arg_parser.add_argument("--depth", type=int, default=3, help="nesting depth of the generated expressions")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    source = make_source(args.lines, args.depth, args.seed)
+    print("%d lines, %d bytes, expression depth %d" % (args.lines, len(source), args.depth))
+    print("%-10s %10s %14s" % ("Translator", "Seconds", "Lines/sec"))
+    for name, translator_class in TRANSLATORS.items():
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            count, _ = translate(translator_class, source)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        print("%-10s %10.4f %14.0f" % (name, best, count / best))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import argparse
+import random
+import sys
+import time
+
+from spi import BinOp, UnaryOp, Var, Session
+from vectorized import np, parse_expression, evaluate, Unvectorizable, VectorizedEvaluator
+
+DEFAULT_EXPRESSION = "(a * 3 + b div 7 - c) div 4 + (a - b) / (c + 0.5) * 2.5"
+
+
+def make_columns(names, rows, seed):
+    rnd = random.Random(seed)
+    return {name: np.array([rnd.randint(-10 ** 6, 10 ** 6) for _ in range(rows)]) for name in names}
+
+
+def variable_names(tree):
+    names = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, BinOp):
+            stack.extend((node.left, node.right))
+        elif isinstance(node, UnaryOp):
+            stack.append(node.expr)
+        elif isinstance(node, Var):
+            names.add(node.value)
+    return sorted(names)
+
+
+def interpret_rows(text, columns):
+    session = Session()
+    names = list(columns)
+    if names:
+        declarations = ["%s : %s;" % (name, "REAL" if columns[name].dtype.kind == "f" else "INTEGER")
+                        for name in names]
+        session.execute("VAR " + " ".join(declarations))
+    # the interpreter needs its own analyzed tree; analysis rewrites mixed arithmetic in place
+    tree = parse_expression(text)
+    session.semantic_analyzer.visit(tree)
+    slots = [session.global_scope.lookup(name).slot for name in names]
+    frame = session.global_frame
+    visit = session.interpreter.visit
+    results = []
+    for values in zip(*(columns[name].tolist() for name in names)) if names else [()]:
+        for slot, value in zip(slots, values):
+            frame[slot] = value
+        results.append(visit(tree))
+    return np.array(results)
+
+
+def best_of(repeat, function, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="Compare vectorized evaluation of an expression with the interpreter's per-row loop"
+    )
+    arg_parser.add_argument("--expression", default=DEFAULT_EXPRESSION)
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    if np is None:
+        print("numpy is not installed; nothing to compare against the per-row loop")
+        return 1
+
+    tree = parse_expression(args.expression)
+    columns = make_columns(variable_names(tree), args.rows, args.seed)
+
+    row_seconds, row_result = best_of(1, interpret_rows, args.expression, columns)
+    try:
+        VectorizedEvaluator(columns).evaluate(tree, args.rows)
+        mode = "vectorized"
+    except Unvectorizable as e:
+        mode = "per-row fallback (%s)" % e
+    vector_seconds, vector_result = best_of(args.repeat, evaluate, tree, columns)
+    if row_result.tolist() != vector_result.tolist():
+        print("Results differ between the vectorized evaluator and the interpreter")
+        return 1
+
+    print("%s over %d rows (%s)" % (args.expression, args.rows, mode))
+    print("%-12s %10s %14s" % ("Evaluator", "Seconds", "Rows/sec"))
+    for name, seconds in (("interpreter", row_seconds), ("vectorized", vector_seconds)):
+        print("%-12s %10.4f %14.0f" % (name, seconds, args.rows / seconds))
+    print("speedup x%.1f" % (row_seconds / vector_seconds))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
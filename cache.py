@@ -0,0 +1,153 @@
+import gc
+import hashlib
+import os
+import pickle
+import zlib
+
+FORMAT_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spi")
+DEFAULT_MAX_BYTES = 64 * 2 ** 20
+DIGEST_CHUNK_SIZE = 1 << 16
+ENTRY_SUFFIX = ".spic"
+
+_interpreter_version = None
+
+
+def interpreter_version():
+    global _interpreter_version
+    if _interpreter_version is None:
+        digest = hashlib.sha256(str(FORMAT_VERSION).encode())
+        for module_name in ("spi", "optimizer", "cache"):
+            module = __import__(module_name)
+            with open(module.__file__, "rb") as f:
+                digest.update(f.read())
+        _interpreter_version = digest.hexdigest()
+    return _interpreter_version
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_digest(path, chunk_size=DIGEST_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(chunk_size), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def gc_paused(function):
+    # pickling allocates one container per AST node without freeing any, so the cyclic
+    # collector keeps rescanning the growing heap; pausing it makes loading a large tree
+    # several times faster
+    def wrapper(*args, **kwargs):
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    return wrapper
+
+
+@gc_paused
+def dump_program(tree, output=""):
+    return zlib.compress(pickle.dumps((FORMAT_VERSION, tree, output), pickle.HIGHEST_PROTOCOL), 1)
+
+
+@gc_paused
+def load_program(data):
+    entry = pickle.loads(zlib.decompress(data))
+    if entry[0] != FORMAT_VERSION:
+        raise ValueError("Unsupported cache format %r" % entry[0])
+    return entry[1:]
+
+
+class ProgramCache(object):
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.uncacheable = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source_digest, optimized=False, observed=None, trace=None):
+        digest = hashlib.sha256(interpreter_version().encode())
+        digest.update(b"O" if optimized else b"-")
+        if optimized and observed is not None:
+            digest.update(("[%s]" % ",".join(sorted(observed))).encode("utf-8"))
+        digest.update(("<%s>" % trace).encode("utf-8"))
+        digest.update(source_digest.encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, source_digest, optimized=False, observed=None, trace=None):
+        path = self.path(self.key(source_digest, optimized, observed, trace))
+        try:
+            with open(path, "rb") as f:
+                tree, output = load_program(f.read())
+            os.utime(path)
+        except (OSError, ValueError, EOFError, AttributeError, ImportError, pickle.UnpicklingError, zlib.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tree, output
+
+    def put(self, source_digest, tree, output="", optimized=False, observed=None, trace=None):
+        try:
+            data = dump_program(tree, output)
+        except RecursionError:
+            self.uncacheable += 1
+            return
+        path = self.path(self.key(source_digest, optimized, observed, trace))
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self.stores += 1
+        self.evict()
+
+    def entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "evictions": self.evictions,
+                "uncacheable": self.uncacheable}
+
+    def __str__(self):
+        return "Program cache %s: %d hits, %d misses, %d stores, %d evictions, %d too deep to cache" % (
+            self.directory, self.hits, self.misses, self.stores, self.evictions, self.uncacheable)
+
+    __repr__ = __str__
@@ -0,0 +1,272 @@
+import gc
+from collections import OrderedDict
+
+from spi import NodeVisitor, CallStack, Num, RECURSIVE_CALL_DEPTH, procedure_runner, PLUS, MINUS, MULTIPLY,\
+    FLOAT_DIV, INTEGER_DIV, EQUAL, NOT_EQUAL, LESS_THAN, LESS_EQUAL, GREATER_THAN, GREATER_EQUAL, AND, OR, NOT
+
+GLOBAL_SCOPE_LEVEL = 1
+
+
+def make_binary(op_type, left, right):
+    if op_type == PLUS:
+        return lambda: left() + right()
+    elif op_type == MINUS:
+        return lambda: left() - right()
+    elif op_type == MULTIPLY:
+        return lambda: left() * right()
+    elif op_type == FLOAT_DIV:
+        return lambda: left() / right()
+    elif op_type == INTEGER_DIV:
+        return lambda: left() // right()
+    elif op_type == EQUAL:
+        return lambda: left() == right()
+    elif op_type == NOT_EQUAL:
+        return lambda: left() != right()
+    elif op_type == LESS_THAN:
+        return lambda: left() < right()
+    elif op_type == LESS_EQUAL:
+        return lambda: left() <= right()
+    elif op_type == GREATER_THAN:
+        return lambda: left() > right()
+    elif op_type == GREATER_EQUAL:
+        return lambda: left() >= right()
+    elif op_type == AND:
+        return lambda: left() and right()
+    elif op_type == OR:
+        return lambda: left() or right()
+
+
+def make_binary_right_constant(op_type, left, constant):
+    if op_type == PLUS:
+        return lambda: left() + constant
+    elif op_type == MINUS:
+        return lambda: left() - constant
+    elif op_type == MULTIPLY:
+        return lambda: left() * constant
+    elif op_type == FLOAT_DIV:
+        return lambda: left() / constant
+    elif op_type == INTEGER_DIV:
+        return lambda: left() // constant
+    elif op_type == EQUAL:
+        return lambda: left() == constant
+    elif op_type == NOT_EQUAL:
+        return lambda: left() != constant
+    elif op_type == LESS_THAN:
+        return lambda: left() < constant
+    elif op_type == LESS_EQUAL:
+        return lambda: left() <= constant
+    elif op_type == GREATER_THAN:
+        return lambda: left() > constant
+    elif op_type == GREATER_EQUAL:
+        return lambda: left() >= constant
+    elif op_type == AND:
+        return lambda: left() and constant
+    elif op_type == OR:
+        return lambda: left() or constant
+
+
+def do_nothing():
+    pass
+
+
+class ClosureCompiler(NodeVisitor):
+    def __init__(self, frames, call_stack):
+        self.frames = frames
+        self.call_stack = call_stack
+        self.procedures = {}
+        self.runner = procedure_runner(frames, call_stack)
+
+    def compile(self, tree):
+        return self.visit(tree)
+
+    def visit_Program(self, node):
+        return self.visit(node.block_node)
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        return self.visit(node.compound_statement)
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        body = self.procedures[node.block_node] = [do_nothing]
+        body[0] = self.visit(node.block_node) or do_nothing
+
+    def visit_ProcedureCall(self, node):
+        proc_symbol = node.proc_symbol
+        body = self.procedures[proc_symbol.block_ast]
+        block_ast = proc_symbol.block_ast
+        args = tuple(self.visit(param) for param in node.actual_params)
+        call_stack = self.call_stack
+        push = call_stack.push
+        pop = call_stack.pop
+        runner = self.runner
+
+        def call():
+            push(proc_symbol, [arg() for arg in args])
+            if len(call_stack) > RECURSIVE_CALL_DEPTH:
+                # nested closures recurse on the Python stack, so deep calls are walked iteratively instead
+                runner.visit(block_ast)
+            else:
+                body[0]()
+            pop()
+        return call
+
+    def visit_Compound(self, node):
+        statements = tuple(
+            statement for statement in (self.visit(child) for child in node.children) if statement is not None
+        )
+        if len(statements) == 1:
+            return statements[0]
+
+        def run_compound():
+            for statement in statements:
+                statement()
+        return run_compound
+
+    def visit_NoOp(self, node):
+        return None
+
+    def visit_Assign(self, node):
+        level, slot = node.left.address
+        right = self.visit(node.right)
+        if level == GLOBAL_SCOPE_LEVEL:
+            frame = self.frames[level]
+
+            def assign():
+                frame[slot] = right()
+        else:
+            frames = self.frames
+
+            def assign():
+                frames[level][slot] = right()
+        return assign
+
+    def visit_If(self, node):
+        condition = self.visit(node.condition)
+        then_statement = self.visit(node.then_statement) or do_nothing
+        if node.else_statement is None:
+            def run_if():
+                if condition():
+                    then_statement()
+            return run_if
+
+        else_statement = self.visit(node.else_statement) or do_nothing
+
+        def run_if_else():
+            if condition():
+                then_statement()
+            else:
+                else_statement()
+        return run_if_else
+
+    def visit_While(self, node):
+        condition = self.visit(node.condition)
+        body = self.visit(node.body) or do_nothing
+
+        def run_while():
+            while condition():
+                body()
+        return run_while
+
+    def visit_For(self, node):
+        level, slot = node.var_node.address
+        start = self.visit(node.start)
+        stop = self.visit(node.stop)
+        step = node.step
+        body = self.visit(node.body) or do_nothing
+        if level == GLOBAL_SCOPE_LEVEL:
+            frame = self.frames[level]
+
+            def run_for():
+                for value in range(start(), stop() + step, step):
+                    frame[slot] = value
+                    body()
+        else:
+            frames = self.frames
+
+            def run_for():
+                frame = frames[level]
+                for value in range(start(), stop() + step, step):
+                    frame[slot] = value
+                    body()
+        return run_for
+
+    def visit_Var(self, node):
+        level, slot = node.address
+        name = repr(node.value)
+        if level == GLOBAL_SCOPE_LEVEL:
+            frame = self.frames[level]
+
+            def load():
+                value = frame[slot]
+                if value is None:
+                    raise NameError(name)
+                return value
+        else:
+            frames = self.frames
+
+            def load():
+                value = frames[level][slot]
+                if value is None:
+                    raise NameError(name)
+                return value
+        return load
+
+    def visit_Num(self, node):
+        value = node.value
+        return lambda: value
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.expr)
+        if node.op.type == MINUS:
+            return lambda: -operand()
+        elif node.op.type == NOT:
+            return lambda: not operand()
+        return lambda: +operand()
+
+    def visit_ToReal(self, node):
+        operand = self.visit(node.expr)
+        return lambda: float(operand())
+
+    def visit_BinOp(self, node):
+        op_type = node.op.type
+        left = self.visit(node.left)
+        if isinstance(node.right, Num):
+            return make_binary_right_constant(op_type, left, node.right.value)
+        return make_binary(op_type, left, self.visit(node.right))
+
+
+class ClosureInterpreter(object):
+    def __init__(self, tree):
+        self.tree = tree
+        self.GLOBAL_MEMORY = OrderedDict()
+        self.global_frame = [None] * tree.frame_size
+        self.frames = [None, self.global_frame]
+        self.call_stack = CallStack(self.frames)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.program = ClosureCompiler(self.frames, self.call_stack).compile(tree)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def interpret(self, initial_memory=None):
+        global_frame = self.global_frame
+        global_frame[:] = [None] * len(global_frame)
+        if initial_memory:
+            slots = {name: slot for slot, name in enumerate(self.tree.var_names)}
+            for name, value in initial_memory.items():
+                global_frame[slots[name]] = value
+        if self.program is not None:
+            try:
+                self.program()
+            finally:
+                # a failed run must not leave its activation records behind for the next one
+                self.call_stack.unwind()
+        self.GLOBAL_MEMORY = OrderedDict(
+            (name, value) for name, value in zip(self.tree.var_names, global_frame) if value is not None
+        )
@@ -0,0 +1,301 @@
+from array import array
+from collections import OrderedDict
+
+from spi import Program, Block, Compound, Assign, Var, Num, UnaryOp, BinOp, NoOp, ToReal, If, While, For,\
+    ProcedureCall, PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, EQUAL, NOT_EQUAL, LESS_THAN, LESS_EQUAL, GREATER_THAN,\
+    GREATER_EQUAL, AND, OR, NOT
+
+KINDS = ("Program", "Block", "Compound", "Assign", "Var", "Num", "UnaryOp", "BinOp", "NoOp", "ToReal", "If", "While",
+         "For", "ProcedureCall")
+PROGRAM, BLOCK, COMPOUND, ASSIGN, VAR, NUM, UNARY_OP, BIN_OP, NO_OP, TO_REAL, IF, WHILE, FOR, PROCEDURE_CALL = \
+    range(len(KINDS))
+OPERATORS = (PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, EQUAL, NOT_EQUAL, LESS_THAN, LESS_EQUAL, GREATER_THAN,
+             GREATER_EQUAL, AND, OR, NOT)
+OPERATOR_INDEX = {op_type: index for index, op_type in enumerate(OPERATORS)}
+NONE = -1
+
+
+class FlatAST(object):
+    def __init__(self):
+        self.kinds = array("B")
+        self.first = array("l")
+        self.second = array("l")
+        self.data = array("l")
+        self.children = array("l")
+        # one entry per called procedure: its body block, the scope level it is declared in,
+        # its frame size, and where its parameter slots start in param_slots
+        self.proc_blocks = array("l")
+        self.proc_levels = array("l")
+        self.proc_frame_sizes = array("l")
+        self.proc_params = array("l")
+        self.param_slots = array("l")
+        self.constants = []
+        self.names = []
+        self.frame_size = 0
+        self.var_names = ()
+        self._constant_index = {}
+        self._name_index = {}
+        self._procedure_index = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in (
+            self.kinds, self.first, self.second, self.data, self.children, self.proc_blocks, self.proc_levels,
+            self.proc_frame_sizes, self.proc_params, self.param_slots))
+
+    def add(self, kind, first=NONE, second=NONE, data=NONE):
+        self.kinds.append(kind)
+        self.first.append(first)
+        self.second.append(second)
+        self.data.append(data)
+        return len(self.kinds) - 1
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def name(self, name):
+        index = self._name_index.get(name)
+        if index is None:
+            index = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def procedure(self, proc_symbol, stack):
+        # procedures are added when the first call to them is flattened; their blocks are
+        # flattened from the same stack, so recursive calls find the entry already there
+        index = self._procedure_index.get(proc_symbol)
+        if index is None:
+            index = self._procedure_index[proc_symbol] = len(self.proc_blocks)
+            self.proc_blocks.append(NONE)
+            self.proc_levels.append(proc_symbol.scope_level)
+            self.proc_frame_sizes.append(proc_symbol.frame_size)
+            self.proc_params.append(len(self.param_slots))
+            self.param_slots.extend(param.slot for param in proc_symbol.params)
+            stack.append((proc_symbol.block_ast, self.proc_blocks, index))
+        return index
+
+    def add_children(self, nodes, stack):
+        start = len(self.children)
+        self.children.extend([NONE] * len(nodes))
+        stack.extend((child, self.children, start + offset) for offset, child in reversed(list(enumerate(nodes))))
+        return start
+
+    @classmethod
+    def from_tree(cls, tree):
+        flat = cls()
+        stack = [(tree, None, 0)]
+        while stack:
+            node, column, position = stack.pop()
+            if isinstance(node, Program):
+                flat.frame_size = node.frame_size
+                flat.var_names = node.var_names
+                index = flat.add(PROGRAM)
+                stack.append((node.block_node, flat.first, index))
+            elif isinstance(node, Block):
+                # declarations do nothing when run; procedures are flattened through their calls
+                index = flat.add(BLOCK)
+                stack.append((node.compound_statement, flat.first, index))
+            elif isinstance(node, Compound):
+                index = flat.add(COMPOUND, second=len(node.children))
+                flat.first[index] = flat.add_children(node.children, stack)
+            elif isinstance(node, Assign):
+                index = flat.add(ASSIGN)
+                stack.append((node.right, flat.second, index))
+                stack.append((node.left, flat.first, index))
+            elif isinstance(node, Var):
+                level, slot = node.address
+                index = flat.add(VAR, level, slot, flat.name(node.value))
+            elif isinstance(node, Num):
+                index = flat.add(NUM, data=flat.constant(node.value))
+            elif isinstance(node, UnaryOp):
+                index = flat.add(UNARY_OP, data=OPERATOR_INDEX[node.op.type])
+                stack.append((node.expr, flat.first, index))
+            elif isinstance(node, BinOp):
+                index = flat.add(BIN_OP, data=OPERATOR_INDEX[node.op.type])
+                stack.append((node.right, flat.second, index))
+                stack.append((node.left, flat.first, index))
+            elif isinstance(node, ToReal):
+                index = flat.add(TO_REAL)
+                stack.append((node.expr, flat.first, index))
+            elif isinstance(node, NoOp):
+                index = flat.add(NO_OP)
+            elif isinstance(node, If):
+                statements = [node.condition, node.then_statement]
+                if node.else_statement is not None:
+                    statements.append(node.else_statement)
+                index = flat.add(IF, second=len(statements))
+                flat.first[index] = flat.add_children(statements, stack)
+            elif isinstance(node, While):
+                index = flat.add(WHILE)
+                stack.append((node.body, flat.second, index))
+                stack.append((node.condition, flat.first, index))
+            elif isinstance(node, For):
+                # the children are the control variable, the bounds and the body; data is the step
+                index = flat.add(FOR, second=4, data=node.step)
+                flat.first[index] = flat.add_children([node.var_node, node.start, node.stop, node.body], stack)
+            elif isinstance(node, ProcedureCall):
+                index = flat.add(PROCEDURE_CALL, second=len(node.actual_params))
+                flat.data[index] = flat.procedure(node.proc_symbol, stack)
+                flat.first[index] = flat.add_children(node.actual_params, stack)
+            else:
+                raise Exception("Error: Cannot flatten %s" % type(node).__name__)
+            if column is not None:
+                column[position] = index
+        return flat
+
+    def child_indices(self, index):
+        start = self.first[index]
+        return self.children[start:start + self.second[index]]
+
+
+class FlatNodeVisitor(object):
+    def __init__(self, flat):
+        self.flat = flat
+        self._methods = [getattr(self, "visit_" + kind, self.generic_visit) for kind in KINDS]
+
+    def visit(self, index):
+        return self._methods[self.flat.kinds[index]](index)
+
+    def generic_visit(self, index):
+        raise Exception("No visit_{} method".format(KINDS[self.flat.kinds[index]]))
+
+
+class FlatInterpreter(FlatNodeVisitor):
+    def __init__(self, flat):
+        super(FlatInterpreter, self).__init__(flat)
+        self.GLOBAL_MEMORY = OrderedDict()
+        self.frames = [None]
+
+    def visit_Program(self, index):
+        global_frame = [None] * self.flat.frame_size
+        self.frames.append(global_frame)
+        self.visit(self.flat.first[index])
+        self.GLOBAL_MEMORY.update(
+            (name, value) for name, value in zip(self.flat.var_names, global_frame) if value is not None
+        )
+
+    def visit_Block(self, index):
+        self.visit(self.flat.first[index])
+
+    def visit_Compound(self, index):
+        for child in self.flat.child_indices(index):
+            self.visit(child)
+
+    def visit_NoOp(self, index):
+        pass
+
+    def visit_If(self, index):
+        flat = self.flat
+        children = flat.child_indices(index)
+        if self.visit(children[0]):
+            self.visit(children[1])
+        elif len(children) == 3:
+            self.visit(children[2])
+
+    def visit_While(self, index):
+        flat = self.flat
+        condition = flat.first[index]
+        body = flat.second[index]
+        while self.visit(condition):
+            self.visit(body)
+
+    def visit_For(self, index):
+        flat = self.flat
+        var, start, stop, body = flat.child_indices(index)
+        frame = self.frames[flat.first[var]]
+        slot = flat.second[var]
+        step = flat.data[index]
+        for value in range(self.visit(start), self.visit(stop) + step, step):
+            frame[slot] = value
+            self.visit(body)
+
+    def visit_ProcedureCall(self, index):
+        flat = self.flat
+        procedure = flat.data[index]
+        args = [self.visit(child) for child in flat.child_indices(index)]
+        frame = [None] * flat.proc_frame_sizes[procedure]
+        params = flat.proc_params[procedure]
+        for offset, value in enumerate(args):
+            frame[flat.param_slots[params + offset]] = value
+        # calls run on the Python stack, so unlike the tree backends recursion depth is bounded
+        # by Python's recursion limit
+        frames = self.frames
+        level = flat.proc_levels[procedure] + 1
+        if level == len(frames):
+            frames.append(None)
+        saved_frame = frames[level]
+        frames[level] = frame
+        try:
+            self.visit(flat.proc_blocks[procedure])
+        finally:
+            frames[level] = saved_frame
+
+    def visit_Assign(self, index):
+        flat = self.flat
+        var = flat.first[index]
+        self.frames[flat.first[var]][flat.second[var]] = self.visit(flat.second[index])
+
+    def visit_Var(self, index):
+        flat = self.flat
+        value = self.frames[flat.first[index]][flat.second[index]]
+        if value is None:
+            raise NameError(repr(flat.names[flat.data[index]]))
+        return value
+
+    def visit_Num(self, index):
+        return self.flat.constants[self.flat.data[index]]
+
+    def visit_ToReal(self, index):
+        return float(self.visit(self.flat.first[index]))
+
+    def visit_UnaryOp(self, index):
+        value = self.visit(self.flat.first[index])
+        op_type = OPERATORS[self.flat.data[index]]
+        if op_type == MINUS:
+            return -value
+        elif op_type == NOT:
+            return not value
+        return +value
+
+    def visit_BinOp(self, index):
+        flat = self.flat
+        op_type = OPERATORS[flat.data[index]]
+        left = self.visit(flat.first[index])
+        if op_type == AND:
+            return left and self.visit(flat.second[index])
+        elif op_type == OR:
+            return left or self.visit(flat.second[index])
+        right = self.visit(flat.second[index])
+        if op_type == PLUS:
+            return left + right
+        elif op_type == MINUS:
+            return left - right
+        elif op_type == MULTIPLY:
+            return left * right
+        elif op_type == FLOAT_DIV:
+            return left / right
+        elif op_type == INTEGER_DIV:
+            return left // right
+        elif op_type == EQUAL:
+            return left == right
+        elif op_type == NOT_EQUAL:
+            return left != right
+        elif op_type == LESS_THAN:
+            return left < right
+        elif op_type == LESS_EQUAL:
+            return left <= right
+        elif op_type == GREATER_THAN:
+            return left > right
+        elif op_type == GREATER_EQUAL:
+            return left >= right
+
+    def interpret(self):
+        if len(self.flat):
+            self.visit(0)
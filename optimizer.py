@@ -0,0 +1,791 @@
+from spi import StacklessNodeVisitor, AST, Program, ProcedureDecl, VarDecl, Num, Var, Token, Assign, Compound, If,\
+    While, For, ProcedureCall, BinOp, UnaryOp, ToReal, NoOp, INTEGER_CONST, REAL_CONST, INTEGER, REAL, BOOLEAN, ID,\
+    ASSIGN, AND, OR, PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, EQUAL, NOT_EQUAL
+
+LOGICAL_OPERATIONS = {
+    AND: lambda left, right: left and right,
+    OR: lambda left, right: left or right,
+}
+
+COMMUTATIVE_OPERATORS = (PLUS, MULTIPLY, EQUAL, NOT_EQUAL)
+
+ARITHMETIC_OPERATORS = (PLUS, MINUS, MULTIPLY)
+
+GLOBAL_SCOPE_LEVEL = 1
+
+
+def make_num(value):
+    if isinstance(value, float):
+        node = Num(Token(REAL_CONST, value))
+        node.type = REAL
+    else:
+        node = Num(Token(INTEGER_CONST, value))
+        node.type = BOOLEAN if isinstance(value, bool) else INTEGER
+    return node
+
+
+def nested_statements(node):
+    if isinstance(node, Compound):
+        return node.children
+    if isinstance(node, If):
+        if node.else_statement is None:
+            return [node.then_statement]
+        return [node.then_statement, node.else_statement]
+    if isinstance(node, (While, For)):
+        return [node.body]
+    return []
+
+
+def assigned_addresses(node, cache=None):
+    # the sets of nested statements are kept in cache, so a pass asking about every level of a
+    # deeply nested program stays linear; None means a procedure call may assign anything
+    if cache is None:
+        cache = {}
+    stack = [(node, False)]
+    while stack:
+        statement, nested_done = stack.pop()
+        if statement in cache:
+            continue
+        if isinstance(statement, Assign):
+            cache[statement] = {statement.left.address}
+            continue
+        if isinstance(statement, ProcedureCall):
+            cache[statement] = None
+            continue
+        nested = nested_statements(statement)
+        if not nested_done:
+            stack.append((statement, True))
+            stack.extend((child, False) for child in nested)
+            continue
+        addresses = {statement.var_node.address} if isinstance(statement, For) else set()
+        for child in nested:
+            child_addresses = cache[child]
+            if child_addresses is None:
+                addresses = None
+                break
+            addresses |= child_addresses
+        cache[statement] = addresses
+    return cache[node]
+
+
+class ConstantFolder(StacklessNodeVisitor):
+    def __init__(self):
+        self.constants = {}
+        self.eliminated = 0
+        self.propagated = 0
+        self.assigned = {}
+
+    def optimize(self, tree):
+        self.visit(tree)
+        return tree
+
+    def visit_Program(self, node):
+        yield node.block_node
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            yield declaration
+        yield node.compound_statement
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        enclosing_constants = self.constants
+        self.constants = {}
+        yield node.block_node
+        self.constants = enclosing_constants
+
+    def visit_ProcedureCall(self, node):
+        actual_params = node.actual_params
+        for index, param in enumerate(actual_params):
+            actual_params[index] = yield param
+        self.constants.clear()
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            yield child
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Assign(self, node):
+        node.right = yield node.right
+        if isinstance(node.right, Num):
+            self.constants[node.left.address] = node.right.value
+        else:
+            self.constants.pop(node.left.address, None)
+
+    def forget_assigned(self, node):
+        addresses = assigned_addresses(node, self.assigned)
+        if addresses is None:
+            self.constants.clear()
+            return
+        for address in addresses:
+            self.constants.pop(address, None)
+
+    def visit_If(self, node):
+        node.condition = yield node.condition
+        constants = self.constants
+        self.constants = dict(constants)
+        yield node.then_statement
+        then_constants = self.constants
+        self.constants = dict(constants)
+        if node.else_statement is not None:
+            yield node.else_statement
+        self.constants = {
+            address: value for address, value in self.constants.items()
+            if address in then_constants and type(then_constants[address]) is type(value) and
+            then_constants[address] == value
+        }
+
+    def visit_While(self, node):
+        self.forget_assigned(node)
+        node.condition = yield node.condition
+        loop_constants = dict(self.constants)
+        yield node.body
+        self.constants = loop_constants
+
+    def visit_For(self, node):
+        node.start = yield node.start
+        node.stop = yield node.stop
+        self.forget_assigned(node)
+        loop_constants = dict(self.constants)
+        yield node.body
+        self.constants = loop_constants
+
+    def visit_Var(self, node):
+        value = self.constants.get(node.address)
+        if value is None:
+            return node
+        self.propagated += 1
+        return make_num(value)
+
+    def visit_Num(self, node):
+        return node
+
+    def visit_UnaryOp(self, node):
+        node.expr = yield node.expr
+        if not isinstance(node.expr, Num):
+            return node
+        self.eliminated += 1
+        return make_num(node.operation(node.expr.value))
+
+    def visit_ToReal(self, node):
+        node.expr = yield node.expr
+        if not isinstance(node.expr, Num):
+            return node
+        try:
+            value = float(node.expr.value)
+        except OverflowError:
+            return node
+        self.eliminated += 1
+        return make_num(value)
+
+    def visit_BinOp(self, node):
+        node.left = yield node.left
+        node.right = yield node.right
+        if not (isinstance(node.left, Num) and isinstance(node.right, Num)):
+            return node
+        try:
+            operation = node.operation or LOGICAL_OPERATIONS[node.op.type]
+            value = operation(node.left.value, node.right.value)
+        except (ZeroDivisionError, OverflowError):
+            return node
+        self.eliminated += 2
+        return make_num(value)
+
+
+def get_child(parent, slot):
+    if isinstance(parent, list):
+        return parent[slot]
+    return getattr(parent, slot)
+
+
+def set_child(parent, slot, node):
+    if isinstance(parent, list):
+        parent[slot] = node
+    else:
+        setattr(parent, slot, node)
+
+
+def operation_count(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, BinOp):
+            count += 1
+            stack.append(node.left)
+            stack.append(node.right)
+        elif isinstance(node, (UnaryOp, ToReal)):
+            count += 1
+            stack.append(node.expr)
+    return count
+
+
+def copy_var(var):
+    node = Var(Token(ID, var.value))
+    node.address = var.address
+    node.type = var.type
+    return node
+
+
+class Occurrence(object):
+    __slots__ = ("statement", "order", "parent", "slot", "node", "hoistable", "holder", "version", "temporary")
+
+    def __init__(self, statement, order, parent, slot, node, hoistable):
+        self.statement = statement
+        self.order = order
+        self.parent = parent
+        self.slot = slot
+        self.node = node
+        self.hoistable = hoistable
+        self.holder = None
+        self.version = None
+        self.temporary = None
+
+
+class CommonSubexpressionEliminator(StacklessNodeVisitor):
+    def __init__(self):
+        self.saved = 0
+        self.temporaries = 0
+        self.level = GLOBAL_SCOPE_LEVEL
+        self.frame_size = 0
+        self.temps_in_use = 0
+        self.max_temps = 0
+        self.frame_sizes = {}
+        self.procedure_symbols = set()
+        self.next_value = 0
+        self.next_order = 0
+        self.assigned = {}
+        self.parameters = set()
+
+    def optimize(self, tree):
+        self.visit(tree)
+        for proc_symbol in self.procedure_symbols:
+            proc_symbol.frame_size = self.frame_sizes.get(proc_symbol.block_ast, proc_symbol.frame_size)
+        return tree
+
+    def visit_Program(self, node):
+        self.frame_size = node.frame_size
+        yield node.block_node
+        node.frame_size += self.max_temps
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            yield declaration
+        yield node.compound_statement
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        enclosing = self.level, self.frame_size, self.temps_in_use, self.max_temps, self.parameters
+        self.level += 1
+        self.frame_size = node.frame_size
+        self.temps_in_use = self.max_temps = 0
+        self.parameters = set(param.var_node.address for param in node.params)
+        yield node.block_node
+        node.frame_size += self.max_temps
+        self.frame_sizes[node.block_node] = node.frame_size
+        self.level, self.frame_size, self.temps_in_use, self.max_temps, self.parameters = enclosing
+
+    def visit_ProcedureCall(self, node):
+        self.procedure_symbols.add(node.proc_symbol)
+
+    def visit_Assign(self, node):
+        pass
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_If(self, node):
+        yield node.then_statement
+        if node.else_statement is not None:
+            yield node.else_statement
+
+    def visit_While(self, node):
+        yield node.body
+
+    def visit_For(self, node):
+        yield node.body
+
+    def visit_Compound(self, node):
+        self.values = {}
+        self.occurrences = {}
+        self.versions = {}
+        self.inserts = {}
+        self.allocated = 0
+        self.defined = set(self.parameters)
+        nested = []
+        for index, child in enumerate(node.children):
+            self.statement = index
+            self.clean = True
+            if isinstance(child, Assign):
+                self.eliminate(child, "right")
+                address = child.left.address
+                self.defined.add(address)
+                version = self.versions[address] = self.versions.get(address, 0) + 1
+                occurrence = self.occurrences.get(self.node_values.get(child.right))
+                if occurrence is not None and occurrence.node is child.right:
+                    occurrence.holder = child.left
+                    occurrence.version = version
+            elif isinstance(child, ProcedureCall):
+                for slot in range(len(child.actual_params)):
+                    self.eliminate(child.actual_params, slot)
+                self.procedure_symbols.add(child.proc_symbol)
+                self.forget_all()
+            else:
+                if isinstance(child, If):
+                    self.eliminate(child, "condition")
+                elif isinstance(child, For):
+                    self.eliminate(child, "start")
+                    self.eliminate(child, "stop")
+                nested.append(child)
+                addresses = assigned_addresses(child, self.assigned)
+                if addresses is None:
+                    self.forget_all()
+                else:
+                    for address in addresses:
+                        self.versions[address] = self.versions.get(address, 0) + 1
+
+        if self.inserts:
+            children = []
+            for index, child in enumerate(node.children):
+                for order, assign in sorted(self.inserts.get(index, ()), key=lambda insert: insert[0]):
+                    children.append(assign)
+                children.append(child)
+            node.children = children
+
+        base = self.temps_in_use
+        self.temps_in_use += self.allocated
+        self.max_temps = max(self.max_temps, self.temps_in_use)
+        for child in nested:
+            yield child
+        self.temps_in_use = base
+
+    def forget_all(self):
+        self.values = {}
+        self.occurrences = {}
+
+    def eliminate(self, parent, slot):
+        self.node_values = {}
+        self.number(get_child(parent, slot))
+        self.rewrite(parent, slot, False)
+
+    def number(self, root):
+        values = self.values
+        node_values = self.node_values
+        stack = [(root, False)]
+        while stack:
+            node, operands_numbered = stack.pop()
+            if isinstance(node, Var):
+                key = (Var, node.address, self.versions.get(node.address, 0))
+            elif isinstance(node, Num):
+                key = (Num, type(node.value), node.value)
+            elif not operands_numbered:
+                stack.append((node, True))
+                if isinstance(node, BinOp):
+                    stack.append((node.right, False))
+                    stack.append((node.left, False))
+                else:
+                    stack.append((node.expr, False))
+                continue
+            elif isinstance(node, BinOp):
+                left = node_values[node.left]
+                right = node_values[node.right]
+                if node.op.type in COMMUTATIVE_OPERATORS and right < left:
+                    left, right = right, left
+                key = (BinOp, node.op.type, left, right)
+            elif isinstance(node, UnaryOp):
+                key = (UnaryOp, node.op.type, node_values[node.expr])
+            else:
+                key = (ToReal, node_values[node.expr])
+            value = values.get(key)
+            if value is None:
+                value = values[key] = self.next_value
+                self.next_value += 1
+            node_values[node] = value
+        return node_values[root]
+
+    def rewrite(self, parent, slot, conditional):
+        # children are rewritten left to right before their parent is recorded, as a recursive walk would.
+        # self.clean stays set while nothing evaluated so far in the statement can raise: only an occurrence
+        # found in that state may be computed into a temporary ahead of the statement, otherwise the hoisted
+        # expression could fail first, or with a different error, than the statement it was taken from
+        stack = [(parent, slot, conditional, None, None)]
+        while stack:
+            parent, slot, conditional, node, hoistable = stack.pop()
+            if node is not None:
+                if not conditional:
+                    self.occurrences[self.node_values[node]] = Occurrence(
+                        self.statement, self.next_order, parent, slot, node, hoistable)
+                    self.next_order += 1
+                if operation_can_fail(node):
+                    self.clean = False
+                continue
+            node = get_child(parent, slot)
+            if isinstance(node, Var):
+                if node.address not in self.defined:
+                    self.clean = False
+                continue
+            if not isinstance(node, (BinOp, UnaryOp, ToReal)):
+                continue
+            occurrence = self.occurrences.get(self.node_values[node])
+            if occurrence is not None:
+                reused = self.reuse(occurrence)
+                if reused is not None:
+                    set_child(parent, slot, reused)
+                    self.saved += operation_count(node)
+                    continue
+            stack.append((parent, slot, conditional, node, self.clean))
+            if isinstance(node, BinOp):
+                stack.append((node, "right", conditional or node.op.type in (AND, OR), None, None))
+                stack.append((node, "left", conditional, None, None))
+            else:
+                stack.append((node, "expr", conditional, None, None))
+
+    def reuse(self, occurrence):
+        holder = occurrence.holder
+        if holder is not None and self.versions.get(holder.address) == occurrence.version:
+            return copy_var(holder)
+        if occurrence.temporary is None:
+            if not occurrence.hoistable:
+                return None
+            temporary = self.new_temporary(occurrence.node.type)
+            set_child(occurrence.parent, occurrence.slot, copy_var(temporary))
+            assign = Assign(temporary, Token(ASSIGN, ":="), occurrence.node)
+            self.inserts.setdefault(occurrence.statement, []).append((occurrence.order, assign))
+            occurrence.temporary = temporary
+        return copy_var(occurrence.temporary)
+
+    def new_temporary(self, type):
+        slot = self.frame_size + self.temps_in_use + self.allocated
+        self.allocated += 1
+        self.temporaries += 1
+        node = Var(Token(ID, "$t%d" % slot))
+        node.address = (self.level, slot)
+        node.type = type
+        return node
+
+
+def operation_can_fail(node):
+    if isinstance(node, BinOp):
+        left, right = node.left, node.right
+        if node.op.type == FLOAT_DIV:
+            # int / int and int-to-float conversions overflow on huge integers
+            return not (isinstance(left, Num) and isinstance(right, Num) and right.value)
+        if node.op.type == INTEGER_DIV:
+            return not (isinstance(right, Num) and right.value)
+        if node.op.type in ARITHMETIC_OPERATORS and left.type != right.type:
+            return not (isinstance(left, Num) and isinstance(right, Num))
+    elif isinstance(node, ToReal):
+        return not isinstance(node.expr, Num)
+    return False
+
+
+def expression_reads(node):
+    reads = set()
+    can_fail = False
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Var):
+            reads.add(node.address)
+        elif isinstance(node, BinOp):
+            can_fail = can_fail or operation_can_fail(node)
+            stack.append(node.left)
+            stack.append(node.right)
+        elif isinstance(node, ToReal):
+            can_fail = can_fail or operation_can_fail(node)
+            stack.append(node.expr)
+        elif isinstance(node, UnaryOp):
+            stack.append(node.expr)
+    return reads, can_fail
+
+
+class DefiniteAssignment(StacklessNodeVisitor):
+    def __init__(self):
+        self.assigned = set()
+        self.safe = set()
+
+    def visit_Program(self, node):
+        yield node.block_node
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            yield declaration
+        yield node.compound_statement
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        # nothing is known about the caller's variables, only the parameters are set on entry
+        assigned = self.assigned
+        self.assigned = set(param.var_node.address for param in node.params)
+        yield node.block_node
+        self.assigned = assigned
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            yield child
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_ProcedureCall(self, node):
+        pass
+
+    def visit_Assign(self, node):
+        if expression_reads(node.right)[0] <= self.assigned:
+            self.safe.add(node)
+        self.assigned.add(node.left.address)
+
+    def visit_If(self, node):
+        assigned = self.assigned
+        self.assigned = set(assigned)
+        yield node.then_statement
+        then_assigned = self.assigned
+        self.assigned = set(assigned)
+        if node.else_statement is not None:
+            yield node.else_statement
+        self.assigned &= then_assigned
+
+    def visit_While(self, node):
+        assigned = self.assigned
+        self.assigned = set(assigned)
+        yield node.body
+        self.assigned = assigned
+
+    def visit_For(self, node):
+        assigned = self.assigned
+        self.assigned = assigned | {node.var_node.address}
+        yield node.body
+        self.assigned = assigned
+
+
+class DeadStoreEliminator(StacklessNodeVisitor):
+    def __init__(self, observed=None):
+        self.observed = observed
+        self.stores = 0
+        self.declarations = 0
+        self.frame_sizes = [None]
+        self.observed_addresses = set()
+        self.live = set()
+        self.rewrite = True
+        self.procedure_symbols = set()
+        self.safe = set()
+        self.loop_headers = {}
+
+    def optimize(self, tree):
+        definite_assignment = DefiniteAssignment()
+        definite_assignment.visit(tree)
+        self.safe = definite_assignment.safe
+        self.visit(tree)
+        self.compact_frames(tree)
+        return tree
+
+    @property
+    def level(self):
+        return len(self.frame_sizes) - 1
+
+    def visible(self, level):
+        return set((frame_level, slot) for frame_level in range(GLOBAL_SCOPE_LEVEL, level + 1)
+                   for slot in range(self.frame_sizes[frame_level]))
+
+    def visit_Program(self, node):
+        if self.observed is None:
+            self.observed = set(node.var_names)
+        unknown = set(self.observed).difference(node.var_names)
+        if unknown:
+            raise Exception("Error: Unknown observed variable '%s'" % sorted(unknown)[0])
+        self.observed_addresses = set(
+            (GLOBAL_SCOPE_LEVEL, slot) for slot, name in enumerate(node.var_names) if name in self.observed)
+        self.frame_sizes.append(node.frame_size)
+        yield node.block_node
+        self.frame_sizes.pop()
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            yield declaration
+        if self.level > GLOBAL_SCOPE_LEVEL:
+            self.live = self.visible(self.level - 1)
+        else:
+            self.live = set(self.observed_addresses)
+        node.compound_statement = yield from self.statement(node.compound_statement)
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        self.frame_sizes.append(node.frame_size)
+        yield node.block_node
+        self.frame_sizes.pop()
+
+    def statement(self, node):
+        result = yield node
+        if result is None:
+            return NoOp()
+        return result
+
+    def visit_Compound(self, node):
+        children = []
+        for child in reversed(node.children):
+            child = yield child
+            if child is not None:
+                children.append(child)
+        if self.rewrite:
+            children.reverse()
+            node.children = children or [NoOp()]
+        return node
+
+    def visit_NoOp(self, node):
+        return node
+
+    def visit_Assign(self, node):
+        address = node.left.address
+        reads, can_fail = expression_reads(node.right)
+        if address not in self.live and not can_fail and node in self.safe:
+            if self.rewrite:
+                self.stores += 1
+                return None
+            return node
+        self.live.discard(address)
+        self.live.update(reads)
+        return node
+
+    def visit_ProcedureCall(self, node):
+        proc_symbol = node.proc_symbol
+        self.procedure_symbols.add(proc_symbol)
+        self.live.update(self.visible(proc_symbol.scope_level))
+        for param in node.actual_params:
+            self.live.update(expression_reads(param)[0])
+        return node
+
+    def visit_If(self, node):
+        live_after = self.live
+        self.live = set(live_after)
+        then_statement = yield from self.statement(node.then_statement)
+        then_live = self.live
+        self.live = set(live_after)
+        if node.else_statement is not None:
+            else_statement = yield from self.statement(node.else_statement)
+            if self.rewrite:
+                node.else_statement = else_statement
+        if self.rewrite:
+            node.then_statement = then_statement
+        self.live.update(then_live)
+        self.live.update(expression_reads(node.condition)[0])
+        return node
+
+    def loop_body(self, body, live_after, killed=None):
+        # the live set after a loop only grows while enclosing loops iterate, so the header found on an earlier
+        # visit is still below the fixpoint: it is reused as is when nothing new is live after the loop and
+        # seeds the iteration otherwise, instead of starting nested loops over on every outer iteration
+        known = self.loop_headers.get(body)
+        if known is not None and live_after <= known[0]:
+            header = known[1]
+        else:
+            rewrite = self.rewrite
+            self.rewrite = False
+            header = set(live_after)
+            if known is not None:
+                live_after = live_after | known[0]
+                header.update(known[1])
+            while True:
+                self.live = set(header)
+                yield body
+                self.live.discard(killed)
+                if self.live <= header:
+                    break
+                header.update(self.live)
+            self.loop_headers[body] = (set(live_after), header)
+            self.rewrite = rewrite
+        rewrite = self.rewrite
+        if rewrite:
+            self.live = set(header)
+            body = yield from self.statement(body)
+        self.live = set(header)
+        return body
+
+    def visit_While(self, node):
+        live_after = set(self.live)
+        live_after.update(expression_reads(node.condition)[0])
+        body = yield from self.loop_body(node.body, live_after)
+        if self.rewrite:
+            node.body = body
+        return node
+
+    def visit_For(self, node):
+        body = yield from self.loop_body(node.body, self.live, node.var_node.address)
+        if self.rewrite:
+            node.body = body
+        self.live.update(expression_reads(node.start)[0])
+        self.live.update(expression_reads(node.stop)[0])
+        return node
+
+    def compact_frames(self, tree):
+        used = {}
+        var_nodes = []
+        blocks = []
+        declarations = {}
+        stack = [(tree, ())]
+        while stack:
+            node, chain = stack.pop()
+            if isinstance(node, list):
+                stack.extend((child, chain) for child in node)
+                continue
+            if isinstance(node, Program):
+                chain = (None, node)
+                used[node] = set()
+                blocks.append((node.block_node, chain))
+            elif isinstance(node, ProcedureDecl):
+                chain = chain + (node,)
+                used[node] = set(param.var_node.address[1] for param in node.params)
+                blocks.append((node.block_node, chain))
+                declarations[node.block_node] = node
+            elif isinstance(node, Var):
+                level, slot = node.address
+                used[chain[level]].add(slot)
+                var_nodes.append((node, chain[level]))
+                continue
+            elif isinstance(node, VarDecl) or not isinstance(node, AST):
+                continue
+            for name in node.__slots__:
+                value = getattr(node, name, None)
+                if isinstance(value, (AST, list)):
+                    stack.append((value, chain))
+
+        slot_maps = {}
+        for owner, slots in used.items():
+            var_names = owner.var_names
+            order = sorted(slots)
+            if isinstance(owner, Program):
+                observed = [slot for slot in order if slot < len(var_names) and var_names[slot] in self.observed]
+                order = observed + [slot for slot in order if slot not in set(observed)]
+                owner.var_names = tuple(var_names[slot] for slot in observed)
+            else:
+                owner.var_names = tuple(var_names[slot] for slot in order if slot < len(var_names))
+            self.declarations += len(var_names) - sum(1 for slot in order if slot < len(var_names))
+            owner.frame_size = len(order)
+            slot_maps[owner] = {slot: index for index, slot in enumerate(order)}
+
+        for node, owner in var_nodes:
+            node.address = (node.address[0], slot_maps[owner][node.address[1]])
+        for block, chain in blocks:
+            kept = []
+            for declaration in block.declarations:
+                if isinstance(declaration, VarDecl):
+                    level, slot = declaration.var_node.address
+                    slot = slot_maps[chain[level]].get(slot)
+                    if slot is None:
+                        continue
+                    declaration.var_node.address = (level, slot)
+                kept.append(declaration)
+            block.declarations = kept
+        for proc_symbol in self.procedure_symbols:
+            declaration = declarations[proc_symbol.block_ast]
+            proc_symbol.frame_size = declaration.frame_size
+            proc_symbol.var_names = declaration.var_names
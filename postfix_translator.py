@@ -1,46 +1,16 @@
-from spi import Lexer, Parser, NodeVisitor
+from spi import PLUS, MINUS, NOT
+from translator import ExpressionTranslator, main
 
-INTEGER, PLUS, MINUS, MULTIPLY, DIVIDE, LPAREN, RPAREN, EOF = \
-    "INTEGER", "PLUS", "MINUS", "MULTIPLY", "DIVIDE", "LPAREN", "RPAREN", "EOF"
 
+class PostfixTranslator(ExpressionTranslator):
+    unary_names = {PLUS: "pos", MINUS: "neg", NOT: "not"}
 
-class Interpreter(NodeVisitor):
-    def __init__(self, parser):
-        self.parser = parser
+    def unary_node(self, token, operand, pos):
+        return "%s %s" % (operand, self.unary_names[token.type])
 
-    def visit_BinOp(self, node):
-        if node.op.type == PLUS:
-            return "%s %s +" % (self.visit(node.left), self.visit(node.right))
-        elif node.op.type == MINUS:
-            return "%s %s -" % (self.visit(node.left), self.visit(node.right))
-        elif node.op.type == MULTIPLY:
-            return "%s %s *" % (self.visit(node.left), self.visit(node.right))
-        elif node.op.type == DIVIDE:
-            return "%s %s /" % (self.visit(node.left), self.visit(node.right))
-
-    def visit_Num(self, node):
-        return node.value
-
-    def interpret(self):
-        tree = self.parser.parse()
-        return self.visit(tree)
-
-
-def main():
-    while True:
-        try:
-            text = input('spi> ')
-        except EOFError:
-            break
-        if not text:
-            continue
-
-        lexer = Lexer(text)
-        parser = Parser(lexer)
-        interpreter = Interpreter(parser)
-        result = interpreter.interpret()
-        print(result)
+    def binary_node(self, left, token, right, pos):
+        return "%s %s %s" % (left, right, self.binary_names[token.type])
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main(PostfixTranslator, "Translate expressions to reverse Polish notation")
@@ -0,0 +1,219 @@
+import json
+import time
+from types import GeneratorType
+
+from spi import Interpreter, StacklessInterpreter, AST, Program, ProcedureDecl
+
+
+class NodeStats(object):
+    __slots__ = ("node", "procedure", "count", "total", "own")
+
+    def __init__(self, node, procedure):
+        self.node = node
+        self.procedure = procedure
+        self.count = 0
+        self.total = 0.0
+        self.own = 0.0
+
+
+class ProcedureStats(object):
+    __slots__ = ("name", "calls", "total", "active")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.active = 0
+
+
+def procedure_owners(tree):
+    # every node is mapped to the program or procedure whose body it is in, and the body block
+    # of every procedure to that procedure, so a call is counted when its block runs
+    owners = {}
+    blocks = {}
+    stack = [(tree, None, "")]
+    while stack:
+        node, owner, prefix = stack.pop()
+        if isinstance(node, list):
+            stack.extend((child, owner, prefix) for child in node)
+            continue
+        if not isinstance(node, AST):
+            continue
+        if isinstance(node, Program):
+            owner = blocks[node.block_node] = ProcedureStats(node.program_name)
+        elif isinstance(node, ProcedureDecl):
+            # nested procedures are named after the procedures that declare them
+            owner = blocks[node.block_node] = ProcedureStats(prefix + node.proc_name)
+            prefix = owner.name + "."
+        owners[node] = owner
+        for name in node.__slots__:
+            value = getattr(node, name, None)
+            if isinstance(value, (AST, list)):
+                stack.append((value, owner, prefix))
+    return owners, blocks
+
+
+class ProfilingInterpreter(Interpreter):
+    def __init__(self, tree, source_map=None, timer=time.perf_counter):
+        super(ProfilingInterpreter, self).__init__(tree)
+        self.source_map = source_map
+        self.timer = timer
+        self.stats = {}
+        self.owners, self.blocks = procedure_owners(tree)
+        self._child_times = [0.0]
+
+    def enter(self, node):
+        self._child_times.append(0.0)
+        procedure = self.blocks.get(node)
+        if procedure is not None:
+            procedure.calls += 1
+            procedure.active += 1
+        return self.timer()
+
+    def leave(self, node, start):
+        elapsed = self.timer() - start
+        child_times = self._child_times
+        own = elapsed - child_times.pop()
+        child_times[-1] += elapsed
+        stats = self.stats.get(node)
+        if stats is None:
+            stats = self.stats[node] = NodeStats(node, self.owners.get(node))
+        stats.count += 1
+        stats.total += elapsed
+        stats.own += own
+        procedure = self.blocks.get(node)
+        if procedure is not None:
+            procedure.active -= 1
+            # the time of a recursive call is already part of the outermost call
+            if not procedure.active:
+                procedure.total += elapsed
+
+    def visit(self, node):
+        start = self.enter(node)
+        try:
+            return Interpreter.visit(self, node)
+        finally:
+            self.leave(node, start)
+
+    def lookup_visitor(self, node):
+        return type(self).visit
+
+    def loop_body(self, node):
+        return ((type(self).visit, node),)
+
+    def procedure_runner(self):
+        if self._procedure_runner is None:
+            self._procedure_runner = ProfilingRunner(self)
+        return self._procedure_runner
+
+    @property
+    def total_time(self):
+        return self._child_times[0]
+
+    def position(self, node):
+        pos = getattr(node, "pos", None)
+        if pos is None or self.source_map is None:
+            return None, None
+        return self.source_map.line_col(pos)
+
+    def hot_spots(self):
+        return sorted(self.stats.values(), key=lambda stats: stats.own, reverse=True)
+
+    def procedures(self):
+        procedures = {}
+        for stats in self.stats.values():
+            entry = procedures.setdefault(stats.procedure, [0, 0.0])
+            entry[0] += stats.count
+            entry[1] += stats.own
+        return sorted(((procedure, count, own) for procedure, (count, own) in procedures.items()),
+                      key=lambda item: item[2], reverse=True)
+
+    def report(self, top=20):
+        total = self.total_time or float("inf")
+        lines = ["Profile: %.3f ms in %d nodes" % (self.total_time * 1000, len(self.stats))]
+        lines.append("%4s %9s  %-13s %-12s %10s %11s %11s %7s" % (
+            "Rank", "Line:Col", "Node", "Procedure", "Count", "Total ms", "Self ms", "Self %"))
+        for rank, stats in enumerate(self.hot_spots()[:top], 1):
+            line, column = self.position(stats.node)
+            location = "%d:%d" % (line, column) if line is not None else "-"
+            lines.append("%4d %9s  %-13s %-12s %10d %11.3f %11.3f %6.1f%%" % (
+                rank, location, type(stats.node).__name__, stats.procedure.name, stats.count, stats.total * 1000,
+                stats.own * 1000, 100 * stats.own / total))
+        lines.append("")
+        lines.append("%-20s %8s %12s %11s %11s %7s" % (
+            "Procedure", "Calls", "Executions", "Total ms", "Self ms", "Self %"))
+        for procedure, count, own in self.procedures():
+            lines.append("%-20s %8d %12d %11.3f %11.3f %6.1f%%" % (
+                procedure.name, procedure.calls, count, procedure.total * 1000, own * 1000, 100 * own / total))
+        return "\n".join(lines)
+
+    def to_json(self):
+        nodes = []
+        for stats in self.hot_spots():
+            line, column = self.position(stats.node)
+            nodes.append({
+                "node": type(stats.node).__name__,
+                "line": line,
+                "column": column,
+                "procedure": stats.procedure.name,
+                "count": stats.count,
+                "total_seconds": stats.total,
+                "self_seconds": stats.own,
+            })
+        return {
+            "total_seconds": self.total_time,
+            "nodes": nodes,
+            "procedures": [{"procedure": procedure.name, "calls": procedure.calls, "executions": count,
+                            "total_seconds": procedure.total, "self_seconds": own}
+                           for procedure, count, own in self.procedures()],
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+
+class ProfilingRunner(StacklessInterpreter):
+    # calls nested deeper than RECURSIVE_CALL_DEPTH run here; this is StacklessNodeVisitor.visit
+    # with every node timed by the profiler that owns the runner
+    def __init__(self, profiler):
+        super(ProfilingRunner, self).__init__(None)
+        self.frames = profiler.frames
+        self.call_stack = profiler.call_stack
+        self.profiler = profiler
+
+    def visit(self, node):
+        profiler = self.profiler
+        dispatch_table = self._dispatch_table
+        stack = []
+        started = None
+        try:
+            while True:
+                start = profiler.enter(node)
+                started = node, start
+                visitor = dispatch_table.get(node.__class__) or self.resolve_visitor(node.__class__)
+                value = visitor(self, node)
+                started = None
+                if value.__class__ is GeneratorType:
+                    stack.append((value, node, start))
+                    value = None
+                else:
+                    profiler.leave(node, start)
+                while True:
+                    if not stack:
+                        return value
+                    try:
+                        node = stack[-1][0].send(value)
+                        break
+                    except StopIteration as stop:
+                        routine, finished, start = stack.pop()
+                        value = stop.value
+                        profiler.leave(finished, start)
+        except BaseException:
+            # the nodes still running are closed, so the profiler's timing stack stays balanced
+            if started is not None:
+                profiler.leave(*started)
+            while stack:
+                routine, finished, start = stack.pop()
+                profiler.leave(finished, start)
+            raise
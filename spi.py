@@ -1,4 +1,14 @@
-from collections import OrderedDict
+import argparse
+import codecs
+import contextlib
+import io
+import operator
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from types import GeneratorType
+from collections import Counter, OrderedDict
 
 INTEGER_CONST, REAL_CONST, PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, LPAREN, RPAREN,\
     PROGRAM, VAR, COLON, COMMA, PROCEDURE, INTEGER, REAL, ID, ASSIGN,\
@@ -7,6 +17,17 @@ INTEGER_CONST, REAL_CONST, PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, LPAREN
     "PROGRAM", "VAR", "COLON", "COMMA", "PROCEDURE", "INTEGER", "REAL", "ID", "ASSIGN",\
     "BEGIN", "END", "SEMI", "DOT", "EOF"
 
+ERROR = "ERROR"
+
+EQUAL, NOT_EQUAL, LESS_THAN, LESS_EQUAL, GREATER_THAN, GREATER_EQUAL, AND, OR, NOT,\
+    IF, THEN, ELSE, WHILE, DO, FOR, TO, DOWNTO = \
+    "EQUAL", "NOT_EQUAL", "LESS_THAN", "LESS_EQUAL", "GREATER_THAN", "GREATER_EQUAL", "AND", "OR", "NOT",\
+    "IF", "THEN", "ELSE", "WHILE", "DO", "FOR", "TO", "DOWNTO"
+
+RELATIONAL_OPERATORS = (EQUAL, NOT_EQUAL, LESS_THAN, LESS_EQUAL, GREATER_THAN, GREATER_EQUAL)
+
+BOOLEAN = "BOOLEAN"
+
 
 class Token(object):
     def __init__(self, type, value):
@@ -28,18 +49,93 @@ RESERVED_KEYWORDS = {
     "REAL": Token(REAL, "REAL"),
     "BEGIN": Token(BEGIN, "BEGIN"),
     "END": Token(END, "END"),
-    "DIV": Token(INTEGER_DIV, "//")
+    "DIV": Token(INTEGER_DIV, "//"),
+    "AND": Token(AND, "AND"),
+    "OR": Token(OR, "OR"),
+    "NOT": Token(NOT, "NOT"),
+    "IF": Token(IF, "IF"),
+    "THEN": Token(THEN, "THEN"),
+    "ELSE": Token(ELSE, "ELSE"),
+    "WHILE": Token(WHILE, "WHILE"),
+    "DO": Token(DO, "DO"),
+    "FOR": Token(FOR, "FOR"),
+    "TO": Token(TO, "TO"),
+    "DOWNTO": Token(DOWNTO, "DOWNTO"),
 }
 
+PUNCTUATION = {
+    ":=": Token(ASSIGN, ":="),
+    ":": Token(COLON, ":"),
+    ",": Token(COMMA, ","),
+    ";": Token(SEMI, ";"),
+    ".": Token(DOT, "."),
+    "+": Token(PLUS, "+"),
+    "-": Token(MINUS, "-"),
+    "*": Token(MULTIPLY, "*"),
+    "/": Token(FLOAT_DIV, "/"),
+    "(": Token(LPAREN, "("),
+    ")": Token(RPAREN, ")"),
+    "=": Token(EQUAL, "="),
+    "<>": Token(NOT_EQUAL, "<>"),
+    "<": Token(LESS_THAN, "<"),
+    "<=": Token(LESS_EQUAL, "<="),
+    ">": Token(GREATER_THAN, ">"),
+    ">=": Token(GREATER_EQUAL, ">="),
+}
+
+EOF_TOKEN = Token(EOF, None)
+
+OPERATOR_NAMES = {token.type: name for name, token in list(PUNCTUATION.items()) + list(RESERVED_KEYWORDS.items())}
+
+
+class LexerError(Exception):
+    def __init__(self, character, offset=None, line=None):
+        self.character = character
+        self.offset = offset
+        self.line = line
+        location = "" if line is None else " on line %d" % line
+        super(LexerError, self).__init__("Invalid character %r%s" % (character, location))
+
 
 class Lexer(object):
     def __init__(self, text):
         self.text = text
         self.pos = 0
         self.current_char = text[self.pos]
+        self.offsets = None
 
     def error(self):
-        raise Exception("Invalid character")
+        error = LexerError(self.current_char, self.pos)
+        # the invalid character is skipped, so a recovering parser can ask for the next token
+        self.advance()
+        raise error
+
+    def token_offsets(self):
+        # offsets only locate errors and profile entries, so they are found by lexing the text
+        # again when asked for rather than recorded for every token
+        if self.offsets is None:
+            lexer = Lexer(self.text)
+            offsets = array("q")
+            while True:
+                lexer.skip_blanks()
+                offsets.append(lexer.pos)
+                try:
+                    if lexer.get_next_token().type == EOF:
+                        break
+                except LexerError:
+                    pass
+            self.offsets = offsets
+        return self.offsets
+
+    def line_starts(self):
+        return line_starts(self.text)
+
+    def peek_token(self):
+        pos, current_char = self.pos, self.current_char
+        try:
+            return self.get_next_token()
+        finally:
+            self.pos, self.current_char = pos, current_char
 
     def peek(self):
         peek_pos = self.pos + 1
@@ -64,6 +160,13 @@ class Lexer(object):
             self.advance()
         self.advance()
 
+    def skip_blanks(self):
+        while self.current_char is not None and (self.current_char.isspace() or self.current_char == "{"):
+            if self.current_char == "{":
+                self.skip_comment()
+            else:
+                self.skip_whitespace()
+
     def number(self):
         digit_string = ""
         while self.current_char is not None and self.current_char.isdigit():
@@ -113,164 +216,614 @@ class Lexer(object):
                 if self.peek() == "=":
                     self.advance()
                     self.advance()
-                    return Token(ASSIGN, ":=")
+                    return PUNCTUATION[":="]
                 else:
                     self.advance()
-                    return Token(COLON, ":")
+                    return PUNCTUATION[":"]
 
             if self.current_char == ",":
                 self.advance()
-                return Token(COMMA, ",")
+                return PUNCTUATION[","]
 
             if self.current_char == ";":
                 self.advance()
-                return Token(SEMI, ";")
+                return PUNCTUATION[";"]
 
             if self.current_char == ".":
                 self.advance()
-                return Token(DOT, ".")
+                return PUNCTUATION["."]
 
             if self.current_char == "+":
                 self.advance()
-                return Token(PLUS, "+")
+                return PUNCTUATION["+"]
 
             if self.current_char == "-":
                 self.advance()
-                return Token(MINUS, "-")
+                return PUNCTUATION["-"]
 
             if self.current_char == "*":
                 self.advance()
-                return Token(MULTIPLY, "*")
+                return PUNCTUATION["*"]
 
             if self.current_char == "/":
                 self.advance()
-                return Token(FLOAT_DIV, "/")
+                return PUNCTUATION["/"]
 
             if self.current_char == "(":
                 self.advance()
-                return Token(LPAREN, "(")
+                return PUNCTUATION["("]
 
             if self.current_char == ")":
                 self.advance()
-                return Token(RPAREN, ")")
+                return PUNCTUATION[")"]
+
+            if self.current_char == "=":
+                self.advance()
+                return PUNCTUATION["="]
+
+            if self.current_char == "<":
+                if self.peek() in ("=", ">"):
+                    lexeme = self.current_char + self.peek()
+                    self.advance()
+                    self.advance()
+                    return PUNCTUATION[lexeme]
+                else:
+                    self.advance()
+                    return PUNCTUATION["<"]
+
+            if self.current_char == ">":
+                if self.peek() == "=":
+                    self.advance()
+                    self.advance()
+                    return PUNCTUATION[">="]
+                else:
+                    self.advance()
+                    return PUNCTUATION[">"]
 
             self.error()
 
-        return Token(EOF, None)
+        return EOF_TOKEN
+
+
+def line_starts(text):
+    starts = array("q", [0])
+    start = text.find("\n")
+    while start != -1:
+        starts.append(start + 1)
+        start = text.find("\n", start + 1)
+    return starts
+
+
+class SourceMap(object):
+    def __init__(self, lexer):
+        self.offsets = lexer.token_offsets()
+        self.line_starts = lexer.line_starts()
+
+    def line_col(self, token_index):
+        return self.offset_line_col(self.offsets[min(token_index, len(self.offsets) - 1)])
+
+    def offset_line_col(self, offset):
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+
+LEXEME_PATTERN = re.compile(r"\d+(?:\.\d*)?|[^\W\d_][^\W_]*|_[^\W_]*|:=|<[=>]|>=|\{[^}]*\}|\S")
+
+
+class BulkLexer(object):
+    def __init__(self, text):
+        self.text = text
+        self.tokens = None
+        self.offsets = None
+        self.pos = 0
+
+    def error(self, lexeme):
+        raise LexerError(lexeme)
+
+    def classify(self, lexeme):
+        first = lexeme[0]
+        if first.isdigit():
+            if "." in lexeme:
+                return Token(REAL_CONST, float(lexeme))
+            return Token(INTEGER_CONST, int(lexeme))
+        if first.isalpha() or first == "_":
+            return RESERVED_KEYWORDS.get(lexeme.upper()) or Token(ID, lexeme.lower())
+        if first == "{" and len(lexeme) > 1:
+            return None
+        self.error(lexeme)
+
+    def tokenize(self):
+        if self.tokens is None:
+            known = dict(PUNCTUATION)
+            classify = self.classify
+            tokens = []
+            append = tokens.append
+            errors = []
+            for lexeme in LEXEME_PATTERN.findall(self.text):
+                token = known.get(lexeme)
+                if token is None:
+                    try:
+                        token = classify(lexeme)
+                    except LexerError as error:
+                        # an invalid character becomes an error token that raises when the parser reaches it
+                        errors.append(len(tokens))
+                        token = Token(ERROR, error)
+                    if token is None:
+                        continue
+                    if token.type != ERROR:
+                        known[lexeme] = token
+                append(token)
+            append(EOF_TOKEN)
+            if errors:
+                offsets = self.token_offsets()
+                for index in errors:
+                    tokens[index].value.offset = offsets[index]
+            self.tokens = tokens
+        return self.tokens
+
+    def token_offsets(self):
+        if self.offsets is None:
+            self.offsets = array("q", (
+                match.start() for match in LEXEME_PATTERN.finditer(self.text)
+                if match.group()[0] != "{" or match.group() == "{"
+            ))
+            self.offsets.append(len(self.text))
+        return self.offsets
+
+    def line_starts(self):
+        return line_starts(self.text)
+
+    def token_arrays(self):
+        tokens = self.tokenize()
+        return [token.type for token in tokens], [token.value for token in tokens], self.token_offsets()
+
+    def peek_token(self):
+        tokens = self.tokenize()
+        token = tokens[min(self.pos, len(tokens) - 1)]
+        if token.type == ERROR:
+            raise token.value
+        return token
+
+    def get_next_token(self):
+        tokens = self.tokens
+        if tokens is None:
+            tokens = self.tokenize()
+        pos = self.pos
+        if pos < len(tokens) - 1:
+            self.pos = pos + 1
+        token = tokens[pos]
+        if token.type == ERROR:
+            raise token.value
+        return token
+
+
+class StreamLexer(BulkLexer):
+    def __init__(self, source, chunk_size=1 << 16, encoding="utf-8"):
+        super(StreamLexer, self).__init__(None)
+        self.source = source
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.token_start = 0
+        self._stream = None
+        self._start = None
+        self._peeked = None
+        self._line_starts = None
+
+    def chunks(self):
+        if isinstance(self.source, str):
+            f = open(self.source, "rb")
+        else:
+            f = self.source
+            if self._start is None:
+                self._start = f.tell() if f.seekable() else -1
+            elif self._start >= 0:
+                f.seek(self._start)
+        try:
+            decoder = codecs.getincrementaldecoder(self.encoding)()
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    yield decoder.decode(b"", final=True)
+                    return
+                yield decoder.decode(data)
+        finally:
+            if f is not self.source:
+                f.close()
+
+    def rereadable(self):
+        return isinstance(self.source, str) or self.source.seekable()
+
+    def scan(self):
+        known = dict(PUNCTUATION)
+        classify = self.classify
+        # a stream that cannot be read twice keeps its positions while it is scanned
+        offsets = starts = None
+        if not self.rereadable():
+            offsets = array("q")
+            starts = array("q", [0])
+        buffer = ""
+        base = 0
+        waiting = 0
+        comment = None
+        final = False
+        chunks = self.chunks()
+        while not final:
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+            else:
+                if starts is not None:
+                    start = chunk.find("\n")
+                    while start != -1:
+                        starts.append(base + len(buffer) + start + 1)
+                        start = chunk.find("\n", start + 1)
+                if comment is not None:
+                    # only the end of a comment that started in an earlier chunk is looked for,
+                    # and the text it skips is dropped
+                    end = chunk.find("}")
+                    if end == -1:
+                        base += len(chunk)
+                        continue
+                    comment = None
+                    base += end + 1
+                    chunk = chunk[end + 1:]
+                buffer += chunk
+                waiting += len(chunk)
+                # a token left over from the last chunk is rescanned once at least as much
+                # text has arrived, so a token longer than a chunk is not scanned once per chunk
+                if waiting < len(buffer) - waiting:
+                    continue
+            waiting = 0
+            rest = len(buffer)
+            for match in LEXEME_PATTERN.finditer(buffer):
+                lexeme = match.group()
+                if not final and match.end() == len(buffer):
+                    rest = match.start()
+                    break
+                if not final and lexeme == "{":
+                    comment = base + match.start()
+                    break
+                token = known.get(lexeme)
+                if token is None:
+                    try:
+                        token = classify(lexeme)
+                    except LexerError as error:
+                        error.offset = base + match.start()
+                        token = Token(ERROR, error)
+                    if token is None:
+                        continue
+                    if token.type not in (INTEGER_CONST, REAL_CONST, ERROR):
+                        known[lexeme] = token
+                if offsets is not None:
+                    offsets.append(base + match.start())
+                yield base + match.start(), token
+            base += rest
+            buffer = buffer[rest:]
+        if comment is not None:
+            # the input ended inside a comment, which runs to the end: report its opening brace
+            if offsets is not None:
+                offsets.append(comment)
+            yield comment, Token(ERROR, LexerError("{", comment))
+        if offsets is not None:
+            offsets.append(base)
+            self.offsets = offsets
+            self._line_starts = starts
+        yield base, EOF_TOKEN
+
+    def tokenize(self):
+        if self.tokens is None:
+            offsets = array("q")
+            tokens = []
+            for offset, token in self.scan():
+                offsets.append(offset)
+                tokens.append(token)
+            self.tokens = tokens
+            self.offsets = offsets
+        return self.tokens
+
+    def token_offsets(self):
+        if self.offsets is None:
+            if not self.rereadable():
+                raise ValueError("Token offsets of a stream that cannot be re-read are only available once all "
+                                 "of its tokens have been read")
+            self.offsets = array("q", (offset for offset, token in self.scan()))
+        return self.offsets
+
+    def line_starts(self):
+        if not self.rereadable():
+            if self._line_starts is None:
+                raise ValueError("Line starts of a stream that cannot be re-read are only available once all "
+                                 "of its tokens have been read")
+            return self._line_starts
+        starts = array("q", [0])
+        base = 0
+        for chunk in self.chunks():
+            start = chunk.find("\n")
+            while start != -1:
+                starts.append(base + start + 1)
+                start = chunk.find("\n", start + 1)
+            base += len(chunk)
+        return starts
+
+    def peek_token(self):
+        if self.tokens is not None:
+            return BulkLexer.peek_token(self)
+        if self._peeked is None:
+            if self._stream is None:
+                self._stream = self.scan()
+            self._peeked = next(self._stream, (self.token_start, EOF_TOKEN))
+        token = self._peeked[1]
+        if token.type == ERROR:
+            raise token.value
+        return token
+
+    def get_next_token(self):
+        if self.tokens is not None:
+            self.token_start = self.offsets[self.pos]
+            return BulkLexer.get_next_token(self)
+        if self._peeked is not None:
+            offset, token = self._peeked
+            self._peeked = None
+        else:
+            if self._stream is None:
+                self._stream = self.scan()
+            offset, token = next(self._stream, (self.token_start, EOF_TOKEN))
+        self.token_start = offset
+        if token.type == ERROR:
+            raise token.value
+        return token
 
 
 class AST(object):
-    pass
+    __slots__ = ()
 
 
 class Program(AST):
-    def __init__(self, program_name, block_node):
+    __slots__ = ("program_name", "block_node", "frame_size", "var_names", "pos")
+
+    def __init__(self, program_name, block_node, pos=None):
         self.program_name = program_name
         self.block_node = block_node
+        self.pos = pos
 
 
 class Block(AST):
+    __slots__ = ("declarations", "compound_statement")
+
     def __init__(self, declarations, compound_statement):
         self.declarations = declarations
         self.compound_statement = compound_statement
 
 
 class VarDecl(AST):
+    __slots__ = ("var_node", "type_node")
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node
         self.type_node = type_node
 
 
 class ProcedureDecl(AST):
-    def __init__(self, proc_name, params, block_node):
+    __slots__ = ("proc_name", "params", "block_node", "frame_size", "var_names", "pos")
+
+    def __init__(self, proc_name, params, block_node, pos=None):
         self.proc_name = proc_name
         self.params = params
         self.block_node = block_node
+        self.pos = pos
+
+
+class ProcedureCall(AST):
+    __slots__ = ("proc_name", "actual_params", "proc_symbol", "pos")
+
+    def __init__(self, proc_name, actual_params, pos=None):
+        self.proc_name = proc_name
+        self.actual_params = actual_params
+        self.pos = pos
 
 
 class Param(AST):
+    __slots__ = ("var_node", "type_node")
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node
         self.type_node = type_node
 
 
 class Var(AST):
-    def __init__(self, token):
-        self.token = token
+    __slots__ = ("value", "address", "type", "pos")
+
+    def __init__(self, token, pos=None):
         self.value = token.value
+        self.pos = pos
 
 
 class Type(AST):
+    __slots__ = ("value",)
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
 
 
 class UnaryOp(AST):
-    def __init__(self, op, expr):
-        self.token = self.op = op
+    __slots__ = ("op", "expr", "type", "operation", "pos")
+
+    def __init__(self, op, expr, pos=None):
+        self.op = op
         self.expr = expr
+        self.pos = pos
 
 
 class BinOp(AST):
-    def __init__(self, left, op, right):
+    __slots__ = ("left", "op", "right", "type", "operation", "pos")
+
+    def __init__(self, left, op, right, pos=None):
         self.left = left
-        self.token = self.op = op
+        self.op = op
         self.right = right
+        self.pos = pos
 
 
 class Num(AST):
-    def __init__(self, token):
-        self.token = token
+    __slots__ = ("value", "type", "pos")
+
+    def __init__(self, token, pos=None):
         self.value = token.value
+        self.pos = pos
+
+
+class ToReal(AST):
+    __slots__ = ("expr", "type")
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.type = REAL
 
 
 class Compound(AST):
-    def __init__(self):
+    __slots__ = ("children", "pos")
+
+    def __init__(self, pos=None):
         self.children = []
+        self.pos = pos
 
 
 class Assign(AST):
-    def __init__(self, left, op, right):
+    __slots__ = ("left", "right", "pos")
+
+    def __init__(self, left, op, right, pos=None):
         self.left = left
-        self.token = self.op = op
         self.right = right
+        self.pos = pos
+
+
+class If(AST):
+    __slots__ = ("condition", "then_statement", "else_statement", "pos")
+
+    def __init__(self, condition, then_statement, else_statement=None, pos=None):
+        self.condition = condition
+        self.then_statement = then_statement
+        self.else_statement = else_statement
+        self.pos = pos
+
+
+class While(AST):
+    __slots__ = ("condition", "body", "pos")
+
+    def __init__(self, condition, body, pos=None):
+        self.condition = condition
+        self.body = body
+        self.pos = pos
+
+
+class For(AST):
+    __slots__ = ("var_node", "start", "stop", "step", "body", "pos")
+
+    def __init__(self, var_node, start, stop, step, body, pos=None):
+        self.var_node = var_node
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.body = body
+        self.pos = pos
+
+
+def loop_statements(node):
+    if isinstance(node, Compound):
+        return node.children
+    return [node]
 
 
 class NoOp(AST):
-    pass
+    __slots__ = ("pos",)
+
+    def __init__(self, pos=None):
+        self.pos = pos
+
+
+STATEMENT_TOKENS = (BEGIN, ID, IF, WHILE, FOR)
+
+TYPE_SPEC = "TYPE_SPEC"
+
+TOKEN_DESCRIPTIONS = {
+    TYPE_SPEC: "a type (INTEGER or REAL)",
+    ID: "identifier",
+    INTEGER_CONST: "integer constant",
+    REAL_CONST: "real constant",
+    EOF: "end of file",
+}
+
+
+def describe_token_type(token_type):
+    if token_type in TOKEN_DESCRIPTIONS:
+        return TOKEN_DESCRIPTIONS[token_type]
+    return "'%s'" % OPERATOR_NAMES[token_type]
+
+
+class ParserError(Exception):
+    def __init__(self, token, token_index, expected=None, line=None):
+        self.token = token
+        self.token_index = token_index
+        self.expected = expected
+        self.line = line
+        if token.type == EOF:
+            found = "end of file"
+        elif token.type in (ID, INTEGER_CONST, REAL_CONST):
+            found = "'%s'" % token.value
+        else:
+            found = describe_token_type(token.type)
+        location = "" if line is None else " on line %d" % line
+        if expected is None:
+            message = "Invalid syntax%s: unexpected %s" % (location, found)
+        else:
+            message = "Invalid syntax%s: expected %s, found %s" % (location, describe_token_type(expected), found)
+        super(ParserError, self).__init__(message)
 
 
 class Parser(object):
-    def __init__(self, lexer):
+    def __init__(self, lexer, positions=False):
         self.lexer = lexer
+        # tokens are only counted when the nodes' positions are wanted, e.g. by the profiler;
+        # otherwise every node gets None
+        self.token_index = 0 if positions else None
         self.current_token = self.lexer.get_next_token()
 
-    def error(self):
-        raise Exception('Invalid syntax')
+    def error(self, expected=None):
+        raise ParserError(self.current_token, self.token_index, expected)
 
     def eat(self, token_type):
         if self.current_token.type == token_type:
             self.current_token = self.lexer.get_next_token()
+            if self.token_index is not None:
+                self.token_index += 1
         else:
-            self.error()
+            self.error(token_type)
+
+    def at_variable_declaration(self):
+        # a session line may follow its declarations with statements such as "d := 2" or "p(1)"
+        return self.current_token.type == ID and self.lexer.peek_token().type not in (ASSIGN, LPAREN)
 
     def factor(self):
         token = self.current_token
-        if token.type == PLUS:
+        pos = self.token_index
+        if token.type == NOT:
+            self.eat(NOT)
+            node = UnaryOp(token, self.factor(), pos)
+            return node
+        elif token.type == PLUS:
             self.eat(PLUS)
-            node = UnaryOp(token, self.factor())
+            node = UnaryOp(token, self.factor(), pos)
             return node
         elif token.type == MINUS:
             self.eat(MINUS)
-            node = UnaryOp(token, self.factor())
+            node = UnaryOp(token, self.factor(), pos)
             return node
         elif token.type == INTEGER_CONST:
             self.eat(INTEGER_CONST)
-            return Num(token)
+            return Num(token, pos)
         elif token.type == REAL_CONST:
             self.eat(REAL_CONST)
-            return Num(token)
+            return Num(token, pos)
         elif token.type == LPAREN:
             self.eat(LPAREN)
             node = self.expr()
@@ -282,35 +835,51 @@ class Parser(object):
 
     def term(self):
         node = self.factor()
-        while self.current_token.type in (MULTIPLY, INTEGER_DIV, FLOAT_DIV):
+        while self.current_token.type in (MULTIPLY, INTEGER_DIV, FLOAT_DIV, AND):
             token = self.current_token
+            pos = self.token_index
             if token.type == MULTIPLY:
                 self.eat(MULTIPLY)
             elif token.type == INTEGER_DIV:
                 self.eat(INTEGER_DIV)
             elif token.type == FLOAT_DIV:
                 self.eat(FLOAT_DIV)
-            node = BinOp(left=node, op=token, right=self.factor())
+            elif token.type == AND:
+                self.eat(AND)
+            node = BinOp(left=node, op=token, right=self.factor(), pos=pos)
         return node
 
-    def expr(self):
+    def simple_expression(self):
         node = self.term()
-        while self.current_token.type in (PLUS, MINUS):
+        while self.current_token.type in (PLUS, MINUS, OR):
             token = self.current_token
+            pos = self.token_index
             if token.type == PLUS:
                 self.eat(PLUS)
             elif token.type == MINUS:
                 self.eat(MINUS)
-            node = BinOp(left=node, op=token, right=self.term())
+            elif token.type == OR:
+                self.eat(OR)
+            node = BinOp(left=node, op=token, right=self.term(), pos=pos)
+        return node
+
+    def expr(self):
+        node = self.simple_expression()
+        if self.current_token.type in RELATIONAL_OPERATORS:
+            token = self.current_token
+            pos = self.token_index
+            self.eat(token.type)
+            node = BinOp(left=node, op=token, right=self.simple_expression(), pos=pos)
         return node
 
     def program(self):
+        pos = self.token_index
         self.eat(PROGRAM)
         var_node = self.variable()
         prog_name = var_node.value
         self.eat(SEMI)
         block_node = self.block()
-        program_node = Program(prog_name, block_node)
+        program_node = Program(prog_name, block_node, pos)
         self.eat(DOT)
         return program_node
 
@@ -324,11 +893,12 @@ class Parser(object):
         declarations = []
         while self.current_token.type == VAR:
             self.eat(VAR)
-            while self.current_token.type == ID:
+            while self.at_variable_declaration():
                 var_decl = self.variable_declaration()
                 declarations.extend(var_decl)
                 self.eat(SEMI)
         while self.current_token.type == PROCEDURE:
+            pos = self.token_index
             self.eat(PROCEDURE)
             proc_name = self.current_token.value
             self.eat(ID)
@@ -339,17 +909,17 @@ class Parser(object):
                 self.eat(RPAREN)
             self.eat(SEMI)
             block_node = self.block()
-            proc_decl = ProcedureDecl(proc_name, params, block_node)
+            proc_decl = ProcedureDecl(proc_name, params, block_node, pos)
             declarations.append(proc_decl)
             self.eat(SEMI)
         return declarations
 
     def variable_declaration(self):
-        var_nodes = [Var(self.current_token)]
+        var_nodes = [Var(self.current_token, self.token_index)]
         self.eat(ID)
         while self.current_token.type == COMMA:
             self.eat(COMMA)
-            var_nodes.append(Var(self.current_token))
+            var_nodes.append(Var(self.current_token, self.token_index))
             self.eat(ID)
         self.eat(COLON)
         type_node = self.type_spec()
@@ -367,16 +937,16 @@ class Parser(object):
 
     def formal_parameters(self):
         param_nodes = []
-        param_tokens = [self.current_token]
+        param_tokens = [(self.current_token, self.token_index)]
         self.eat(ID)
         while self.current_token.type == COMMA:
             self.eat(COMMA)
-            param_tokens.append(self.current_token)
+            param_tokens.append((self.current_token, self.token_index))
             self.eat(ID)
         self.eat(COLON)
         type_node = self.type_spec()
-        for param_token in param_tokens:
-            param_node = Param(Var(param_token), type_node)
+        for param_token, pos in param_tokens:
+            param_node = Param(Var(param_token, pos), type_node)
             param_nodes.append(param_node)
         return param_nodes
 
@@ -384,16 +954,19 @@ class Parser(object):
         token = self.current_token
         if self.current_token.type == INTEGER:
             self.eat(INTEGER)
-        else:
+        elif self.current_token.type == REAL:
             self.eat(REAL)
+        else:
+            self.error(TYPE_SPEC)
         node = Type(token)
         return node
 
     def compound_statement(self):
+        pos = self.token_index
         self.eat(BEGIN)
         nodes = self.statement_list()
         self.eat(END)
-        root = Compound()
+        root = Compound(pos)
         for node in nodes:
             root.children.append(node)
         return root
@@ -404,52 +977,568 @@ class Parser(object):
         while self.current_token.type == SEMI:
             self.eat(SEMI)
             results.append(self.statement())
-        if self.current_token.type == ID:
-            self.error()
+        if self.current_token.type in STATEMENT_TOKENS:
+            self.error(SEMI)
         return results
 
     def statement(self):
         if self.current_token.type == BEGIN:
             node = self.compound_statement()
         elif self.current_token.type == ID:
-            node = self.assignment_statement()
+            node = self.identifier_statement()
+        elif self.current_token.type == IF:
+            node = self.if_statement()
+        elif self.current_token.type == WHILE:
+            node = self.while_statement()
+        elif self.current_token.type == FOR:
+            node = self.for_statement()
         else:
             node = self.empty()
         return node
 
+    def if_statement(self):
+        pos = self.token_index
+        self.eat(IF)
+        condition = self.expr()
+        self.eat(THEN)
+        then_statement = self.statement()
+        else_statement = None
+        if self.current_token.type == ELSE:
+            self.eat(ELSE)
+            else_statement = self.statement()
+        return If(condition, then_statement, else_statement, pos)
+
+    def while_statement(self):
+        pos = self.token_index
+        self.eat(WHILE)
+        condition = self.expr()
+        self.eat(DO)
+        body = self.statement()
+        return While(condition, body, pos)
+
+    def for_header(self):
+        self.eat(FOR)
+        var_node = self.variable()
+        self.eat(ASSIGN)
+        start = self.expr()
+        if self.current_token.type == DOWNTO:
+            self.eat(DOWNTO)
+            step = -1
+        else:
+            self.eat(TO)
+            step = 1
+        stop = self.expr()
+        self.eat(DO)
+        return var_node, start, stop, step
+
+    def for_statement(self):
+        pos = self.token_index
+        var_node, start, stop, step = self.for_header()
+        body = self.statement()
+        return For(var_node, start, stop, step, body, pos)
+
+    def identifier_statement(self):
+        pos = self.token_index
+        token = self.current_token
+        self.eat(ID)
+        if self.current_token.type == ASSIGN:
+            self.eat(ASSIGN)
+            right = self.expr()
+            return Assign(Var(token, pos), token, right, pos)
+        return self.proccall_statement(token, pos)
+
+    def proccall_statement(self, token, pos):
+        actual_params = []
+        if self.current_token.type == LPAREN:
+            self.eat(LPAREN)
+            if self.current_token.type != RPAREN:
+                actual_params.append(self.expr())
+                while self.current_token.type == COMMA:
+                    self.eat(COMMA)
+                    actual_params.append(self.expr())
+            self.eat(RPAREN)
+        return ProcedureCall(token.value, actual_params, pos)
+
     def assignment_statement(self):
+        pos = self.token_index
         left = self.variable()
         token = self.current_token
         self.eat(ASSIGN)
         right = self.expr()
-        node = Assign(left, token, right)
+        node = Assign(left, token, right, pos)
         return node
 
     def variable(self):
-        node = Var(self.current_token)
+        node = Var(self.current_token, self.token_index)
         self.eat(ID)
         return node
 
     def empty(self):
-        return NoOp()
+        return NoOp(self.token_index)
 
     def parse(self):
         node = self.program()
         if self.current_token.type != EOF:
-            self.error()
+            self.error(EOF)
+        return node
+
+    def parse_session_input(self):
+        declarations = self.declarations()
+        statements = []
+        if self.current_token.type != EOF:
+            statements = self.statement_list()
+        if self.current_token.type != EOF:
+            self.error(EOF)
+        return declarations, statements
+
+
+def run_stackless(routine):
+    stack = [routine]
+    value = None
+    error = None
+    while True:
+        try:
+            if error is None:
+                child = stack[-1].send(value)
+            else:
+                # a failed child routine raises at the yield in its caller
+                child = stack[-1].throw(error)
+                error = None
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            error = None
+            if not stack:
+                return value
+        except Exception as e:
+            stack.pop()
+            if not stack:
+                raise
+            error = e
+        else:
+            stack.append(child)
+            value = None
+
+
+GROUP_PRECEDENCE, RELATIONAL_PRECEDENCE, ADDITIVE_PRECEDENCE, MULTIPLICATIVE_PRECEDENCE, UNARY_PRECEDENCE = range(5)
+
+BINARY_PRECEDENCE = {
+    EQUAL: RELATIONAL_PRECEDENCE,
+    NOT_EQUAL: RELATIONAL_PRECEDENCE,
+    LESS_THAN: RELATIONAL_PRECEDENCE,
+    LESS_EQUAL: RELATIONAL_PRECEDENCE,
+    GREATER_THAN: RELATIONAL_PRECEDENCE,
+    GREATER_EQUAL: RELATIONAL_PRECEDENCE,
+    PLUS: ADDITIVE_PRECEDENCE,
+    MINUS: ADDITIVE_PRECEDENCE,
+    OR: ADDITIVE_PRECEDENCE,
+    MULTIPLY: MULTIPLICATIVE_PRECEDENCE,
+    INTEGER_DIV: MULTIPLICATIVE_PRECEDENCE,
+    FLOAT_DIV: MULTIPLICATIVE_PRECEDENCE,
+    AND: MULTIPLICATIVE_PRECEDENCE,
+}
+
+
+class StacklessParser(Parser):
+    # expr() builds its result through operand(), unary_node() and binary_node(), so a subclass can
+    # produce something other than AST nodes from the same grammar
+    def unary_node(self, token, operand, pos):
+        return UnaryOp(token, operand, pos)
+
+    def binary_node(self, left, token, right, pos):
+        return BinOp(left=left, op=token, right=right, pos=pos)
+
+    def operand(self):
+        token = self.current_token
+        pos = self.token_index
+        if token.type == INTEGER_CONST:
+            self.eat(INTEGER_CONST)
+            return Num(token, pos)
+        elif token.type == REAL_CONST:
+            self.eat(REAL_CONST)
+            return Num(token, pos)
+        else:
+            return self.variable()
+
+    def expr(self):
+        operands = []
+        operators = []
+        while True:
+            token = self.current_token
+            while token.type in (PLUS, MINUS, NOT, LPAREN):
+                pos = self.token_index
+                self.eat(token.type)
+                operators.append((GROUP_PRECEDENCE if token.type == LPAREN else UNARY_PRECEDENCE, token, pos))
+                token = self.current_token
+            operands.append(self.operand())
+            while True:
+                while operators and operators[-1][0] == UNARY_PRECEDENCE:
+                    unary_precedence, unary_token, pos = operators.pop()
+                    operands.append(self.unary_node(unary_token, operands.pop(), pos))
+                token = self.current_token
+                precedence = BINARY_PRECEDENCE.get(token.type, GROUP_PRECEDENCE)
+                while operators and operators[-1][0] >= max(precedence, RELATIONAL_PRECEDENCE):
+                    right = operands.pop()
+                    operator_precedence, operator_token, pos = operators.pop()
+                    if operator_precedence == precedence == RELATIONAL_PRECEDENCE:
+                        self.error()
+                    operands.append(self.binary_node(operands.pop(), operator_token, right, pos))
+                if precedence != GROUP_PRECEDENCE:
+                    pos = self.token_index
+                    self.eat(token.type)
+                    operators.append((precedence, token, pos))
+                    break
+                if not operators:
+                    return operands.pop()
+                self.eat(RPAREN)
+                operators.pop()
+
+    def program_routine(self):
+        pos = self.token_index
+        self.eat(PROGRAM)
+        var_node = self.variable()
+        prog_name = var_node.value
+        self.eat(SEMI)
+        block_node = yield self.block_routine()
+        program_node = Program(prog_name, block_node, pos)
+        self.eat(DOT)
+        return program_node
+
+    def block_routine(self):
+        declaration_nodes = yield self.declarations_routine()
+        compound_statement_node = yield self.compound_statement_routine()
+        node = Block(declaration_nodes, compound_statement_node)
+        return node
+
+    def declarations_routine(self):
+        declarations = []
+        while self.current_token.type == VAR:
+            self.eat(VAR)
+            while self.at_variable_declaration():
+                var_decl = self.variable_declaration()
+                declarations.extend(var_decl)
+                self.eat(SEMI)
+        while self.current_token.type == PROCEDURE:
+            pos = self.token_index
+            self.eat(PROCEDURE)
+            proc_name = self.current_token.value
+            self.eat(ID)
+            params = []
+            if self.current_token.type == LPAREN:
+                self.eat(LPAREN)
+                params = self.formal_parameter_list()
+                self.eat(RPAREN)
+            self.eat(SEMI)
+            block_node = yield self.block_routine()
+            proc_decl = ProcedureDecl(proc_name, params, block_node, pos)
+            declarations.append(proc_decl)
+            self.eat(SEMI)
+        return declarations
+
+    def compound_statement_routine(self):
+        pos = self.token_index
+        self.eat(BEGIN)
+        nodes = yield self.statement_list_routine()
+        self.eat(END)
+        root = Compound(pos)
+        for node in nodes:
+            root.children.append(node)
+        return root
+
+    def statement_list_routine(self):
+        node = yield self.statement_routine()
+        results = [node]
+        while self.current_token.type == SEMI:
+            self.eat(SEMI)
+            node = yield self.statement_routine()
+            results.append(node)
+        if self.current_token.type in STATEMENT_TOKENS:
+            self.error(SEMI)
+        return results
+
+    def statement_routine(self):
+        if self.current_token.type == BEGIN:
+            node = yield self.compound_statement_routine()
+        elif self.current_token.type == ID:
+            node = self.identifier_statement()
+        elif self.current_token.type == IF:
+            node = yield self.if_statement_routine()
+        elif self.current_token.type == WHILE:
+            node = yield self.while_statement_routine()
+        elif self.current_token.type == FOR:
+            node = yield self.for_statement_routine()
+        else:
+            node = self.empty()
         return node
 
+    def if_statement_routine(self):
+        pos = self.token_index
+        self.eat(IF)
+        condition = self.expr()
+        self.eat(THEN)
+        then_statement = yield self.statement_routine()
+        else_statement = None
+        if self.current_token.type == ELSE:
+            self.eat(ELSE)
+            else_statement = yield self.statement_routine()
+        return If(condition, then_statement, else_statement, pos)
+
+    def while_statement_routine(self):
+        pos = self.token_index
+        self.eat(WHILE)
+        condition = self.expr()
+        self.eat(DO)
+        body = yield self.statement_routine()
+        return While(condition, body, pos)
+
+    def for_statement_routine(self):
+        pos = self.token_index
+        var_node, start, stop, step = self.for_header()
+        body = yield self.statement_routine()
+        return For(var_node, start, stop, step, body, pos)
+
+    def program(self):
+        return run_stackless(self.program_routine())
+
+    def block(self):
+        return run_stackless(self.block_routine())
+
+    def declarations(self):
+        return run_stackless(self.declarations_routine())
+
+    def compound_statement(self):
+        return run_stackless(self.compound_statement_routine())
+
+    def statement_list(self):
+        return run_stackless(self.statement_list_routine())
+
+    def statement(self):
+        return run_stackless(self.statement_routine())
+
+    def if_statement(self):
+        return run_stackless(self.if_statement_routine())
+
+    def while_statement(self):
+        return run_stackless(self.while_statement_routine())
+
+    def for_statement(self):
+        return run_stackless(self.for_statement_routine())
+
+
+STATEMENT_SYNC_TOKENS = (SEMI, END, BEGIN, EOF)
+DECLARATION_SYNC_TOKENS = (SEMI, VAR, PROCEDURE, BEGIN, EOF)
+HEADER_SYNC_TOKENS = (VAR, PROCEDURE, BEGIN, EOF)
+
+
+class RecoveringParser(StacklessParser):
+    def __init__(self, lexer):
+        self.errors = []
+        self.recovering = False
+        self.lexer = lexer
+        self.token_index = 0
+        self.current_token = self.next_token()
+
+    def next_token(self):
+        # an invalid character is reported and skipped; the token after it must be accepted before
+        # further syntax errors are reported, so the gap it leaves gives no second diagnostic
+        while True:
+            try:
+                return self.lexer.get_next_token()
+            except LexerError as error:
+                self.errors.append(error)
+                self.token_index += 1
+                self.recovering = True
+
+    def at_variable_declaration(self):
+        if self.current_token.type != ID:
+            return False
+        try:
+            return self.lexer.peek_token().type not in (ASSIGN, LPAREN)
+        except LexerError:
+            # the invalid character is reported once the declaration reaches it
+            return True
+
+    def eat(self, token_type):
+        if self.current_token.type == token_type:
+            self.recovering = False
+            self.current_token = self.next_token()
+            self.token_index += 1
+        else:
+            self.error(token_type)
+
+    def report(self, error):
+        # errors are suppressed until a token is accepted again, so one mistake gives one diagnostic
+        if not self.recovering:
+            self.errors.append(error)
+            self.recovering = True
+
+    def expect(self, token_type):
+        if self.current_token.type == token_type:
+            self.eat(token_type)
+        else:
+            self.report(ParserError(self.current_token, self.token_index, token_type))
+
+    def synchronize(self, token_types):
+        while self.current_token.type not in token_types:
+            self.current_token = self.next_token()
+            self.token_index += 1
+
+    def program_routine(self):
+        pos = self.token_index
+        prog_name = None
+        try:
+            self.eat(PROGRAM)
+            prog_name = self.variable().value
+            self.eat(SEMI)
+        except ParserError as error:
+            self.report(error)
+            self.synchronize(DECLARATION_SYNC_TOKENS)
+            if self.current_token.type == SEMI:
+                self.eat(SEMI)
+        block_node = yield self.block_routine()
+        program_node = Program(prog_name, block_node, pos)
+        self.expect(DOT)
+        return program_node
+
+    def declarations_routine(self):
+        declarations = []
+        while self.current_token.type == VAR:
+            self.eat(VAR)
+            while self.at_variable_declaration():
+                try:
+                    declarations.extend(self.variable_declaration())
+                except ParserError as error:
+                    self.report(error)
+                    self.synchronize(DECLARATION_SYNC_TOKENS)
+                self.expect(SEMI)
+        while self.current_token.type == PROCEDURE:
+            pos = self.token_index
+            proc_name = None
+            params = []
+            try:
+                self.eat(PROCEDURE)
+                proc_name = self.current_token.value
+                self.eat(ID)
+                if self.current_token.type == LPAREN:
+                    self.eat(LPAREN)
+                    params = self.formal_parameter_list()
+                    self.eat(RPAREN)
+                self.eat(SEMI)
+            except ParserError as error:
+                self.report(error)
+                self.synchronize(HEADER_SYNC_TOKENS)
+            block_node = yield self.block_routine()
+            declarations.append(ProcedureDecl(proc_name, params, block_node, pos))
+            self.expect(SEMI)
+        return declarations
+
+    def compound_statement_routine(self):
+        pos = self.token_index
+        self.expect(BEGIN)
+        nodes = yield self.statement_list_routine()
+        while self.current_token.type not in (END, EOF):
+            self.report(ParserError(self.current_token, self.token_index, END))
+            self.synchronize(STATEMENT_SYNC_TOKENS)
+            if self.current_token.type in (SEMI, BEGIN):
+                more_nodes = yield self.statement_list_routine()
+                nodes.extend(more_nodes)
+        self.expect(END)
+        root = Compound(pos)
+        for node in nodes:
+            root.children.append(node)
+        return root
+
+    def statement_list_routine(self):
+        node = yield self.statement_routine()
+        results = [node]
+        while True:
+            if self.current_token.type == SEMI:
+                self.eat(SEMI)
+            elif self.current_token.type in STATEMENT_TOKENS:
+                self.report(ParserError(self.current_token, self.token_index, SEMI))
+            else:
+                return results
+            node = yield self.statement_routine()
+            results.append(node)
+
+    def statement_routine(self):
+        pos = self.token_index
+        try:
+            node = yield StacklessParser.statement_routine(self)
+        except ParserError as error:
+            self.report(error)
+            self.synchronize(STATEMENT_SYNC_TOKENS)
+            node = NoOp(pos)
+        return node
+
+    def parse(self):
+        node = self.program()
+        if self.current_token.type != EOF:
+            self.report(ParserError(self.current_token, self.token_index, EOF))
+        return node
+
+    def diagnostics(self):
+        if not self.errors:
+            return []
+        source_map = SourceMap(self.lexer)
+        return sorted(
+            (source_map.offset_line_col(error.offset) if isinstance(error, LexerError)
+             else source_map.line_col(error.token_index)) + (str(error),)
+            for error in self.errors
+        )
+
 
 class NodeVisitor(object):
+    _dispatch_table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch_table = {}
+
+    @classmethod
+    def resolve_visitor(cls, node_class):
+        visitor = getattr(cls, "visit_" + node_class.__name__, cls.generic_visit)
+        cls._dispatch_table[node_class] = visitor
+        return visitor
+
     def visit(self, node):
-        method_name = "visit_" + type(node).__name__
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        visitor = self._dispatch_table.get(node.__class__)
+        if visitor is None:
+            visitor = self.resolve_visitor(node.__class__)
+        return visitor(self, node)
+
+    def lookup_visitor(self, node):
+        return self._dispatch_table.get(node.__class__) or self.resolve_visitor(node.__class__)
 
     def generic_visit(self, node):
         raise Exception("No visit_{} method".format(type(node).__name__))
 
 
+class StacklessNodeVisitor(NodeVisitor):
+    def visit(self, node):
+        dispatch_table = self._dispatch_table
+        visitor = dispatch_table.get(node.__class__) or self.resolve_visitor(node.__class__)
+        routine = visitor(self, node)
+        if routine.__class__ is not GeneratorType:
+            return routine
+        stack = [routine]
+        value = None
+        while True:
+            try:
+                child = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                if not stack:
+                    return value
+                continue
+            visitor = dispatch_table.get(child.__class__) or self.resolve_visitor(child.__class__)
+            value = visitor(self, child)
+            if value.__class__ is GeneratorType:
+                stack.append(value)
+                value = None
+
+
 class Symbol(object):
     def __init__(self, name, type=None):
         self.name = name
@@ -472,6 +1561,10 @@ class ProcedureSymbol(Symbol):
     def __init__(self, name, params=None):
         super().__init__(name)
         self.params = params if params is not None else []
+        self.scope_level = None
+        self.block_ast = None
+        self.frame_size = 0
+        self.var_names = ()
 
     def __str__(self):
         return '<{class_name}(name={name}, parameters={params})>'.format(
@@ -497,6 +1590,8 @@ class BuiltinTypeSymbol(Symbol):
 class VarSymbol(Symbol):
     def __init__(self, name, type):
         super().__init__(name, type)
+        self.scope_level = None
+        self.slot = None
 
     def __str__(self):
         return "<{class_name}(name='{name}', type='{type}')>".format(
@@ -506,12 +1601,89 @@ class VarSymbol(Symbol):
     __repr__ = __str__
 
 
+class SymbolTableListener(object):
+    def insert(self, scope, symbol):
+        pass
+
+    def lookup(self, scope, name, symbol):
+        pass
+
+    def enter_scope(self, scope):
+        pass
+
+    def leave_scope(self, scope):
+        pass
+
+
+class PrintingListener(SymbolTableListener):
+    def insert(self, scope, symbol):
+        print("Insert: %s" % symbol.name)
+
+    def lookup(self, scope, name, symbol):
+        print("Lookup: %s. (Scope name: %s)" % (name, scope.scope_name))
+
+    def enter_scope(self, scope):
+        print("ENTER scope: %s" % scope.scope_name)
+
+    def leave_scope(self, scope):
+        print(scope)
+        print("LEAVE scope: %s" % scope.scope_name)
+
+
+class CountingListener(SymbolTableListener):
+    def __init__(self):
+        self.inserts = Counter()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.scopes = Counter()
+
+    def insert(self, scope, symbol):
+        self.inserts[scope.scope_level] += 1
+
+    def lookup(self, scope, name, symbol):
+        if symbol is None:
+            self.misses[scope.scope_level] += 1
+        else:
+            self.hits[scope.scope_level] += 1
+
+    def enter_scope(self, scope):
+        self.scopes[scope.scope_level] += 1
+
+    def __str__(self):
+        h1 = "SYMBOL TABLE EVENTS"
+        lines = [h1, "=" * len(h1), "%5s %8s %8s %8s %8s" % ("Level", "Scopes", "Inserts", "Hits", "Misses")]
+        levels = sorted(set(self.inserts) | set(self.hits) | set(self.misses) | set(self.scopes))
+        for level in levels:
+            lines.append("%5d %8d %8d %8d %8d" % (
+                level, self.scopes[level], self.inserts[level], self.hits[level], self.misses[level]))
+        lines.append("%5s %8d %8d %8d %8d" % (
+            "Total", sum(self.scopes.values()), sum(self.inserts.values()),
+            sum(self.hits.values()), sum(self.misses.values())))
+        return "\n".join(lines)
+
+    __repr__ = __str__
+
+
 class ScopedSymbolTable(object):
-    def __init__(self, scope_name, scope_level, enclosing_scope=None):
+    def __init__(self, scope_name, scope_level, enclosing_scope=None, listener=None):
         self._symbols = OrderedDict()
         self.scope_name = scope_name
         self.scope_level = scope_level
         self.enclosing_scope = enclosing_scope
+        self.slots = []
+        self.frozen = False
+        self._cache = {}
+        self._flat = None
+        if enclosing_scope is None:
+            self._versions = {}
+        else:
+            self._versions = enclosing_scope._versions
+        if listener is None and enclosing_scope is not None:
+            listener = enclosing_scope.listener
+        self.listener = listener
+        if listener is not None:
+            self.insert = self._traced_insert
+            self.lookup = self._traced_lookup
 
     def _init_builtins(self):
         self.insert(BuiltinTypeSymbol("INTEGER"))
@@ -535,41 +1707,185 @@ class ScopedSymbolTable(object):
     __repr__ = __str__
 
     def insert(self, symbol):
-        print("Insert: %s" % symbol.name)
+        if self.frozen:
+            raise Exception("Error: Cannot insert '%s' into frozen scope '%s'" % (symbol.name, self.scope_name))
         self._symbols[symbol.name] = symbol
+        self._versions[symbol.name] = self._versions.get(symbol.name, 0) + 1
+        if isinstance(symbol, VarSymbol):
+            symbol.scope_level = self.scope_level
+            symbol.slot = len(self.slots)
+            self.slots.append(symbol)
+
+    def _traced_insert(self, symbol):
+        self.listener.insert(self, symbol)
+        ScopedSymbolTable.insert(self, symbol)
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def rollback(self, symbol_count):
+        while len(self._symbols) > symbol_count:
+            name, symbol = self._symbols.popitem()
+            self._versions[name] += 1
+            if isinstance(symbol, VarSymbol):
+                self.slots.pop()
+
+    @property
+    def var_names(self):
+        return tuple(symbol.name for symbol in self.slots)
 
     def lookup(self, name, current_scope_only=False):
-        print("Lookup: %s. (Scope name: %s)" % (name, self.scope_name))
         symbol = self._symbols.get(name)
-        if symbol is not None:
+        if symbol is not None or current_scope_only:
             return symbol
+        version = self._versions.get(name, 0)
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        unresolved = [self]
+        scope = self.enclosing_scope
+        while scope is not None:
+            symbol = scope._symbols.get(name)
+            if symbol is not None:
+                break
+            cached = scope._cache.get(name)
+            if cached is not None and cached[0] == version:
+                symbol = cached[1]
+                break
+            unresolved.append(scope)
+            scope = scope.enclosing_scope
+        entry = (version, symbol)
+        for scope in unresolved:
+            scope._cache[name] = entry
+        return symbol
+
+    def freeze(self):
+        self.frozen = True
+        self._cache = {}
+        if self.listener is None:
+            self.lookup = self._frozen_lookup
+
+    def flatten(self):
+        chain = []
+        scope = self
+        while scope is not None:
+            chain.append(scope._symbols)
+            scope = scope.enclosing_scope
+        flat = {}
+        for symbols in reversed(chain):
+            flat.update(symbols)
+        return flat
+
+    def _frozen_lookup(self, name, current_scope_only=False):
         if current_scope_only:
-            return None
-        while self.enclosing_scope is not None:
-            return self.enclosing_scope.lookup(name)
+            return self._symbols.get(name)
+        flat = self._flat
+        if flat is None:
+            flat = self._flat = self.flatten()
+        return flat.get(name)
+
+    def _traced_lookup(self, name, current_scope_only=False):
+        scope = self
+        while scope is not None:
+            symbol = scope._symbols.get(name)
+            if scope.listener is not None:
+                scope.listener.lookup(scope, name, symbol)
+            if symbol is not None or current_scope_only:
+                return symbol
+            scope = scope.enclosing_scope
+        return None
+
+
+UNARY_OPERATIONS = {
+    (INTEGER, PLUS): operator.pos,
+    (INTEGER, MINUS): operator.neg,
+    (REAL, PLUS): operator.pos,
+    (REAL, MINUS): operator.neg,
+    (BOOLEAN, NOT): operator.not_,
+}
 
+BINARY_OPERATIONS = {
+    (INTEGER, PLUS): (operator.add, INTEGER),
+    (INTEGER, MINUS): (operator.sub, INTEGER),
+    (INTEGER, MULTIPLY): (operator.mul, INTEGER),
+    (INTEGER, FLOAT_DIV): (operator.truediv, REAL),
+    (INTEGER, INTEGER_DIV): (operator.floordiv, INTEGER),
+    (REAL, PLUS): (operator.add, REAL),
+    (REAL, MINUS): (operator.sub, REAL),
+    (REAL, MULTIPLY): (operator.mul, REAL),
+    (REAL, FLOAT_DIV): (operator.truediv, REAL),
+    (BOOLEAN, AND): (None, BOOLEAN),
+    (BOOLEAN, OR): (None, BOOLEAN),
+}
 
-class SemanticAnalyzer(NodeVisitor):
-    def __init__(self):
-        self.current_scope = ScopedSymbolTable(scope_name="builtins", scope_level=0)
+COMPARISONS = {
+    EQUAL: operator.eq,
+    NOT_EQUAL: operator.ne,
+    LESS_THAN: operator.lt,
+    LESS_EQUAL: operator.le,
+    GREATER_THAN: operator.gt,
+    GREATER_EQUAL: operator.ge,
+}
+
+for operand_type in (INTEGER, REAL, BOOLEAN):
+    for op_type, comparison in COMPARISONS.items():
+        BINARY_OPERATIONS[operand_type, op_type] = (comparison, BOOLEAN)
+
+
+def operand_type(left_type, right_type):
+    if left_type == right_type:
+        return left_type
+    if left_type in (INTEGER, REAL) and right_type in (INTEGER, REAL):
+        return REAL
+    return None
+
+
+def convert(node, target_type):
+    if node.type == target_type:
+        return node
+    if node.type == INTEGER and target_type == REAL:
+        return ToReal(node)
+    return None
+
+
+class SemanticAnalyzer(StacklessNodeVisitor):
+    def __init__(self, listener=None):
+        self.listener = listener
+        self.current_scope = ScopedSymbolTable(scope_name="builtins", scope_level=0, listener=listener)
         self.current_scope._init_builtins()
+        self.scopes = []
+        self.loop_variables = set()
+
+    def enter_scope(self, scope):
+        self.scopes.append(scope)
+        self.current_scope = scope
+        if self.listener is not None:
+            self.listener.enter_scope(scope)
+
+    def leave_scope(self):
+        scope = self.current_scope
+        if self.listener is not None:
+            self.listener.leave_scope(scope)
+        self.current_scope = scope.enclosing_scope
 
     def visit_Program(self, node):
         program_name = node.program_name
         program_symbol = ProgramSymbol(program_name)
         self.current_scope.insert(program_symbol)
-        print("ENTER scope: global")
         global_scope = ScopedSymbolTable(scope_name="global", scope_level=1, enclosing_scope=self.current_scope)
-        self.current_scope = global_scope
-        self.visit(node.block_node)
-        print(global_scope)
-        self.current_scope = self.current_scope.enclosing_scope
-        print("LEAVE scope: global")
+        self.enter_scope(global_scope)
+        yield node.block_node
+        node.frame_size = len(global_scope.slots)
+        node.var_names = global_scope.var_names
+        self.leave_scope()
+        for scope in self.scopes:
+            scope.freeze()
 
     def visit_Block(self, node):
         for declaration in node.declarations:
-            self.visit(declaration)
-        self.visit(node.compound_statement)
+            yield declaration
+        yield node.compound_statement
 
     def visit_VarDecl(self, node):
         type_name = node.type_node.value
@@ -579,67 +1895,209 @@ class SemanticAnalyzer(NodeVisitor):
         if self.current_scope.lookup(var_name, current_scope_only=True):
             raise Exception("Error: Duplicate identifier '%s' found" % var_name)
         self.current_scope.insert(var_symbol)
+        node.var_node.address = (var_symbol.scope_level, var_symbol.slot)
 
     def visit_ProcedureDecl(self, node):
         proc_name = node.proc_name
         proc_symbol = ProcedureSymbol(proc_name)
         self.current_scope.insert(proc_symbol)
-        print("ENTER scope: %s" % proc_name)
+        proc_symbol.scope_level = self.current_scope.scope_level
+        proc_symbol.block_ast = node.block_node
         procedure_scope = ScopedSymbolTable(scope_name=proc_name, scope_level=self.current_scope.scope_level + 1, enclosing_scope=self.current_scope)
-        self.current_scope = procedure_scope
+        self.enter_scope(procedure_scope)
         for param in node.params:
             param_type = self.current_scope.lookup(param.type_node.value)
             param_name = param.var_node.value
             var_symbol = VarSymbol(param_name, param_type)
             self.current_scope.insert(var_symbol)
             proc_symbol.params.append(var_symbol)
+            param.var_node.address = (var_symbol.scope_level, var_symbol.slot)
 
-        self.visit(node.block_node)
+        yield node.block_node
+        node.frame_size = proc_symbol.frame_size = len(procedure_scope.slots)
+        node.var_names = proc_symbol.var_names = procedure_scope.var_names
 
-        print(procedure_scope)
-        self.current_scope = self.current_scope.enclosing_scope
-        print("LEAVE scope: %s" % proc_name)
+        self.leave_scope()
 
     def visit_UnaryOp(self, node):
-        self.visit(node.expr)
+        expr_type = yield node.expr
+        operation = UNARY_OPERATIONS.get((expr_type, node.op.type))
+        if operation is None:
+            raise Exception("Error: Operator '%s' cannot be applied to %s" % (OPERATOR_NAMES[node.op.type], expr_type))
+        node.operation = operation
+        node.type = expr_type
+        return expr_type
 
     def visit_BinOp(self, node):
-        self.visit(node.left)
-        self.visit(node.right)
+        left_type = yield node.left
+        right_type = yield node.right
+        entry = BINARY_OPERATIONS.get((operand_type(left_type, right_type), node.op.type))
+        if entry is None:
+            raise Exception("Error: Operator '%s' cannot be applied to %s and %s" % (
+                OPERATOR_NAMES[node.op.type], left_type, right_type))
+        node.operation, node.type = entry
+        return node.type
 
     def visit_Num(self, node):
-        pass
+        node.type = INTEGER if isinstance(node.value, int) else REAL
+        return node.type
 
     def visit_Compound(self, node):
         for child in node.children:
-            self.visit(child)
+            yield child
 
     def visit_Assign(self, node):
         var_name = node.left.value
         var_symbol = self.current_scope.lookup(var_name)
         if var_symbol is None:
             raise NameError(repr(var_name))
-        self.visit(node.right)
-        self.visit(node.left)
+        if var_symbol in self.loop_variables:
+            raise Exception("Error: Cannot assign to FOR control variable '%s'" % var_name)
+        value_type = yield node.right
+        var_type = yield node.left
+        right = convert(node.right, var_type)
+        if right is None:
+            raise Exception("Error: Cannot assign %s to %s variable '%s'" % (value_type, var_type, var_name))
+        node.right = right
+
+    def check_condition(self, condition_type):
+        if condition_type != BOOLEAN:
+            raise Exception("Error: Condition must be BOOLEAN, got %s" % condition_type)
+
+    def visit_If(self, node):
+        condition_type = yield node.condition
+        self.check_condition(condition_type)
+        yield node.then_statement
+        if node.else_statement is not None:
+            yield node.else_statement
+
+    def visit_While(self, node):
+        condition_type = yield node.condition
+        self.check_condition(condition_type)
+        yield node.body
+
+    def visit_For(self, node):
+        var_type = yield node.var_node
+        var_symbol = self.current_scope.lookup(node.var_node.value)
+        if var_type != INTEGER:
+            raise Exception("Error: FOR control variable '%s' must be INTEGER, got %s" % (var_symbol.name, var_type))
+        if var_symbol in self.loop_variables:
+            raise Exception("Error: Cannot assign to FOR control variable '%s'" % var_symbol.name)
+        for bound in (node.start, node.stop):
+            bound_type = yield bound
+            if bound_type != INTEGER:
+                raise Exception("Error: FOR loop bounds must be INTEGER, got %s" % bound_type)
+        self.loop_variables.add(var_symbol)
+        yield node.body
+        self.loop_variables.discard(var_symbol)
 
     def visit_Var(self, node):
         var_name = node.value
         var_symbol = self.current_scope.lookup(var_name)
         if var_symbol is None:
             raise Exception("Error: Symbol(identifier) not found '%s'" % var_name)
+        if not isinstance(var_symbol, VarSymbol):
+            raise Exception("Error: '%s' is not a variable" % var_name)
+        node.address = (var_symbol.scope_level, var_symbol.slot)
+        node.type = var_symbol.type.name
+        return node.type
+
+    def visit_ProcedureCall(self, node):
+        proc_name = node.proc_name
+        proc_symbol = self.current_scope.lookup(proc_name)
+        if proc_symbol is None:
+            raise Exception("Error: Symbol(identifier) not found '%s'" % proc_name)
+        if not isinstance(proc_symbol, ProcedureSymbol):
+            raise Exception("Error: '%s' is not a procedure" % proc_name)
+        if len(node.actual_params) != len(proc_symbol.params):
+            raise Exception("Error: Procedure '%s' expects %d arguments, got %d" % (
+                proc_name, len(proc_symbol.params), len(node.actual_params)))
+        for index, param in enumerate(node.actual_params):
+            arg_type = yield param
+            param_type = proc_symbol.params[index].type.name
+            arg = convert(param, param_type)
+            if arg is None:
+                raise Exception("Error: Argument %d of procedure '%s' must be %s, got %s" % (
+                    index + 1, proc_name, param_type, arg_type))
+            node.actual_params[index] = arg
+        node.proc_symbol = proc_symbol
 
     def visit_NoOp(self, node):
         pass
 
 
+class ActivationRecord(object):
+    __slots__ = ("proc_symbol", "frame", "blank_frame", "saved_frame")
+
+    def __init__(self, proc_symbol):
+        self.proc_symbol = proc_symbol
+        self.frame = [None] * proc_symbol.frame_size
+        self.blank_frame = (None,) * proc_symbol.frame_size
+        self.saved_frame = None
+
+
+class CallStack(object):
+    def __init__(self, frames):
+        self.frames = frames
+        self.records = []
+        self.pools = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def push(self, proc_symbol, args):
+        pool = self.pools.get(proc_symbol)
+        if pool:
+            record = pool.pop()
+        else:
+            record = ActivationRecord(proc_symbol)
+        frame = record.frame
+        for param, value in zip(proc_symbol.params, args):
+            frame[param.slot] = value
+        level = proc_symbol.scope_level + 1
+        frames = self.frames
+        if level < len(frames):
+            record.saved_frame = frames[level]
+            frames[level] = frame
+        else:
+            frames.append(frame)
+        self.records.append(record)
+
+    def pop(self):
+        record = self.records.pop()
+        proc_symbol = record.proc_symbol
+        self.frames[proc_symbol.scope_level + 1] = record.saved_frame
+        record.saved_frame = None
+        record.frame[:] = record.blank_frame
+        pool = self.pools.get(proc_symbol)
+        if pool is None:
+            pool = self.pools[proc_symbol] = []
+        pool.append(record)
+
+    def unwind(self):
+        while self.records:
+            self.pop()
+
+
+RECURSIVE_CALL_DEPTH = 32
+
+
 class Interpreter(NodeVisitor):
 
     def __init__(self, tree):
         self.tree = tree
         self.GLOBAL_MEMORY = OrderedDict()
+        self.frames = [None]
+        self.call_stack = CallStack(self.frames)
+        self._procedure_runner = None
 
     def visit_Program(self, node):
+        global_frame = [None] * node.frame_size
+        self.frames.append(global_frame)
         self.visit(node.block_node)
+        self.GLOBAL_MEMORY.update(
+            (name, value) for name, value in zip(node.var_names, global_frame) if value is not None
+        )
 
     def visit_Block(self, node):
         for declaration in node.declarations:
@@ -656,46 +2114,86 @@ class Interpreter(NodeVisitor):
         pass
 
     def visit_UnaryOp(self, node):
-        op = node.op.type
-        if op == PLUS:
-            return +self.visit(node.expr)
-        elif op == MINUS:
-            return -self.visit(node.expr)
+        return node.operation(self.visit(node.expr))
 
     def visit_BinOp(self, node):
-        if node.op.type == PLUS:
-            return self.visit(node.left) + self.visit(node.right)
-        elif node.op.type == MINUS:
-            return self.visit(node.left) - self.visit(node.right)
-        elif node.op.type == MULTIPLY:
-            return self.visit(node.left) * self.visit(node.right)
-        elif node.op.type == FLOAT_DIV:
-            return self.visit(node.left) / self.visit(node.right)
-        elif node.op.type == INTEGER_DIV:
-            return self.visit(node.left) // self.visit(node.right)
+        operation = node.operation
+        if operation is not None:
+            return operation(self.visit(node.left), self.visit(node.right))
+        elif node.op.type == AND:
+            return self.visit(node.left) and self.visit(node.right)
+        return self.visit(node.left) or self.visit(node.right)
 
     def visit_Num(self, node):
         return node.value
 
+    def visit_ToReal(self, node):
+        return float(self.visit(node.expr))
+
     def visit_Compound(self, node):
         for child in node.children:
             self.visit(child)
 
     def visit_Assign(self, node):
-        var_name = node.left.value
-        self.GLOBAL_MEMORY[var_name] = self.visit(node.right)
+        level, slot = node.left.address
+        self.frames[level][slot] = self.visit(node.right)
 
     def visit_Var(self, node):
-        var_name = node.value
-        var_value = self.GLOBAL_MEMORY.get(var_name)
+        level, slot = node.address
+        var_value = self.frames[level][slot]
         if var_value is None:
-            raise NameError(repr(var_name))
+            raise NameError(repr(node.value))
         else:
             return var_value
 
     def visit_NoOp(self, node):
         pass
 
+    def loop_body(self, node):
+        return tuple((self.lookup_visitor(statement), statement) for statement in loop_statements(node))
+
+    def visit_If(self, node):
+        if self.visit(node.condition):
+            self.visit(node.then_statement)
+        elif node.else_statement is not None:
+            self.visit(node.else_statement)
+
+    def visit_While(self, node):
+        condition = node.condition
+        evaluate = self.lookup_visitor(condition)
+        body = self.loop_body(node.body)
+        while evaluate(self, condition):
+            for visitor, statement in body:
+                visitor(self, statement)
+
+    def visit_For(self, node):
+        level, slot = node.var_node.address
+        frame = self.frames[level]
+        start = self.visit(node.start)
+        stop = self.visit(node.stop)
+        body = self.loop_body(node.body)
+        for value in range(start, stop + node.step, node.step):
+            frame[slot] = value
+            for visitor, statement in body:
+                visitor(self, statement)
+
+    def visit_ProcedureCall(self, node):
+        args = [self.visit(param) for param in node.actual_params]
+        call_stack = self.call_stack
+        call_stack.push(node.proc_symbol, args)
+        if len(call_stack) > RECURSIVE_CALL_DEPTH:
+            # deeper calls run on the explicit stack, so recursion depth is not bounded by Python's
+            self.procedure_runner().visit(node.proc_symbol.block_ast)
+        else:
+            self.visit(node.proc_symbol.block_ast)
+        call_stack.pop()
+
+    def procedure_runner(self):
+        runner = self._procedure_runner
+        if runner is None:
+            runner = self._procedure_runner = procedure_runner(self.frames, self.call_stack)
+        return runner
+
     def interpret(self):
         tree = self.tree
         if tree is None:
@@ -703,7 +2201,368 @@ class Interpreter(NodeVisitor):
         return self.visit(tree)
 
 
+class StacklessInterpreter(StacklessNodeVisitor, Interpreter):
+    def visit_Program(self, node):
+        global_frame = [None] * node.frame_size
+        self.frames.append(global_frame)
+        yield node.block_node
+        self.GLOBAL_MEMORY.update(
+            (name, value) for name, value in zip(node.var_names, global_frame) if value is not None
+        )
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            yield declaration
+        yield node.compound_statement
+
+    def visit_UnaryOp(self, node):
+        value = yield node.expr
+        return node.operation(value)
+
+    def visit_BinOp(self, node):
+        left = yield node.left
+        operation = node.operation
+        if operation is not None:
+            right = yield node.right
+            return operation(left, right)
+        elif node.op.type == AND:
+            if not left:
+                return left
+        elif left:
+            return left
+        return (yield node.right)
+
+    def visit_ToReal(self, node):
+        value = yield node.expr
+        return float(value)
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            yield child
+
+    def visit_Assign(self, node):
+        level, slot = node.left.address
+        self.frames[level][slot] = yield node.right
+
+    def visit_If(self, node):
+        condition = yield node.condition
+        if condition:
+            yield node.then_statement
+        elif node.else_statement is not None:
+            yield node.else_statement
+
+    def visit_While(self, node):
+        condition = node.condition
+        body = loop_statements(node.body)
+        while (yield condition):
+            for statement in body:
+                yield statement
+
+    def visit_For(self, node):
+        level, slot = node.var_node.address
+        frame = self.frames[level]
+        start = yield node.start
+        stop = yield node.stop
+        body = loop_statements(node.body)
+        for value in range(start, stop + node.step, node.step):
+            frame[slot] = value
+            for statement in body:
+                yield statement
+
+    def visit_ProcedureCall(self, node):
+        args = []
+        for param in node.actual_params:
+            value = yield param
+            args.append(value)
+        self.call_stack.push(node.proc_symbol, args)
+        yield node.proc_symbol.block_ast
+        self.call_stack.pop()
+
+
+def procedure_runner(frames, call_stack):
+    runner = StacklessInterpreter(None)
+    runner.frames = frames
+    runner.call_stack = call_stack
+    return runner
+
+
+class Session(object):
+    def __init__(self, lexer_class=Lexer, parser_class=Parser, listener=None):
+        self.lexer_class = lexer_class
+        self.parser_class = parser_class
+        self.semantic_analyzer = SemanticAnalyzer(listener)
+        self.global_scope = ScopedSymbolTable(
+            scope_name="global", scope_level=1, enclosing_scope=self.semantic_analyzer.current_scope
+        )
+        self.semantic_analyzer.enter_scope(self.global_scope)
+        self.global_frame = []
+        self.interpreter = Interpreter(None)
+        self.interpreter.frames.append(self.global_frame)
+
+    def execute(self, text):
+        parser = self.parser_class(self.lexer_class(text))
+        declarations, statements = parser.parse_session_input()
+
+        global_scope = self.global_scope
+        symbol_count = len(global_scope)
+        try:
+            for node in declarations + statements:
+                self.semantic_analyzer.visit(node)
+        except Exception:
+            global_scope.rollback(symbol_count)
+            self.semantic_analyzer.current_scope = global_scope
+            self.semantic_analyzer.loop_variables.clear()
+            raise
+
+        global_frame = self.global_frame
+        global_frame.extend([None] * (len(global_scope.slots) - len(global_frame)))
+        try:
+            for statement in statements:
+                self.interpreter.visit(statement)
+        finally:
+            self.interpreter.call_stack.unwind()
+        return self.assigned_names(statements)
+
+    @staticmethod
+    def assigned_names(statements):
+        names = OrderedDict()
+        stack = list(reversed(statements))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Assign):
+                names[node.left.value] = node.left.address
+            elif isinstance(node, Compound):
+                stack.extend(reversed(node.children))
+            elif isinstance(node, If):
+                if node.else_statement is not None:
+                    stack.append(node.else_statement)
+                stack.append(node.then_statement)
+            elif isinstance(node, While):
+                stack.append(node.body)
+            elif isinstance(node, For):
+                names[node.var_node.value] = node.var_node.address
+                stack.append(node.body)
+        return names
+
+    def value(self, address):
+        level, slot = address
+        return self.interpreter.frames[level][slot]
+
+    @property
+    def GLOBAL_MEMORY(self):
+        return OrderedDict(
+            (name, value) for name, value in zip(self.global_scope.var_names, self.global_frame) if value is not None
+        )
+
+
+def make_interpreter(tree, backend="tree"):
+    if backend == "vm":
+        from vm import BytecodeCompiler, VirtualMachine
+        return VirtualMachine(BytecodeCompiler().compile(tree))
+    if backend == "closure":
+        from closure_compiler import ClosureInterpreter
+        return ClosureInterpreter(tree)
+    if backend == "stackless":
+        return StacklessInterpreter(tree)
+    return Interpreter(tree)
+
+
+LEXERS = {
+    "char": Lexer,
+    "bulk": BulkLexer,
+}
+
+PARSERS = {
+    "recursive": Parser,
+    "stackless": StacklessParser,
+}
+
+
+def make_listener(trace):
+    if trace == "print":
+        return PrintingListener()
+    elif trace == "count":
+        return CountingListener()
+    return None
+
+
+def observed_names(args):
+    if args.observe is None:
+        return None
+    return set(name.strip().lower() for name in args.observe.split(",") if name.strip())
+
+
+def analyze_program(lexer, args):
+    parser = PARSERS[args.parser](lexer, positions=bool(args.profile or args.profile_json))
+    tree = parser.parse()
+    listener = make_listener(args.trace)
+    semantic_analyzer = SemanticAnalyzer(listener)
+    semantic_analyzer.visit(tree)
+    if args.trace == "print":
+        print("Symbol Table contents:")
+        print(semantic_analyzer.current_scope)
+    elif args.trace == "count":
+        print(listener)
+
+    if args.optimize:
+        from optimizer import ConstantFolder, CommonSubexpressionEliminator, DeadStoreEliminator
+        folder = ConstantFolder()
+        tree = folder.optimize(tree)
+        print("Constant folding: %d nodes eliminated, %d variables propagated" % (
+            folder.eliminated, folder.propagated))
+        eliminator = CommonSubexpressionEliminator()
+        tree = eliminator.optimize(tree)
+        print("Common subexpressions: %d evaluations saved, %d temporaries" % (
+            eliminator.saved, eliminator.temporaries))
+        dead_stores = DeadStoreEliminator(observed_names(args))
+        tree = dead_stores.optimize(tree)
+        print("Dead stores: %d stores removed, %d variables removed" % (
+            dead_stores.stores, dead_stores.declarations))
+    return tree
+
+
+def analyze_cached(program_cache, source_digest, make_lexer, args):
+    variant = (args.optimize, observed_names(args), args.trace)
+    entry = program_cache.get(source_digest, *variant)
+    if entry is not None:
+        tree, output = entry
+        sys.stdout.write(output)
+        return tree
+    # the trace and optimizer reports are stored with the tree and replayed on a hit
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            tree = analyze_program(make_lexer(), args)
+    finally:
+        sys.stdout.write(output.getvalue())
+    program_cache.put(source_digest, tree, output.getvalue(), *variant)
+    return tree
+
+
+def check_program(lexer, name):
+    parser = RecoveringParser(lexer)
+    parser.parse()
+    for line, column, message in parser.diagnostics():
+        print("%s:%d:%d: %s" % (name, line, column, message))
+    return len(parser.errors)
+
+
+def run_session(args):
+    listener = make_listener(args.trace)
+    session = Session(LEXERS[args.lexer], PARSERS[args.parser], listener)
+    while True:
+        try:
+            text = input("spi> ")
+        except EOFError:
+            break
+        if not text:
+            continue
+
+        try:
+            assigned = session.execute(text)
+        except Exception as e:
+            print("%s: %s" % (type(e).__name__, e))
+            continue
+        for name, address in assigned.items():
+            print("%s = %s" % (name, session.value(address)))
+
+    if args.trace == "count":
+        print(listener)
+    print("Run-time GLOBAL_MEMORY contents:")
+    for k, v in sorted(session.GLOBAL_MEMORY.items()):
+        print("%s = %s" % (k, v))
+
+
+def run_program(tree, args, lexer=None):
+    profiling = args.profile or args.profile_json
+    if profiling:
+        from profiler import ProfilingInterpreter
+        interpreter = ProfilingInterpreter(tree, SourceMap(lexer) if lexer is not None else None)
+    else:
+        interpreter = make_interpreter(tree, args.backend)
+    interpreter.interpret()
+    observed = observed_names(args)
+    print("Run-time GLOBAL_MEMORY contents:")
+    for k, v in sorted(interpreter.GLOBAL_MEMORY.items()):
+        if observed is None or k in observed:
+            print("%s = %s" % (k, v))
+    if args.profile:
+        print(interpreter.report(args.profile_top))
+    if args.profile_json:
+        interpreter.write_json(args.profile_json)
+
+
 def main():
+    arg_parser = argparse.ArgumentParser(description="Simple Pascal interpreter")
+    arg_parser.add_argument("file", nargs="?",
+                            help="program file to run, read incrementally in chunks; without it spi reads "
+                                 "programs from the prompt")
+    arg_parser.add_argument("--backend", choices=("tree", "stackless", "vm", "closure"), default="tree",
+                            help="execution backend: recursive or explicit-stack AST walker, bytecode virtual machine "
+                                 "or compiled closures")
+    arg_parser.add_argument("--parser", choices=sorted(PARSERS), default="recursive",
+                            help="parser: recursive descent or explicit-stack for arbitrarily deep nesting")
+    arg_parser.add_argument("--lexer", choices=sorted(LEXERS), default="char",
+                            help="tokenizer: character-at-a-time or single-pass regular expression scanner")
+    arg_parser.add_argument("-O", "--optimize", action="store_true",
+                            help="fold constant expressions and reuse common subexpressions before running the program")
+    arg_parser.add_argument("--observe", metavar="NAMES",
+                            help="comma-separated global variables whose final values are reported; with -O, "
+                                 "stores and declarations that cannot affect them are removed (default: all)")
+    arg_parser.add_argument("--check", action="store_true",
+                            help="only parse, recovering after each syntax error, and report every error with its "
+                                 "line and column instead of running the program")
+    arg_parser.add_argument("--trace", choices=("print", "count", "off"), default="print",
+                            help="symbol table tracing: print every event, print event counts, or stay silent")
+    arg_parser.add_argument("--cache-dir", help="directory of the compiled program cache (default ~/.cache/spi)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="always lex, parse and analyze from scratch")
+    arg_parser.add_argument("--cache-stats", action="store_true", help="print cache hit/miss statistics on exit")
+    arg_parser.add_argument("--session", action="store_true",
+                            help="keep declarations and variables between lines; each line holds declarations "
+                                 "and/or statements instead of a whole program")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="count executions and time per AST node and procedure and print the hot spots")
+    arg_parser.add_argument("--profile-top", type=int, default=20, help="number of hot spots to print")
+    arg_parser.add_argument("--profile-json", help="write the full profile as JSON to this file")
+    args = arg_parser.parse_args()
+    if (args.profile or args.profile_json) and args.backend != "tree":
+        arg_parser.error("profiling is only supported by the tree backend")
+
+    if args.session:
+        run_session(args)
+        return
+
+    if args.check:
+        if args.file is not None:
+            if check_program(StreamLexer(args.file), args.file):
+                sys.exit(1)
+            return
+        while True:
+            try:
+                text = input("spi> ")
+            except EOFError:
+                break
+            if text:
+                check_program(LEXERS[args.lexer](text), "<input>")
+        return
+
+    program_cache = None
+    if not (args.no_cache or args.profile or args.profile_json):
+        from cache import ProgramCache, DEFAULT_CACHE_DIR, file_digest, text_digest
+        program_cache = ProgramCache(args.cache_dir or DEFAULT_CACHE_DIR)
+
+    if args.file is not None:
+        lexer = None
+        if program_cache is not None:
+            tree = analyze_cached(program_cache, file_digest(args.file), lambda: StreamLexer(args.file), args)
+        else:
+            lexer = StreamLexer(args.file)
+            tree = analyze_program(lexer, args)
+        run_program(tree, args, lexer)
+        if program_cache is not None and args.cache_stats:
+            print(program_cache)
+        return
+
     while True:
         try:
             text = input("spi> ")
@@ -712,20 +2571,22 @@ def main():
         if not text:
             continue
 
-        lexer = Lexer(text)
-        parser = Parser(lexer)
-        tree = parser.parse()
-        semantic_analyzer = SemanticAnalyzer()
-        semantic_analyzer.visit(tree)
-        print("Symbol Table contents:")
-        print(semantic_analyzer.current_scope)
+        lexer = None
+        if program_cache is not None:
+            tree = analyze_cached(program_cache, text_digest(text), lambda: LEXERS[args.lexer](text), args)
+        else:
+            lexer = LEXERS[args.lexer](text)
+            tree = analyze_program(lexer, args)
 
-        interpreter = Interpreter(tree)
-        interpreter.interpret()
-        print("Run-time GLOBAL_MEMORY contents:")
-        for k, v in sorted(interpreter.GLOBAL_MEMORY.items()):
-            print("%s = %s" % (k, v))
+        run_program(tree, args, lexer)
+
+    if program_cache is not None and args.cache_stats:
+        print(program_cache)
 
 
 if __name__ == "__main__":
-    main()
+    # Run through the imported module rather than __main__: cached trees are pickled by
+    # class reference, and classes defined in __main__ would be stored under that name,
+    # so entries written by "python spi.py" could not be loaded by batch.py or the tests.
+    import spi
+    spi.main()
@@ -1,82 +1,200 @@
-from spi import Lexer, Parser, NodeVisitor, BuiltinTypeSymbol, VarSymbol, ProcedureSymbol, ScopedSymbolTable
+import argparse
+import io
+import sys
 
-class SourceToSourceCompiler(NodeVisitor):
-    def __init__(self):
-        self.current_scope = ScopedSymbolTable(scope_name="builtins", scope_level=0)
+from spi import Lexer, Parser, StacklessParser, StreamLexer, StacklessNodeVisitor, VarSymbol,\
+    ProcedureSymbol, ScopedSymbolTable, PrintingListener, BinOp, OPERATOR_NAMES, BINARY_PRECEDENCE,\
+    RELATIONAL_PRECEDENCE, UNARY_PRECEDENCE, NOT
+
+
+def precedence(node):
+    if isinstance(node, BinOp):
+        return BINARY_PRECEDENCE[node.op.type]
+    return UNARY_PRECEDENCE
+
+
+class Emitter(object):
+    def __init__(self, stream, indent="   ", buffer_size=1 << 12):
+        self.stream = stream
+        self.indent = indent
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.indents = [""]
+        self.level = 0
+        self.prefix = ""
+        self.lines = 0
+        self.nested = 0
+        self.started = False
+        self.in_line = False
+        self.held_blank = False
+
+    def open_line(self):
+        parts = self.parts
+        if self.started:
+            parts.append("\n")
+        self.started = True
+        indents = self.indents
+        while len(indents) <= self.level:
+            indents.append(indents[-1] + self.indent)
+        parts.append(indents[self.level] + self.prefix)
+        self.prefix = ""
+
+    def begin_line(self):
+        if not self.in_line:
+            if self.held_blank:
+                self.held_blank = False
+                self.open_line()
+            self.open_line()
+            self.in_line = True
+
+    def write(self, text):
+        if not self.in_line:
+            self.begin_line()
+        self.parts.append(text)
+
+    def end_line(self):
+        self.lines += 1
+        if self.in_line:
+            self.in_line = False
+        elif self.nested:
+            # a blank last line of a nested statement is dropped
+            if self.held_blank:
+                self.open_line()
+            self.held_blank = True
+        else:
+            self.open_line()
+        if len(self.parts) >= self.buffer_size:
+            self.flush()
+
+    def indent_block(self):
+        self.level += 1
+        self.nested += 1
+
+    def dedent_block(self):
+        self.held_blank = False
+        self.nested -= 1
+        self.level -= 1
+
+    def mark(self):
+        self.begin_line()
+        return len(self.parts)
+
+    def take(self, mark):
+        parts = self.parts[mark:]
+        del self.parts[mark:]
+        return parts
+
+    def write_parts(self, parts):
+        self.parts.extend(parts)
+
+    def flush(self):
+        self.stream.write("".join(self.parts))
+        self.parts.clear()
+
+
+class SourceToSourceCompiler(StacklessNodeVisitor):
+    def __init__(self, listener=None, stream=None):
+        self.current_scope = ScopedSymbolTable(scope_name="builtins", scope_level=0, listener=listener)
+        self.stream = stream
+        self.emitter = None
         self.output = None
         self.current_scope._init_builtins()
 
     def visit_Block(self, node):
-        results = []
+        emitter = self.emitter
         for declaration in node.declarations:
-            result = self.visit(declaration)
-            results.append(result)
-        results.append("\nbegin")
-        result = self.visit(node.compound_statement)
-        result = "   " + result
-        results.append(result)
-        results.append('end')
-        return '\n'.join(results)
+            yield declaration
+        emitter.end_line()
+        emitter.write("begin")
+        emitter.end_line()
+        emitter.prefix = emitter.indent
+        yield node.compound_statement
+        emitter.write("end")
 
     def visit_Program(self, node):
         program_name = node.program_name
-        result_str = "program %s0;\n" % program_name
+        stream = self.stream if self.stream is not None else io.StringIO()
+        emitter = self.emitter = Emitter(stream)
+        emitter.write("program %s0;" % program_name)
+        emitter.end_line()
 
         global_scope = ScopedSymbolTable(scope_name="global", scope_level=1, enclosing_scope=self.current_scope)
         self.current_scope = global_scope
 
-        result_str += self.visit(node.block_node)
-        result_str += "."
-        result_str += " {END OF %s}" % program_name
-        self.output = result_str
+        yield node.block_node
+        emitter.write(".")
+        emitter.write(" {END OF %s}" % program_name)
+        emitter.flush()
+        if self.stream is None:
+            self.output = stream.getvalue()
 
         self.current_scope = self.current_scope.enclosing_scope
 
     def visit_Compound(self, node):
-        results = []
+        emitter = self.emitter
+        lines = emitter.lines
         for child in node.children:
-            result = self.visit(child)
-            if result is None:
-                continue
-            results.append(result)
-        return "\n".join(results)
+            yield child
+        if emitter.lines == lines:
+            emitter.end_line()
 
     def visit_NoOp(self, node):
         pass
 
+    def operand(self, node, parenthesize):
+        if parenthesize:
+            self.emitter.write("(")
+            yield node
+            self.emitter.write(")")
+        else:
+            yield node
+
     def visit_BinOp(self, node):
-        t1 = self.visit(node.left)
-        t2 = self.visit(node.right)
-        return "%s %s %s" % (t1, node.op.value, t2)
+        node_precedence = BINARY_PRECEDENCE[node.op.type]
+        # operators are left associative and relational operators do not chain
+        left_precedence = precedence(node.left)
+        yield from self.operand(node.left, left_precedence < node_precedence or
+                                left_precedence == node_precedence == RELATIONAL_PRECEDENCE)
+        self.emitter.write(" %s " % OPERATOR_NAMES[node.op.type])
+        yield from self.operand(node.right, precedence(node.right) <= node_precedence)
+
+    def visit_UnaryOp(self, node):
+        self.emitter.write("NOT " if node.op.type == NOT else OPERATOR_NAMES[node.op.type])
+        yield from self.operand(node.expr, precedence(node.expr) < UNARY_PRECEDENCE)
+
+    def visit_Num(self, node):
+        self.emitter.write(str(node.value))
 
     def visit_ProcedureDecl(self, node):
+        emitter = self.emitter
         proc_name = node.proc_name
         proc_symbol = ProcedureSymbol(proc_name)
         self.current_scope.insert(proc_symbol)
-        result_str = "procedure %s%s" % (proc_name, self.current_scope.scope_level)
+        proc_symbol.scope_level = self.current_scope.scope_level
+        emitter.level += 1
+        emitter.write("procedure %s%s" % (proc_name, self.current_scope.scope_level))
         procedure_scope = ScopedSymbolTable(scope_name=proc_name, scope_level=self.current_scope.scope_level + 1, enclosing_scope=self.current_scope)
         self.current_scope = procedure_scope
         if node.params:
-            result_str += "("
-        formal_params = []
-        for param in node.params:
+            emitter.write("(")
+        for index, param in enumerate(node.params):
             param_type = self.current_scope.lookup(param.type_node.value)
             param_name = param.var_node.value
             var_symbol = VarSymbol(param_name, param_type)
             self.current_scope.insert(var_symbol)
             proc_symbol.params.append(var_symbol)
-            scope_level = str(self.current_scope.scope_level)
-            formal_params.append("%s : %s0" % (param_name + scope_level,param_type.name))
-        result_str += "; ".join(formal_params)
+            if index:
+                emitter.write("; ")
+            emitter.write("%s%s : %s0" % (param_name, self.current_scope.scope_level, param_type.name))
         if node.params:
-            result_str += ")"
-        result_str += ";"
-        result_str += "\n"
-        result_str += self.visit(node.block_node)
-        result_str += "; {END OF %s}" % proc_name
-        result_str = "\n".join("   " + line for line in result_str.splitlines())
+            emitter.write(")")
+        emitter.write(";")
+        emitter.end_line()
+        yield node.block_node
+        emitter.write("; {END OF %s}" % proc_name)
+        emitter.end_line()
+        emitter.level -= 1
         self.current_scope = self.current_scope.enclosing_scope
-        return result_str
 
     def visit_VarDecl(self, node):
         type_name = node.type_node.value
@@ -87,24 +205,109 @@ class SourceToSourceCompiler(NodeVisitor):
             raise Exception("Error: Duplicate identifier '%s' found" % var_name)
 
         self.current_scope.insert(var_symbol)
-        scope_level = str(self.current_scope.scope_level)
-        return "   var %s : %s0;" % (var_name + scope_level, type_name)
+        self.emitter.write("   var %s%s : %s0;" % (var_name, self.current_scope.scope_level, type_name))
+        self.emitter.end_line()
 
     def visit_Assign(self, node):
-        t2 = self.visit(node.right)
-        t1 = self.visit(node.left)
-        return "%s %s %s;" % (t1, ":=", t2)
+        emitter = self.emitter
+        mark = emitter.mark()
+        yield node.right
+        right = emitter.take(mark)
+        yield node.left
+        emitter.write(" := ")
+        emitter.write_parts(right)
+        emitter.write(";")
+        emitter.end_line()
+
+    def nested_statement(self, node):
+        emitter = self.emitter
+        emitter.write("begin")
+        emitter.end_line()
+        emitter.indent_block()
+        yield node
+        emitter.dedent_block()
+        emitter.write("end")
+
+    def visit_If(self, node):
+        emitter = self.emitter
+        emitter.write("if ")
+        yield node.condition
+        emitter.write(" then")
+        emitter.end_line()
+        yield from self.nested_statement(node.then_statement)
+        if node.else_statement is not None:
+            emitter.end_line()
+            emitter.write("else")
+            emitter.end_line()
+            yield from self.nested_statement(node.else_statement)
+        emitter.write(";")
+        emitter.end_line()
+
+    def visit_While(self, node):
+        emitter = self.emitter
+        emitter.write("while ")
+        yield node.condition
+        emitter.write(" do")
+        emitter.end_line()
+        yield from self.nested_statement(node.body)
+        emitter.write(";")
+        emitter.end_line()
+
+    def visit_For(self, node):
+        emitter = self.emitter
+        emitter.write("for ")
+        yield node.var_node
+        emitter.write(" := ")
+        yield node.start
+        emitter.write(" to " if node.step > 0 else " downto ")
+        yield node.stop
+        emitter.write(" do")
+        emitter.end_line()
+        yield from self.nested_statement(node.body)
+        emitter.write(";")
+        emitter.end_line()
+
+    def visit_ProcedureCall(self, node):
+        emitter = self.emitter
+        proc_name = node.proc_name
+        proc_symbol = self.current_scope.lookup(proc_name)
+        if proc_symbol is None:
+            raise Exception("Error: Symbol(identifier) not found '%s'" % proc_name)
+        emitter.write("%s%s(" % (proc_name, proc_symbol.scope_level))
+        for index, param in enumerate(node.actual_params):
+            if index:
+                emitter.write(", ")
+            yield param
+        emitter.write(");")
+        emitter.end_line()
 
     def visit_Var(self, node):
         var_name = node.value
         var_symbol = self.current_scope.lookup(var_name)
         if var_symbol is None:
             raise Exception("Error: Symbol(identifier) not found '%s'" % var_name)
-        scope_level = str(self.current_scope.scope_level)
-        return "<%s:%s0>" % (var_name + scope_level, var_symbol.type.name)
+        self.emitter.write("<%s%s:%s0>" % (var_name, self.current_scope.scope_level, var_symbol.type.name))
 
 
-if __name__ == "__main__":
+def main():
+    arg_parser = argparse.ArgumentParser(description="Translate Pascal programs to annotated Pascal source")
+    arg_parser.add_argument("file", nargs="?",
+                            help="program file to translate in one streaming pass; without it programs are read "
+                                 "from the prompt and symbol table events are printed")
+    arg_parser.add_argument("-o", "--output", help="write the translation to this file instead of stdout")
+    args = arg_parser.parse_args()
+
+    if args.file is not None:
+        tree = StacklessParser(StreamLexer(args.file)).parse()
+        output = open(args.output, "w") if args.output else sys.stdout
+        try:
+            SourceToSourceCompiler(stream=output).visit(tree)
+            output.write("\n")
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        return
+
     while True:
         try:
             text = input("src2src> ")
@@ -117,6 +320,10 @@ if __name__ == "__main__":
         parser = Parser(lexer)
         tree = parser.parse()
 
-        source_compiler = SourceToSourceCompiler()
+        source_compiler = SourceToSourceCompiler(PrintingListener())
         source_compiler.visit(tree)
-        print(source_compiler.output)
\ No newline at end of file
+        print(source_compiler.output)
+
+
+if __name__ == "__main__":
+    main()
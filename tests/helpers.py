@@ -0,0 +1,21 @@
+from spi import Lexer, Parser, SemanticAnalyzer, make_interpreter
+
+BACKENDS = ("tree", "stackless", "vm", "closure")
+
+
+def analyze(text):
+    tree = Parser(Lexer(text)).parse()
+    SemanticAnalyzer().visit(tree)
+    return tree
+
+
+def outcome(interpreter, *args):
+    try:
+        interpreter.interpret(*args)
+    except Exception as e:
+        return type(e).__name__
+    return dict(interpreter.GLOBAL_MEMORY)
+
+
+def run(tree, backend="tree"):
+    return outcome(make_interpreter(tree, backend))
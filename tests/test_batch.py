@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROGRAMS = {
+    "a_good.pas": "program Good; var x, y : integer; begin x := 6; y := x * 7 end.",
+    "b_divide.pas": "program Divide; var x : integer; begin x := 0; x := 1 div x end.",
+    "c_syntax.pas": "program Syntax; var x : integer; begin x := end.",
+    "d_types.pas": "program Types; var x : integer; begin x := 1 / 2 end.",
+    "nested/e_loop.pas": "program Loop; var i, s : integer; begin s := 0; for i := 1 to 4 do s := s + i end.",
+    "notes.txt": "not a program",
+}
+
+OPTIONS = {"backend": "tree", "parser": "recursive", "lexer": "bulk", "optimize": False, "check": False,
+           "cache_dir": None}
+
+
+class BatchRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        for name, text in PROGRAMS.items():
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(text)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def results(self, workers, **options):
+        paths = list(batch.find_programs([self.root], "*.pas"))
+        results = batch.run_batch(paths, dict(OPTIONS, **options), workers=workers)
+        return {os.path.relpath(result["path"], self.root): result for result in results}
+
+    def test_programs_are_found_in_sorted_order(self):
+        self.assertEqual([os.path.relpath(path, self.root) for path in batch.find_programs([self.root], "*.pas")],
+                         ["a_good.pas", "b_divide.pas", "c_syntax.pas", "d_types.pas",
+                          os.path.join("nested", "e_loop.pas")])
+
+    def test_failures_do_not_stop_the_batch(self):
+        results = self.results(workers=2)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results["a_good.pas"]["memory"], {"x": 6, "y": 42})
+        self.assertEqual(results[os.path.join("nested", "e_loop.pas")]["memory"], {"i": 4, "s": 10})
+        errors = {name: (result["error"]["phase"], result["error"]["type"])
+                  for name, result in results.items() if not result["ok"]}
+        self.assertEqual(errors, {"b_divide.pas": ("interpret", "ZeroDivisionError"),
+                                  "c_syntax.pas": ("parse", "ParserError"),
+                                  "d_types.pas": ("analyze", "Exception")})
+
+    def test_worker_pool_matches_a_single_process(self):
+        def comparable(results):
+            return {name: (result["ok"], result["memory"], result["error"]) for name, result in results.items()}
+        self.assertEqual(comparable(self.results(workers=3)), comparable(self.results(workers=1)))
+
+    def test_timings_cover_each_phase(self):
+        result = self.results(workers=1, backend="vm")["a_good.pas"]
+        self.assertEqual(sorted(result["timings"]), ["analyze", "compile", "interpret", "lex", "parse", "read"])
+        self.assertTrue(all(seconds >= 0 for seconds in result["timings"].values()))
+
+    def test_check_reports_diagnostics(self):
+        result = self.results(workers=1, check=True)["c_syntax.pas"]
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["diagnostics"],
+                         [{"line": 1, "column": 45, "message": "Invalid syntax: expected identifier, found 'END'"}])
+
+    def test_command_line_streams_json_lines(self):
+        output = os.path.join(self.root, "results.jsonl")
+        completed = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "batch.py"), self.root, "-j", "2", "--no-cache", "--ordered",
+             "-o", output], capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 1)
+        self.assertIn("5 programs, 0 from cache, 3 failed", completed.stderr)
+        with open(output) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([os.path.basename(line["path"]) for line in lines],
+                         ["a_good.pas", "b_divide.pas", "c_syntax.pas", "d_types.pas", "e_loop.pas"])
+        self.assertEqual([line["ok"] for line in lines], [True, False, False, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+from benchmarks import generate_program
+from helpers import BACKENDS, analyze, run
+
+
+class GeneratorTest(unittest.TestCase):
+    def test_seed_fixes_the_program(self):
+        self.assertEqual(generate_program(200, seed=7), generate_program(200, seed=7))
+        self.assertNotEqual(generate_program(200, seed=7), generate_program(200, seed=8))
+
+    def test_generated_program_parses_and_runs(self):
+        text = generate_program(200, seed=7, call_ratio=0.1, recursion_depth=40)
+        self.assertIn("Recurse(40)", text)
+        self.assertIn("Proc1(", text)
+        memories = [run(analyze(text), backend) for backend in BACKENDS]
+        self.assertEqual(sorted(memories[0]), sorted(["v%d" % i for i in range(15)] + ["r%d" % i for i in range(5)]))
+        for backend, memory in zip(BACKENDS, memories):
+            self.assertEqual(memory, memories[0], backend)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROGRAM = """
+program Cached;
+var x, y : integer;
+begin
+   x := 2;
+   y := x * 3 + 1
+end.
+"""
+
+
+class ProgramCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        self.path = os.path.join(self.directory.name, "cached.pas")
+        with open(self.path, "w") as f:
+            f.write(PROGRAM)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_spi(self, *options):
+        return subprocess.run(
+            [sys.executable, os.path.join(ROOT, "spi.py"), self.path, "--cache-dir", self.cache_dir, "--cache-stats"]
+            + list(options), capture_output=True, text=True, check=True).stdout
+
+    def test_second_run_of_a_file_is_a_hit(self):
+        first = self.run_spi()
+        second = self.run_spi()
+        self.assertIn("0 hits, 1 misses, 1 stores", first)
+        self.assertIn("1 hits, 0 misses, 0 stores", second)
+        self.assertEqual(first.rsplit("\n", 2)[0], second.rsplit("\n", 2)[0])
+        self.assertIn("y = 7", second)
+
+    def test_traced_and_optimized_runs_are_hits(self):
+        for options in (("--trace", "count"), ("--trace", "count", "-O"), ("--trace", "off", "-O")):
+            self.run_spi(*options)
+            self.assertIn("1 hits, 0 misses", self.run_spi(*options))
+
+    def test_second_batch_run_is_a_hit(self):
+        options = {"backend": "tree", "parser": "recursive", "lexer": "bulk", "optimize": False, "check": False,
+                   "cache_dir": self.cache_dir}
+        first, = batch.run_batch([self.path], options, workers=1)
+        second, = batch.run_batch([self.path], options, workers=1)
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["memory"], {"x": 2, "y": 7})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from closure_compiler import ClosureInterpreter
+from helpers import analyze, outcome, run
+
+PROGRAMS = [
+    """program Arithmetic;
+    var a, b, q : integer; x, y : real;
+    begin
+       a := 9; b := -4;
+       q := a div b - a * 2 + -b;
+       x := a / b + 0.5;
+       y := x * 3 - q / 2
+    end.""",
+    """program Control;
+    var i, s, p : integer;
+    begin
+       s := 0; p := 1;
+       for i := 1 to 6 do if (i > 2) and not (i = 5) then s := s + i else p := p * 3;
+       for i := 3 downto 1 do p := p - i;
+       while (s > 1) or (p < 0) do begin s := s - 4; p := p + 5 end
+    end.""",
+    """program Calls;
+    var total : integer;
+    procedure Add(n : integer);
+       var twice : integer;
+       procedure Bump; begin total := total + twice end;
+    begin
+       twice := n * 2;
+       Bump;
+       if n > 0 then Add(n - 1)
+    end;
+    begin
+       total := 0;
+       Add(4)
+    end.""",
+]
+
+POWER = """program Power;
+var base, exponent, result : integer;
+begin
+   result := 1;
+   while exponent > 0 do begin result := result * base; exponent := exponent - 1 end
+end."""
+
+
+class ClosureInterpreterTest(unittest.TestCase):
+    def test_memory_matches_the_tree_interpreter(self):
+        for text in PROGRAMS:
+            self.assertEqual(outcome(ClosureInterpreter(analyze(text))), run(analyze(text)), text)
+
+    def test_errors_match_the_tree_interpreter(self):
+        for text in ("program p; var a : integer; begin a := 2 div (a - a) end.",
+                     "program p; var a, b : integer; begin a := 0; b := 5 div a end."):
+            self.assertEqual(outcome(ClosureInterpreter(analyze(text))), run(analyze(text)), text)
+
+    def test_compiled_program_runs_with_different_initial_values(self):
+        interpreter = ClosureInterpreter(analyze(POWER))
+        for base, exponent in ((2, 10), (3, 4), (7, 0)):
+            self.assertEqual(outcome(interpreter, {"base": base, "exponent": exponent}),
+                             {"base": base, "exponent": 0, "result": base ** exponent})
+
+    def test_runs_are_independent(self):
+        interpreter = ClosureInterpreter(analyze(POWER))
+        self.assertEqual(outcome(interpreter), "NameError")
+        self.assertEqual(outcome(interpreter, {"base": 5, "exponent": 2}),
+                         {"base": 5, "exponent": 0, "result": 25})
+        self.assertEqual(outcome(interpreter, {"exponent": 0}), {"exponent": 0, "result": 1})
+
+    def test_failed_call_is_unwound(self):
+        text = """program p; var d, r : integer;
+            procedure q(n : integer); var k : integer; begin k := 10; r := k div n end;
+            begin q(d) end."""
+        interpreter = ClosureInterpreter(analyze(text))
+        self.assertEqual(outcome(interpreter, {"d": 0}), "ZeroDivisionError")
+        self.assertEqual(len(interpreter.call_stack), 0)
+        self.assertEqual(interpreter.frames, [None, [0, None], None])
+        self.assertEqual(outcome(interpreter, {"d": 2}), {"d": 2, "r": 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from flatast import FlatAST, FlatInterpreter, KINDS, PROCEDURE_CALL
+from benchmarks import generate_program
+from helpers import analyze, outcome, run
+from test_vm import PROGRAMS, FAILING
+
+
+def run_flat(tree):
+    return outcome(FlatInterpreter(FlatAST.from_tree(tree)))
+
+
+class FlatInterpreterTest(unittest.TestCase):
+    def test_memory_matches_the_tree_interpreter(self):
+        for text in PROGRAMS:
+            expected = run(analyze(text))
+            self.assertIsInstance(expected, dict)
+            self.assertEqual(run_flat(analyze(text)), expected, text)
+
+    def test_errors_match_the_tree_interpreter(self):
+        for text in FAILING:
+            self.assertEqual(run_flat(analyze(text)), run(analyze(text)), text)
+
+    def test_generated_programs(self):
+        for seed in range(3):
+            text = generate_program(300, seed=seed, call_ratio=0.2, recursion_depth=20)
+            self.assertEqual(run_flat(analyze(text)), run(analyze(text)), seed)
+
+    def test_every_executed_node_kind_is_flattened(self):
+        text = """program p; var i, s : integer; r : real;
+            procedure q(n : integer); begin s := s + n end;
+            begin s := 0; r := 1; for i := 3 downto 1 do if not (i = 2) then q(i) else ;
+            while s > 0 do s := s + -2 * 3 end."""
+        flat = FlatAST.from_tree(analyze(text))
+        self.assertEqual(sorted(set(KINDS[kind] for kind in flat.kinds)), sorted(KINDS))
+        self.assertEqual(run_flat(analyze(text)), run(analyze(text)))
+
+    def test_procedures_are_shared_by_their_calls(self):
+        flat = FlatAST.from_tree(analyze(PROGRAMS[2]))
+        calls = [index for index, kind in enumerate(flat.kinds) if kind == PROCEDURE_CALL]
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(len(flat.proc_blocks), 2)
+        self.assertEqual(sorted(flat.data[index] for index in calls), [0, 0, 1, 1])
+
+    def test_flat_arrays_are_smaller_than_the_tree(self):
+        flat = FlatAST.from_tree(analyze(generate_program(200, seed=1)))
+        self.assertLess(flat.nbytes() / len(flat), 32)
+
+
+if __name__ == "__main__":
+    unittest.main()
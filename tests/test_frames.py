@@ -0,0 +1,79 @@
+import os
+import unittest
+
+from spi import ProcedureDecl, Var, BinOp, make_interpreter
+from helpers import BACKENDS, analyze, run
+
+ASSIGNMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assignments.txt")
+
+
+def procedure(block, name):
+    for declaration in block.declarations:
+        if isinstance(declaration, ProcedureDecl) and declaration.proc_name == name:
+            return declaration
+    raise KeyError(name)
+
+
+def variables(node):
+    found = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Var):
+            found.append(node)
+        elif isinstance(node, BinOp):
+            stack.append(node.right)
+            stack.append(node.left)
+    return found
+
+
+class SlotResolutionTest(unittest.TestCase):
+    def test_globals_get_slots_in_declaration_order(self):
+        with open(ASSIGNMENTS) as f:
+            tree = analyze(f.read())
+        self.assertEqual(tuple(tree.var_names), ("b", "x", "y", "z"))
+        self.assertEqual(tree.frame_size, 4)
+        self.assertEqual([declaration.var_node.address for declaration in tree.block_node.declarations[:4]],
+                         [(1, 0), (1, 1), (1, 2), (1, 3)])
+
+    def test_references_resolve_to_the_declaring_scope(self):
+        with open(ASSIGNMENTS) as f:
+            tree = analyze(f.read())
+        alpha = procedure(tree.block_node, "alphaa")
+        beta = procedure(alpha.block_node, "beta")
+        gamma = procedure(beta.block_node, "gamma")
+        self.assertEqual((alpha.frame_size, beta.frame_size, gamma.frame_size), (2, 2, 2))
+        assign = gamma.block_node.compound_statement.children[0]
+        self.assertEqual(assign.left.address, (4, 1))
+        # b is AlphaA's local, c is Gamma's own parameter shadowing Beta's, z is the global
+        self.assertEqual([(var.value, var.address) for var in variables(assign.right)],
+                         [("a", (2, 0)), ("b", (2, 1)), ("c", (4, 0)), ("x", (4, 1)), ("y", (3, 1)),
+                          ("z", (1, 3))])
+
+    def test_shadowing_local_has_its_own_storage(self):
+        text = """program p; var b, r : integer;
+            procedure q(a : integer); var b : integer;
+            begin b := a * 10; r := b + 1 end;
+            begin b := 1; q(4) end."""
+        for backend in BACKENDS:
+            self.assertEqual(run(analyze(text), backend), {"b": 1, "r": 41}, backend)
+
+    def test_recursive_calls_get_fresh_frames(self):
+        text = """program p; var trail : integer;
+            procedure down(n : integer); var kept : integer;
+            begin kept := n; if n > 0 then down(n - 1); trail := trail * 10 + kept end;
+            begin trail := 0; down(3) end."""
+        for backend in BACKENDS:
+            self.assertEqual(run(analyze(text), backend), {"trail": 123}, backend)
+
+    def test_global_memory_lists_assigned_globals_by_name(self):
+        text = "program p; var a, b, c : integer; procedure q; var d : integer; begin d := 1 end; " \
+               "begin c := 3; a := 1; q end."
+        for backend in BACKENDS:
+            interpreter = make_interpreter(analyze(text), backend)
+            interpreter.interpret()
+            self.assertEqual(list(interpreter.GLOBAL_MEMORY.items()), [("a", 1), ("c", 3)], backend)
+
+
+if __name__ == "__main__":
+    unittest.main()
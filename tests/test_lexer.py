@@ -0,0 +1,168 @@
+import io
+import os
+import tempfile
+import unittest
+
+from spi import Lexer, BulkLexer, StreamLexer, Parser, LexerError, RESERVED_KEYWORDS, PUNCTUATION, EOF, ID,\
+    INTEGER_CONST, REAL_CONST, ASSIGN, PLUS, ERROR
+
+ASSIGNMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assignments.txt")
+
+SOURCE = """Program Lexing; { a comment
+spanning lines }
+VAR _tmp, x2 : Integer; r : REAL;
+begin
+   x2:=3 DIV 2;r := 3.5 / 1. ;
+   IF (x2<>1) and (r<=2.0) OR NOT (x2>=0) then _tmp := -x2 else _tmp := 0;
+   for x2 := 10 downto 1 do{}r:=r*2
+END.
+"""
+
+
+def tokens(lexer):
+    result = []
+    while True:
+        token = lexer.get_next_token()
+        result.append((token.type, token.value))
+        if token.type == EOF:
+            return result
+
+
+class BulkLexerTest(unittest.TestCase):
+    def test_tokens_match_the_character_lexer(self):
+        with open(ASSIGNMENTS) as f:
+            assignments = f.read()
+        for text in (SOURCE, assignments):
+            self.assertEqual(tokens(BulkLexer(text)), tokens(Lexer(text)))
+
+    def test_offsets_match_the_character_lexer(self):
+        lexer = Lexer(SOURCE)
+        tokens(lexer)
+        self.assertEqual(list(BulkLexer(SOURCE).token_offsets()), list(lexer.token_offsets()))
+
+    def test_token_arrays(self):
+        types, values, offsets = BulkLexer("x := 12 + 0.5 {done}").token_arrays()
+        self.assertEqual(types, [ID, ASSIGN, INTEGER_CONST, PLUS, REAL_CONST, EOF])
+        self.assertEqual(values, ["x", ":=", 12, "+", 0.5, None])
+        self.assertEqual(list(offsets), [0, 2, 5, 8, 10, 20])
+
+    def test_keywords_and_punctuation_are_shared(self):
+        lexer = BulkLexer("begin x := y; BEGIN x := z end")
+        found = lexer.tokenize()
+        self.assertIs(found[0], RESERVED_KEYWORDS["BEGIN"])
+        self.assertIs(found[5], RESERVED_KEYWORDS["BEGIN"])
+        self.assertIs(found[2], PUNCTUATION[":="])
+        self.assertIs(found[4], PUNCTUATION[";"])
+        # identifiers seen again reuse the token built for their first occurrence
+        self.assertIs(found[1], found[6])
+
+    def test_invalid_character_raises_when_reached(self):
+        lexer = BulkLexer("a := 1;\nb := ?")
+        found = lexer.tokenize()
+        self.assertEqual(found[-2].type, ERROR)
+        for _ in range(6):
+            lexer.get_next_token()
+        with self.assertRaises(LexerError) as context:
+            lexer.get_next_token()
+        self.assertEqual((context.exception.character, context.exception.offset), ("?", 13))
+
+
+class UnseekableStream(io.BytesIO):
+    def seekable(self):
+        return False
+
+
+class StreamLexerTest(unittest.TestCase):
+    chunk_sizes = (1, 2, 3, 5, 7, 16, 64, 1 << 16)
+
+    def expected(self, text):
+        lexer = Lexer(text)
+        found = tokens(lexer)
+        return found, list(lexer.token_offsets())
+
+    def stream_tokens(self, lexer):
+        found = []
+        offsets = []
+        while True:
+            token = lexer.get_next_token()
+            found.append((token.type, token.value))
+            offsets.append(lexer.token_start)
+            if token.type == EOF:
+                return found, offsets
+
+    def test_tokens_and_offsets_match_across_chunk_sizes(self):
+        expected = self.expected(SOURCE)
+        data = SOURCE.encode()
+        for chunk_size in self.chunk_sizes:
+            self.assertEqual(self.stream_tokens(StreamLexer(io.BytesIO(data), chunk_size=chunk_size)), expected,
+                             chunk_size)
+            lexer = StreamLexer(io.BytesIO(data), chunk_size=chunk_size)
+            self.assertEqual((tokens(lexer), list(lexer.token_offsets())), expected, chunk_size)
+
+    def test_multibyte_characters_split_across_chunks(self):
+        text = "x := 1; { \u00e9t\u00e9 \u2603 } r\u00e9sum\u00e9 := 2.5; \u00fcber := 3"
+        expected = self.expected(text)
+        data = text.encode("utf-8")
+        for chunk_size in self.chunk_sizes:
+            self.assertEqual(self.stream_tokens(StreamLexer(io.BytesIO(data), chunk_size=chunk_size)), expected,
+                             chunk_size)
+
+    def test_reads_a_file_path(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".pas", delete=False, encoding="utf-8") as f:
+            f.write(SOURCE)
+        try:
+            lexer = StreamLexer(f.name, chunk_size=5)
+            self.assertEqual(tokens(lexer), self.expected(SOURCE)[0])
+            # tokens are produced from the chunks without keeping a copy of the whole text
+            self.assertIsNone(lexer.text)
+            self.assertEqual(list(lexer.line_starts()), list(Lexer(SOURCE).line_starts()))
+        finally:
+            os.unlink(f.name)
+
+    def test_parser_reads_a_stream(self):
+        with open(ASSIGNMENTS, "rb") as f:
+            tree = Parser(StreamLexer(f, chunk_size=3)).parse()
+        self.assertEqual(tree.program_name, "main")
+
+    def test_invalid_character_offset(self):
+        text = "a := 1;\n\u00e9 := ?"
+        for chunk_size in self.chunk_sizes:
+            lexer = StreamLexer(io.BytesIO(text.encode()), chunk_size=chunk_size)
+            for _ in range(6):
+                lexer.get_next_token()
+            with self.assertRaises(LexerError) as context:
+                lexer.get_next_token()
+            self.assertEqual(context.exception.offset, 13, chunk_size)
+
+    def test_comment_and_identifier_longer_than_a_chunk(self):
+        text = "x := 1; {" + "c" * 200000 + "} y := " + "z" * 50000 + "; w := 2"
+        expected = (tokens(BulkLexer(text)), list(BulkLexer(text).token_offsets()))
+        for chunk_size in (16, 1000):
+            lexer = StreamLexer(io.BytesIO(text.encode()), chunk_size=chunk_size)
+            scanned = list(lexer.scan())
+            self.assertEqual(([(token.type, token.value) for offset, token in scanned],
+                              [offset for offset, token in scanned]), expected, chunk_size)
+
+    def test_unterminated_comment(self):
+        text = "x := 1; {" + "c" * 100
+        for chunk_size in self.chunk_sizes:
+            lexer = StreamLexer(io.BytesIO(text.encode()), chunk_size=chunk_size)
+            for _ in range(4):
+                lexer.get_next_token()
+            with self.assertRaises(LexerError) as context:
+                lexer.get_next_token()
+            self.assertEqual((context.exception.character, context.exception.offset), ("{", 8), chunk_size)
+            self.assertEqual(lexer.get_next_token().type, EOF)
+
+    def test_unseekable_stream_keeps_its_positions(self):
+        expected = self.expected(SOURCE)
+        lexer = StreamLexer(UnseekableStream(SOURCE.encode()), chunk_size=5)
+        with self.assertRaises(ValueError):
+            lexer.token_offsets()
+        self.assertEqual(tokens(lexer), expected[0])
+        self.assertEqual(list(lexer.token_offsets()), expected[1])
+        self.assertEqual(list(lexer.line_starts()), list(Lexer(SOURCE).line_starts()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+
+from spi import BulkLexer, StacklessParser, SemanticAnalyzer, NoOp
+from optimizer import ConstantFolder, CommonSubexpressionEliminator, DeadStoreEliminator
+from helpers import BACKENDS, analyze, run
+
+
+class OptimizerTestCase(unittest.TestCase):
+    def assertSameBehavior(self, text, *passes, observed=None):
+        expected = run(analyze(text))
+        if isinstance(expected, dict) and observed is not None:
+            expected = {name: value for name, value in expected.items() if name in observed}
+        for backend in BACKENDS:
+            tree = analyze(text)
+            for optimization in passes:
+                tree = optimization().optimize(tree) if optimization is not DeadStoreEliminator \
+                    else DeadStoreEliminator(observed).optimize(tree)
+            self.assertEqual(run(tree, backend), expected, backend)
+        return expected
+
+
+class ConstantFolderTest(OptimizerTestCase):
+    def test_constants_are_folded(self):
+        text = "program p; var a, b : integer; r : real; begin a := 2 * 3 + 1; b := a div 2; r := b / 2 end."
+        folder = ConstantFolder()
+        tree = folder.optimize(analyze(text))
+        self.assertEqual([statement.right.value for statement in tree.block_node.compound_statement.children],
+                         [7, 3, 1.5])
+        self.assertEqual(run(tree), {"a": 7, "b": 3, "r": 1.5})
+
+    def test_overflow_is_left_for_the_interpreter(self):
+        big = "1" + "0" * 400
+        text = "program p; var a : integer; r, s : real; begin a := 0; if a > 0 then begin r := %s / 3; s := %s end;" \
+               " a := 1 end." % (big, big)
+        self.assertEqual(self.assertSameBehavior(text, ConstantFolder), {"a": 1})
+        self.assertEqual(run(ConstantFolder().optimize(analyze(text.replace("a > 0", "a = 0")))), "OverflowError")
+
+
+class CommonSubexpressionEliminatorTest(OptimizerTestCase):
+    def test_repeated_expression_uses_a_temporary(self):
+        text = "program p; var a, b, x, y : integer; begin a := 2; b := 3; x := (a + b) * 2; y := (b + a) * 3 end."
+        tree = analyze(text)
+        eliminator = CommonSubexpressionEliminator()
+        tree = eliminator.optimize(tree)
+        self.assertEqual(eliminator.saved, 1)
+        self.assertEqual(eliminator.temporaries, 1)
+        self.assertEqual(run(tree), {"a": 2, "b": 3, "x": 10, "y": 15})
+
+    def test_assignment_invalidates_reuse(self):
+        text = "program p; var a, x, y : integer; begin a := 1; x := a + 1; a := 5; y := a + 1 end."
+        eliminator = CommonSubexpressionEliminator()
+        eliminator.optimize(analyze(text))
+        self.assertEqual(eliminator.saved, 0)
+        self.assertSameBehavior(text, CommonSubexpressionEliminator)
+
+    def test_procedure_call_invalidates_reuse(self):
+        text = """program p; var a, x, y : integer;
+            procedure bump; begin a := a + 1 end;
+            begin a := 1; x := a * 3; bump; y := a * 3 end."""
+        self.assertEqual(self.assertSameBehavior(text, CommonSubexpressionEliminator),
+                         {"a": 2, "x": 3, "y": 6})
+
+    def test_hoisting_keeps_the_first_error(self):
+        # a - d cannot be computed ahead of the statement: 2 div d fails first, and a was never assigned
+        text = "program p; var a, d, e, x : integer; begin d := 0; e := (2 div d) div (a - d); x := (a - d) * 2 end."
+        eliminator = CommonSubexpressionEliminator()
+        eliminator.optimize(analyze(text))
+        self.assertEqual(eliminator.temporaries, 0)
+        self.assertEqual(self.assertSameBehavior(text, CommonSubexpressionEliminator), "ZeroDivisionError")
+
+    def test_hoisting_after_assigned_reads(self):
+        text = "program p; var a, b, x, y : integer; begin a := 2; b := 3; x := a * (a - b); y := (a - b) * 2 end."
+        eliminator = CommonSubexpressionEliminator()
+        eliminator.optimize(analyze(text))
+        self.assertEqual(eliminator.temporaries, 1)
+        self.assertSameBehavior(text, CommonSubexpressionEliminator)
+
+
+class DeadStoreEliminatorTest(OptimizerTestCase):
+    def test_overwritten_store_is_removed(self):
+        text = "program p; var x, y : integer; begin y := 1; x := y + 1; x := 2 end."
+        tree = analyze(text)
+        eliminator = DeadStoreEliminator()
+        tree = eliminator.optimize(tree)
+        self.assertEqual(eliminator.stores, 1)
+        self.assertEqual(run(tree), {"x": 2, "y": 1})
+
+    def test_unobserved_variables_are_removed(self):
+        text = "program p; var a, b, c : integer; begin a := 1; b := a * 2; c := b + 1 end."
+        tree = analyze(text)
+        eliminator = DeadStoreEliminator({"b"})
+        tree = eliminator.optimize(tree)
+        self.assertEqual(eliminator.stores, 1)
+        self.assertEqual(eliminator.declarations, 1)
+        self.assertEqual(tree.frame_size, 2)
+        self.assertEqual(run(tree), {"b": 2})
+
+    def test_division_overflow_is_kept(self):
+        text = """program p; var t, i : integer; r : real;
+            begin t := 2; for i := 1 to 11 do t := t * t; r := t / 2; r := 1.0 end."""
+        self.assertEqual(self.assertSameBehavior(text, DeadStoreEliminator), "OverflowError")
+
+    def test_mixed_arithmetic_overflow_is_kept(self):
+        text = """program p; var t, i : integer; r : real;
+            begin t := 2; r := 0.5; for i := 1 to 11 do t := t * t; r := t + r; r := 1.0 end."""
+        self.assertEqual(self.assertSameBehavior(text, DeadStoreEliminator), "OverflowError")
+
+    def test_uninitialized_read_is_kept(self):
+        text = "program p; var x, y : integer; begin x := y + 1; x := 2 end."
+        self.assertEqual(self.assertSameBehavior(text, DeadStoreEliminator), "NameError")
+
+    def test_read_assigned_on_one_branch_is_kept(self):
+        text = "program p; var c, x, y : integer; begin c := 0; if c > 0 then y := 1; x := y + 1; x := 2 end."
+        self.assertEqual(self.assertSameBehavior(text, DeadStoreEliminator), "NameError")
+
+    def test_read_assigned_on_both_branches_is_removed(self):
+        text = """program p; var c, x, y : integer;
+            begin c := 0; if c > 0 then y := 1 else y := 2; x := y + 1; x := 2 end."""
+        tree = analyze(text)
+        eliminator = DeadStoreEliminator()
+        eliminator.optimize(tree)
+        self.assertEqual(eliminator.stores, 1)
+        self.assertSameBehavior(text, DeadStoreEliminator)
+
+    def test_procedure_reads_keep_stores(self):
+        text = """program p; var a, x : integer;
+            procedure show(n : integer); begin x := a + n end;
+            begin a := 1; show(2); a := 7 end."""
+        self.assertEqual(self.assertSameBehavior(text, DeadStoreEliminator), {"a": 7, "x": 3})
+
+    def test_dead_store_in_loop(self):
+        text = """program p; var i, s, t : integer;
+            begin s := 0; for i := 1 to 3 do begin t := i * 2; s := s + i end end."""
+        tree = analyze(text)
+        eliminator = DeadStoreEliminator({"s"})
+        tree = eliminator.optimize(tree)
+        self.assertEqual(eliminator.stores, 1)
+        self.assertSameBehavior(text, DeadStoreEliminator, observed={"s"})
+
+    def test_all_passes_together(self):
+        text = """program p; var a, b, x, y, z : integer; r : real;
+            begin a := 4; b := 2; x := (a + b) * (a + b); y := a div b; z := y + x;
+            r := x / b; x := 0; while a > 0 do begin a := a - 1; y := (a + b) * 2 end end."""
+        self.assertSameBehavior(text, ConstantFolder, CommonSubexpressionEliminator, DeadStoreEliminator)
+        self.assertSameBehavior(text, ConstantFolder, CommonSubexpressionEliminator, DeadStoreEliminator,
+                                observed={"z", "r"})
+
+    def test_removed_store_leaves_no_op(self):
+        text = "program p; var x : integer; begin x := 1 end."
+        tree = DeadStoreEliminator(set()).optimize(analyze(text))
+        self.assertIsInstance(tree.block_node.compound_statement.children[0], NoOp)
+
+
+class DeepNestingTest(unittest.TestCase):
+    depth = 30000
+
+    def optimize_and_run(self, text):
+        tree = StacklessParser(BulkLexer(text)).parse()
+        SemanticAnalyzer().visit(tree)
+        for optimization in (ConstantFolder, CommonSubexpressionEliminator, DeadStoreEliminator):
+            tree = optimization().optimize(tree)
+        return run(tree, "stackless")
+
+    def test_nested_statements(self):
+        depth = self.depth
+        text = "program p; var x : integer; begin x := 1; " + "if x > 0 then begin " * depth + \
+               "x := x + 1" + " end" * depth + " end."
+        self.assertEqual(self.optimize_and_run(text), {"x": 2})
+
+    def test_nested_expressions(self):
+        depth = self.depth
+        text = "program p; var x, y : integer; begin x := 1; y := " + "(x + " * depth + "1" + ")" * depth + \
+               "; x := " + "(x + " * depth + "1" + ")" * depth + " end."
+        self.assertEqual(self.optimize_and_run(text), {"x": depth + 1, "y": depth + 1})
+
+    def test_nested_loops(self):
+        depth = 3000
+        text = "program p; var x, y : integer; begin x := 0; y := 1; " + "while x > 0 do begin y := x; " * depth + \
+               "x := y" + " end" * depth + " end."
+        self.assertEqual(self.optimize_and_run(text), {"x": 0, "y": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import io
+import unittest
+
+from spi import Lexer, BulkLexer, StreamLexer, Parser, StacklessParser, RecoveringParser, ParserError, SourceMap
+
+SOURCE = """PROGRAM p;
+VAR x : INTEGER;
+    y : BOOLEAN;
+BEGIN
+  x := 1 ? 2;
+  y := 3
+END.
+"""
+
+
+class RecoveringParserTest(unittest.TestCase):
+    def lexers(self, text):
+        return Lexer(text), BulkLexer(text), StreamLexer(io.BytesIO(text.encode()), chunk_size=7)
+
+    def diagnostics(self, lexer):
+        parser = RecoveringParser(lexer)
+        parser.parse()
+        return parser.diagnostics()
+
+    def test_invalid_type_names_the_expected_types(self):
+        with self.assertRaises(ParserError) as context:
+            Parser(Lexer("PROGRAM p; VAR a : BOOLEAN; BEGIN END.")).parse()
+        self.assertEqual(str(context.exception),
+                         "Invalid syntax: expected a type (INTEGER or REAL), found 'boolean'")
+
+    def test_invalid_character_becomes_a_diagnostic(self):
+        expected = [
+            (3, 9, "Invalid syntax: expected a type (INTEGER or REAL), found 'boolean'"),
+            (5, 10, "Invalid character '?'"),
+        ]
+        for lexer in self.lexers(SOURCE):
+            self.assertEqual(self.diagnostics(lexer), expected)
+
+    def test_parsing_continues_after_invalid_characters(self):
+        source = "PROGRAM p;\nVAR a, b : INTEGER;\nBEGIN\n  a := 1 # 2;\n  b := ;\n  a := $\nEND.\n"
+        expected = [
+            (4, 10, "Invalid character '#'"),
+            (5, 8, "Invalid syntax: expected identifier, found ';'"),
+            (6, 8, "Invalid character '$'"),
+        ]
+        for lexer in self.lexers(source):
+            self.assertEqual(self.diagnostics(lexer), expected)
+
+    def test_invalid_character_in_declaration_lookahead(self):
+        for lexer in self.lexers("PROGRAM p; VAR a ? : INTEGER; BEGIN END."):
+            self.assertEqual(self.diagnostics(lexer), [(1, 18, "Invalid character '?'")])
+
+
+class PositionTest(unittest.TestCase):
+    def test_positions_are_only_recorded_when_asked_for(self):
+        text = "PROGRAM p; VAR x : INTEGER;\nBEGIN\n  x := 1 + 2\nEND."
+        for parser_class in (Parser, StacklessParser):
+            lexer = Lexer(text)
+            assign = parser_class(lexer).parse().block_node.compound_statement.children[0]
+            self.assertIsNone(assign.pos)
+            self.assertIsNone(assign.right.pos)
+            self.assertIsNone(lexer.offsets)
+            lexer = Lexer(text)
+            assign = parser_class(lexer, positions=True).parse().block_node.compound_statement.children[0]
+            source_map = SourceMap(lexer)
+            self.assertEqual(source_map.line_col(assign.pos), (3, 3))
+            self.assertEqual(source_map.line_col(assign.right.pos), (3, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
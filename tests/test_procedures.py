@@ -0,0 +1,55 @@
+import unittest
+
+from helpers import BACKENDS, analyze, run
+
+RECURSIVE = """
+PROGRAM Deep;
+VAR calls, total : INTEGER;
+PROCEDURE Down(n : INTEGER);
+   VAR next : INTEGER;
+BEGIN
+   calls := calls + 1;
+   next := n - 1;
+   IF next >= 0 THEN
+   BEGIN
+      Down(next);
+      total := total + n
+   END
+END;
+BEGIN
+   calls := 0;
+   total := 0;
+   Down(%d)
+END.
+"""
+
+
+class ProcedureCallTest(unittest.TestCase):
+    def test_deep_recursion_on_every_backend(self):
+        depth = 5000
+        for backend in BACKENDS:
+            self.assertEqual(run(analyze(RECURSIVE % depth), backend),
+                             {"calls": depth + 1, "total": depth * (depth + 1) // 2}, backend)
+
+    def test_frames_are_restored_after_deep_calls(self):
+        text = """
+        PROGRAM Frames;
+        VAR result : INTEGER;
+        PROCEDURE Count(n : INTEGER);
+           VAR kept : INTEGER;
+        BEGIN
+           kept := n;
+           IF n > 0 THEN Count(n - 1);
+           result := result + kept
+        END;
+        BEGIN
+           result := 0;
+           Count(100)
+        END.
+        """
+        for backend in BACKENDS:
+            self.assertEqual(run(analyze(text), backend), {"result": 5050}, backend)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import itertools
+import unittest
+
+from spi import Lexer, Parser, SemanticAnalyzer, SourceMap, Assign, If, ProcedureCall, RECURSIVE_CALL_DEPTH
+from profiler import ProfilingInterpreter
+
+PROGRAM = """program p;
+var total, i : integer;
+procedure Add(n : integer);
+   procedure Bump;
+   begin total := total + n end;
+begin Bump; Bump end;
+procedure Down(n : integer);
+begin if n > 0 then Down(n - 1) else total := total div n end;
+begin
+   total := 0;
+   for i := 1 to 3 do Add(i);
+   Down(%d)
+end."""
+
+
+def profile(text):
+    lexer = Lexer(text)
+    tree = Parser(lexer, positions=True).parse()
+    SemanticAnalyzer().visit(tree)
+    # a clock that ticks once per reading keeps the timings exact
+    return ProfilingInterpreter(tree, SourceMap(lexer), timer=itertools.count().__next__)
+
+
+def node_stats(profiler, node_class, procedure):
+    return [stats for stats in profiler.stats.values()
+            if isinstance(stats.node, node_class) and stats.procedure.name == procedure]
+
+
+class ProfilingInterpreterTest(unittest.TestCase):
+    def test_node_counts_and_positions(self):
+        profiler = profile(PROGRAM % 3)
+        with self.assertRaises(ZeroDivisionError):
+            profiler.interpret()
+        [bump] = node_stats(profiler, Assign, "add.bump")
+        self.assertEqual(bump.count, 6)
+        self.assertEqual(profiler.position(bump.node), (5, 10))
+        [down] = node_stats(profiler, If, "down")
+        self.assertEqual(down.count, 4)
+        self.assertEqual(profiler.position(down.node), (8, 7))
+        self.assertEqual(sorted(stats.count for stats in node_stats(profiler, ProcedureCall, "p")), [1, 3])
+
+    def test_time_is_attributed_per_procedure(self):
+        profiler = profile(PROGRAM % 3)
+        with self.assertRaises(ZeroDivisionError):
+            profiler.interpret()
+        procedures = {procedure.name: (procedure.calls, count) for procedure, count, own in profiler.procedures()}
+        self.assertEqual(procedures["p"][0], 1)
+        self.assertEqual(procedures["add"][0], 3)
+        self.assertEqual(procedures["add.bump"][0], 6)
+        self.assertEqual(procedures["down"][0], 4)
+        self.assertEqual(sum(count for calls, count in procedures.values()),
+                         sum(stats.count for stats in profiler.stats.values()))
+        self.assertEqual(sum(own for procedure, count, own in profiler.procedures()), profiler.total_time)
+        report = profiler.report()
+        self.assertIn("add.bump", report)
+        self.assertIn("5:10", report)
+
+    def test_deep_calls_are_profiled(self):
+        depth = RECURSIVE_CALL_DEPTH * 3
+        profiler = profile(PROGRAM % depth)
+        with self.assertRaises(ZeroDivisionError):
+            profiler.interpret()
+        self.assertEqual(node_stats(profiler, If, "down")[0].count, depth + 1)
+        down = [procedure for procedure, count, own in profiler.procedures() if procedure.name == "down"][0]
+        self.assertEqual(down.calls, depth + 1)
+        self.assertEqual(down.active, 0)
+        # every started node was closed, although the innermost call failed
+        self.assertEqual(len(profiler._child_times), 1)
+        self.assertEqual(sum(stats.own for stats in profiler.stats.values()), profiler.total_time)
+        # a recursive call's time is counted once, as part of the outermost call
+        self.assertLess(down.total, profiler.total_time)
+
+    def test_json_lists_calls(self):
+        profiler = profile((PROGRAM % 2).replace("total div n", "n"))
+        profiler.interpret()
+        procedures = {entry["procedure"]: entry for entry in profiler.to_json()["procedures"]}
+        self.assertEqual(procedures["down"]["calls"], 3)
+        self.assertEqual(procedures["add"]["executions"], 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
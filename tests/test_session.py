@@ -0,0 +1,40 @@
+import unittest
+
+from spi import Lexer, BulkLexer, Parser, StacklessParser, Session
+
+
+class SessionTest(unittest.TestCase):
+    def sessions(self):
+        for lexer_class in (Lexer, BulkLexer):
+            for parser_class in (Parser, StacklessParser):
+                yield Session(lexer_class, parser_class)
+
+    def test_declaration_and_statement_on_one_line(self):
+        for session in self.sessions():
+            assigned = session.execute("VAR d: INTEGER; d := 2")
+            self.assertEqual([(name, session.value(address)) for name, address in assigned.items()], [("d", 2)])
+            self.assertEqual(dict(session.GLOBAL_MEMORY), {"d": 2})
+
+    def test_declarations_and_procedure_call_on_one_line(self):
+        for session in self.sessions():
+            session.execute("VAR a, b : INTEGER; PROCEDURE p(n : INTEGER); BEGIN b := n * 2 END; p(3)")
+            session.execute("a := b + 1")
+            self.assertEqual(dict(session.GLOBAL_MEMORY), {"a": 7, "b": 6})
+
+    def test_state_is_kept_between_lines(self):
+        for session in self.sessions():
+            session.execute("VAR x : INTEGER;")
+            session.execute("x := 5")
+            session.execute("VAR y : REAL; y := x / 2")
+            self.assertEqual(dict(session.GLOBAL_MEMORY), {"x": 5, "y": 2.5})
+
+    def test_failed_line_rolls_back_declarations(self):
+        for session in self.sessions():
+            with self.assertRaises(Exception):
+                session.execute("VAR z : INTEGER; z := missing")
+            session.execute("VAR z : INTEGER; z := 1")
+            self.assertEqual(dict(session.GLOBAL_MEMORY), {"z": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+import io
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from spi import Lexer, BulkLexer, Parser, StacklessParser
+from src2srccompiler import SourceToSourceCompiler
+from helpers import analyze, run
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ASSIGNMENTS = os.path.join(ROOT, "assignments.txt")
+
+ASSIGNMENTS_OUTPUT = """program main0;
+   var b1 : REAL0;
+   var x1 : REAL0;
+   var y1 : REAL0;
+   var z1 : INTEGER0;
+   procedure alphaa1(a2 : INTEGER0);
+      var b2 : INTEGER0;
+      procedure beta2(c3 : INTEGER0);
+         var y3 : INTEGER0;
+         procedure gamma3(c4 : INTEGER0);
+            var x4 : INTEGER0;
+         
+         begin
+            <x4:INTEGER0> := <a4:INTEGER0> + <b4:INTEGER0> + <c4:INTEGER0> + <x4:INTEGER0> + <y4:INTEGER0> + \
+<z4:INTEGER0>;
+         end; {END OF gamma}
+      
+      begin
+         
+      end; {END OF beta}
+   
+   begin
+      
+   end; {END OF alphaa}
+   procedure alphab1(a2 : INTEGER0);
+      var c2 : REAL0;
+   
+   begin
+      <c2:REAL0> := <a2:INTEGER0> + <b2:REAL0>;
+   end; {END OF alphab}
+
+begin
+   
+end. {END OF main}"""
+
+PROGRAMS = [
+    """program Main;
+    var a, b : integer; c : real;
+    begin
+       a := 5;
+       b := -(a + 2) * 3;
+       c := a / (b - (a - 1));
+       if NOT (a > 1) or (b < 0) and not (a = b) then a := a div (2 div 1);
+       b := a - (b - 1) - -a
+    end.""",
+    """program Main;
+    var x, y, i : integer;
+    procedure p(n : integer);
+    var t : integer;
+    begin
+       t := (n + 1) * (n - 1);
+       y := y + t div (n + 2)
+    end;
+    begin
+       x := 0; y := 1;
+       for i := 1 to 4 do p(i * (i + 1));
+       while not (x >= 3) and (y > 0) do x := x + 1
+    end.""",
+]
+
+
+def compile_source(text):
+    compiler = SourceToSourceCompiler(stream=None)
+    compiler.visit(Parser(Lexer(text)).parse())
+    return compiler.output
+
+
+def strip_annotations(text):
+    # names carry the level of the scope they appear in, which differs between a declaration and its uses
+    text = re.sub(r"<(\w+):\w+>", r"\1", text)
+    return re.sub(r"\b([A-Za-z_]+)\d+\b", r"\1", text)
+
+
+def expression(r, depth):
+    kind = r.randrange(7 if depth < 4 else 2)
+    if kind == 0:
+        return str(r.randrange(1, 10))
+    if kind == 1:
+        return r.choice(["a", "b"])
+    if kind == 2:
+        return "-" + expression(r, depth + 1)
+    if kind == 3:
+        return "(%s)" % expression(r, depth + 1)
+    if kind == 4:
+        return "%s div %d" % (expression(r, depth + 1), r.randrange(1, 4))
+    return "%s %s %s" % (expression(r, depth + 1), r.choice("+-*"), expression(r, depth + 1))
+
+
+def condition(r, depth):
+    kind = r.randrange(4 if depth < 3 else 1)
+    if kind == 0:
+        return "%s %s %s" % (expression(r, 2), r.choice(["<", ">", "=", "<>", "<=", ">="]), expression(r, 2))
+    if kind == 1:
+        return "not (%s)" % condition(r, depth + 1)
+    return "(%s) %s (%s)" % (condition(r, depth + 1), r.choice(["and", "or"]), condition(r, depth + 1))
+
+
+class SourceToSourceRoundTripTest(unittest.TestCase):
+    def assertRoundTrip(self, text):
+        output = compile_source(text)
+        expected = run(analyze(text))
+        self.assertEqual(run(analyze(strip_annotations(output))), expected, output)
+
+    def test_programs(self):
+        for text in PROGRAMS:
+            self.assertRoundTrip(text)
+
+    def test_operators_keep_their_grouping(self):
+        output = compile_source(PROGRAMS[0])
+        self.assertIn("-(<a1:INTEGER0> + 2) * 3", output)
+        self.assertIn("if NOT (<a1:INTEGER0> > 1) OR", output)
+        self.assertIn("<a1:INTEGER0> DIV (2 DIV 1)", output)
+        self.assertIn("<a1:INTEGER0> - (<b1:INTEGER0> - 1) - -<a1:INTEGER0>", output)
+
+    def test_annotations_use_the_current_scope_level(self):
+        output = compile_source(PROGRAMS[1])
+        self.assertIn("<y2:INTEGER0> := <y2:INTEGER0> + <t2:INTEGER0>", output)
+        self.assertIn("<y1:INTEGER0> := 1", output)
+
+    def test_random_expressions(self):
+        r = random.Random(0)
+        for _ in range(200):
+            text = "program Main; var a, b, x, y : integer; begin a := %d; b := %d; x := %s; y := 0; " \
+                   "if %s then y := 1 end." % (r.randrange(-5, 6), r.randrange(-5, 6), expression(r, 0),
+                                                condition(r, 0))
+            self.assertRoundTrip(text)
+
+    def test_stream_output_matches(self):
+        stream = io.StringIO()
+        SourceToSourceCompiler(stream=stream).visit(Parser(Lexer(PROGRAMS[1])).parse())
+        self.assertEqual(stream.getvalue(), compile_source(PROGRAMS[1]))
+
+
+class RecordingStream(io.StringIO):
+    def __init__(self):
+        super(RecordingStream, self).__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super(RecordingStream, self).write(text)
+
+
+def nested_procedures(depth):
+    return "program Deep; var x : integer; " + "procedure p; var y : integer; " * depth + "begin y := 1 end; " + \
+           "begin end; " * (depth - 1) + "begin x := 1 end."
+
+
+class SourceToSourceEmitterTest(unittest.TestCase):
+    def test_nested_procedures_layout(self):
+        with open(ASSIGNMENTS) as f:
+            self.assertEqual(compile_source(f.read()), ASSIGNMENTS_OUTPUT)
+
+    def test_deep_nesting_is_indented_in_one_pass(self):
+        depth = 2000
+        stream = RecordingStream()
+        SourceToSourceCompiler(stream=stream).visit(StacklessParser(BulkLexer(nested_procedures(depth))).parse())
+        lines = stream.getvalue().splitlines()
+        indent = "   " * depth
+        self.assertIn(indent + "   <y%d:INTEGER0> := 1;" % (depth + 1), lines)
+        self.assertIn(indent + "end; {END OF p}", lines)
+        self.assertEqual(lines[-1], "end. {END OF deep}")
+        # output is written out as it is produced rather than kept until the end
+        self.assertGreater(stream.writes, 1)
+
+    def test_command_line_writes_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "out.pas")
+            subprocess.run([sys.executable, os.path.join(ROOT, "src2srccompiler.py"), ASSIGNMENTS, "-o", output],
+                           check=True)
+            with open(output) as f:
+                self.assertEqual(f.read(), ASSIGNMENTS_OUTPUT + "\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import contextlib
+import io
+import unittest
+
+from spi import Lexer, Parser, SemanticAnalyzer, ScopedSymbolTable, VarSymbol, BuiltinTypeSymbol, SymbolTableListener,\
+    PrintingListener, CountingListener
+
+PROCEDURE = "program p; var a : integer; procedure q(n : integer); begin a := n end; begin q(a) end."
+
+
+def chain(listener=None):
+    builtins = ScopedSymbolTable("builtins", 0, listener=listener)
+    builtins._init_builtins()
+    global_scope = ScopedSymbolTable("global", 1, builtins)
+    outer = ScopedSymbolTable("outer", 2, global_scope)
+    inner = ScopedSymbolTable("inner", 3, outer)
+    return builtins, global_scope, outer, inner
+
+
+def var(name):
+    return VarSymbol(name, BuiltinTypeSymbol("INTEGER"))
+
+
+class ScopeCacheTest(unittest.TestCase):
+    def test_lookup_walks_the_chain(self):
+        builtins, global_scope, outer, inner = chain()
+        x = var("x")
+        global_scope.insert(x)
+        self.assertIs(inner.lookup("x"), x)
+        self.assertIs(inner.lookup("x"), x)
+        self.assertIs(inner.lookup("INTEGER"), builtins.lookup("INTEGER"))
+        self.assertIsNone(inner.lookup("x", current_scope_only=True))
+
+    def test_insert_into_an_enclosing_scope_invalidates(self):
+        builtins, global_scope, outer, inner = chain()
+        global_x = var("x")
+        global_scope.insert(global_x)
+        self.assertIs(inner.lookup("x"), global_x)
+        outer_x = var("x")
+        outer.insert(outer_x)
+        self.assertIs(inner.lookup("x"), outer_x)
+        self.assertIs(global_scope.lookup("x"), global_x)
+
+    def test_cached_miss_is_invalidated(self):
+        builtins, global_scope, outer, inner = chain()
+        self.assertIsNone(inner.lookup("y"))
+        y = var("y")
+        global_scope.insert(y)
+        self.assertIs(inner.lookup("y"), y)
+
+    def test_rollback_invalidates(self):
+        builtins, global_scope, outer, inner = chain()
+        global_x = var("x")
+        global_scope.insert(global_x)
+        count = len(outer)
+        outer.insert(var("x"))
+        self.assertIsNot(inner.lookup("x"), global_x)
+        outer.rollback(count)
+        self.assertIs(inner.lookup("x"), global_x)
+        self.assertEqual(outer.slots, [])
+
+    def test_frozen_scope_uses_the_flattened_chain(self):
+        builtins, global_scope, outer, inner = chain()
+        global_scope.insert(var("x"))
+        outer_x = var("x")
+        outer.insert(outer_x)
+        inner.insert(var("z"))
+        for scope in (global_scope, outer, inner):
+            scope.freeze()
+        self.assertIs(inner.lookup("x"), outer_x)
+        self.assertIsNone(inner.lookup("x", current_scope_only=True))
+        self.assertIsNone(inner.lookup("missing"))
+        self.assertEqual(sorted(inner.flatten()), ["INTEGER", "REAL", "x", "z"])
+        with self.assertRaises(Exception) as context:
+            inner.insert(var("w"))
+        self.assertEqual(str(context.exception), "Error: Cannot insert 'w' into frozen scope 'inner'")
+
+    def test_analyzer_freezes_its_scopes(self):
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(Parser(Lexer("program p; var a : integer; procedure q; begin a := 1 end; begin q end.")).parse())
+        self.assertEqual([scope.scope_name for scope in analyzer.scopes], ["global", "q"])
+        self.assertTrue(all(scope.frozen for scope in analyzer.scopes))
+        self.assertEqual(analyzer.scopes[1].lookup("a").scope_level, 1)
+
+
+class RecordingListener(SymbolTableListener):
+    def __init__(self):
+        self.events = []
+
+    def insert(self, scope, symbol):
+        self.events.append(("insert", scope.scope_name, symbol.name))
+
+    def lookup(self, scope, name, symbol):
+        self.events.append(("lookup", scope.scope_name, name, symbol is not None))
+
+    def enter_scope(self, scope):
+        self.events.append(("enter", scope.scope_name))
+
+    def leave_scope(self, scope):
+        self.events.append(("leave", scope.scope_name))
+
+
+class ListenerTest(unittest.TestCase):
+    def test_traced_lookup_reports_every_hop(self):
+        builtins, global_scope, outer, inner = chain(PrintingListener())
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            global_scope.insert(var("x"))
+            inner.lookup("x")
+            inner.lookup("x")
+        hops = ["Lookup: x. (Scope name: %s)" % name for name in ("inner", "outer", "global")]
+        self.assertEqual(output.getvalue().splitlines(), ["Insert: x"] + hops + hops)
+
+    def test_counting_listener(self):
+        listener = CountingListener()
+        builtins, global_scope, outer, inner = chain(listener)
+        global_scope.insert(var("x"))
+        inner.lookup("x")
+        inner.lookup("nothing")
+        self.assertEqual(dict(listener.inserts), {0: 2, 1: 1})
+        self.assertEqual(dict(listener.hits), {1: 1})
+        self.assertEqual(dict(listener.misses), {0: 1, 1: 1, 2: 2, 3: 2})
+        self.assertIn("Total        0        3        1        6", str(listener))
+
+    def test_analysis_trace(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            SemanticAnalyzer(PrintingListener()).visit(
+                Parser(Lexer("program p; var a : integer; begin a := 1 end.")).parse())
+        lines = [line for line in output.getvalue().splitlines() if line.startswith(("Insert", "Lookup", "ENTER",
+                                                                                       "LEAVE"))]
+        self.assertEqual(lines, [
+            "Insert: INTEGER",
+            "Insert: REAL",
+            "Insert: p",
+            "ENTER scope: global",
+            "Lookup: INTEGER. (Scope name: global)",
+            "Lookup: INTEGER. (Scope name: builtins)",
+            "Lookup: a. (Scope name: global)",
+            "Insert: a",
+            "Lookup: a. (Scope name: global)",
+            "Lookup: a. (Scope name: global)",
+            "LEAVE scope: global",
+        ])
+
+    def test_hook_order_during_analysis(self):
+        listener = RecordingListener()
+        SemanticAnalyzer(listener).visit(Parser(Lexer(PROCEDURE)).parse())
+        self.assertEqual(listener.events, [
+            ("insert", "builtins", "INTEGER"),
+            ("insert", "builtins", "REAL"),
+            ("insert", "builtins", "p"),
+            ("enter", "global"),
+            ("lookup", "global", "INTEGER", False),
+            ("lookup", "builtins", "INTEGER", True),
+            ("lookup", "global", "a", False),
+            ("insert", "global", "a"),
+            ("insert", "global", "q"),
+            ("enter", "q"),
+            ("lookup", "q", "INTEGER", False),
+            ("lookup", "global", "INTEGER", False),
+            ("lookup", "builtins", "INTEGER", True),
+            ("insert", "q", "n"),
+            ("lookup", "q", "a", False),
+            ("lookup", "global", "a", True),
+            ("lookup", "q", "n", True),
+            ("lookup", "q", "a", False),
+            ("lookup", "global", "a", True),
+            ("leave", "q"),
+            ("lookup", "global", "q", True),
+            ("lookup", "global", "a", True),
+            ("leave", "global"),
+        ])
+
+    def test_counts_during_analysis(self):
+        listener = CountingListener()
+        SemanticAnalyzer(listener).visit(Parser(Lexer(PROCEDURE)).parse())
+        self.assertEqual(dict(listener.scopes), {1: 1, 2: 1})
+        self.assertEqual(dict(listener.inserts), {0: 3, 1: 2, 2: 1})
+        self.assertEqual(dict(listener.hits), {0: 2, 1: 4, 2: 1})
+        self.assertEqual(dict(listener.misses), {1: 3, 2: 3})
+        self.assertEqual(str(listener).splitlines()[-1], "Total        2        6        7        6")
+
+    def test_listener_is_silent_by_default(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            SemanticAnalyzer().visit(Parser(Lexer(PROCEDURE)).parse())
+        self.assertEqual(output.getvalue(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
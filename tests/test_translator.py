@@ -0,0 +1,98 @@
+import io
+import random
+import unittest
+
+from spi import BulkLexer, StacklessParser, ParserError, BinOp, UnaryOp, Num, EOF, PLUS, MINUS, NOT
+from translator import BINARY_NAMES
+from postfix_translator import PostfixTranslator
+from lisp_translator import LispTranslator
+
+OPERATORS = ("+", "-", "*", "/", "div", "and", "or")
+RELATIONS = ("=", "<>", "<", "<=", ">", ">=")
+
+
+def random_expression(rand, depth):
+    if depth == 0 or rand.random() < 0.2:
+        return rand.choice(("a", "b", "x1", "7", "2.5"))
+    roll = rand.random()
+    if roll < 0.15:
+        return "%s%s" % (rand.choice(("-", "+", "not ")), random_expression(rand, depth - 1))
+    if roll < 0.3:
+        return "(%s)" % random_expression(rand, depth - 1)
+    return "%s %s %s" % (random_expression(rand, depth - 1), rand.choice(OPERATORS), random_expression(rand, depth - 1))
+
+
+def parse(text):
+    parser = StacklessParser(BulkLexer(text))
+    node = parser.expr()
+    assert parser.current_token.type == EOF
+    return node
+
+
+def postfix(node, unary_names={PLUS: "pos", MINUS: "neg", NOT: "not"}):
+    if isinstance(node, BinOp):
+        return "%s %s %s" % (postfix(node.left), postfix(node.right), BINARY_NAMES[node.op.type])
+    if isinstance(node, UnaryOp):
+        return "%s %s" % (postfix(node.expr), unary_names[node.op.type])
+    return str(node.value) if isinstance(node, Num) else node.value
+
+
+def lisp(node, unary_names={PLUS: "+", MINUS: "-", NOT: "not"}):
+    if isinstance(node, BinOp):
+        return "(%s %s %s)" % (BINARY_NAMES[node.op.type], lisp(node.left), lisp(node.right))
+    if isinstance(node, UnaryOp):
+        return "(%s %s)" % (unary_names[node.op.type], lisp(node.expr))
+    return str(node.value) if isinstance(node, Num) else node.value
+
+
+class TranslatorTest(unittest.TestCase):
+    def test_translations_match_the_spi_parser(self):
+        rand = random.Random(0)
+        expressions = [random_expression(rand, 5) for _ in range(500)]
+        expressions.extend("%s %s %s" % (random_expression(rand, 2), rand.choice(RELATIONS),
+                                         random_expression(rand, 2)) for _ in range(100))
+        for translator_class, render in ((PostfixTranslator, postfix), (LispTranslator, lisp)):
+            output = io.StringIO()
+            translator_class().translate_stream(io.StringIO("\n".join(expressions)), output)
+            self.assertEqual(output.getvalue().splitlines(), [render(parse(text)) for text in expressions])
+
+    def test_every_input_line_has_an_output_line(self):
+        source = "1 + 2\na * (b\n\n3 * 4 {four}\n(1 + 2\nx ? 2\n{note}\na < b < c\n5 div 2\n1 2"
+        output = io.StringIO()
+        diagnostics = io.StringIO()
+        translator = PostfixTranslator()
+        self.assertEqual(translator.translate_stream(io.StringIO(source), output, diagnostics=diagnostics), 3)
+        errors = [
+            "Invalid syntax on line 2: expected ')', found end of file",
+            "Invalid syntax on line 5: expected ')', found end of file",
+            "Invalid character '?' on line 6",
+            "Invalid syntax on line 8: unexpected '<'",
+            "Invalid syntax on line 10: unexpected '2'",
+        ]
+        self.assertEqual(output.getvalue().splitlines(), [
+            "1 2 +", "# " + errors[0], "", "3 4 *", "# " + errors[1], "# " + errors[2], "", "# " + errors[3],
+            "5 2 div", "# " + errors[4],
+        ])
+        self.assertEqual(diagnostics.getvalue().splitlines(), errors)
+        self.assertEqual(translator.failed, 5)
+
+    def test_lines_stay_aligned_across_chunks(self):
+        lines = ["1 + 2", "", "3 *", "-a", "{c}"] * 50
+        output = io.StringIO()
+        LispTranslator().translate_stream(io.StringIO("\n".join(lines)), output, chunk_size=7,
+                                          diagnostics=io.StringIO())
+        translations = output.getvalue().splitlines()
+        self.assertEqual(len(translations), len(lines))
+        self.assertEqual(translations[:5], ["(+ 1 2)", "", "; Invalid syntax on line 3: expected identifier, "
+                                                            "found end of file", "(- a)", ""])
+        self.assertEqual(translations[-5:-3], ["(+ 1 2)", ""])
+
+    def test_translate_one_expression(self):
+        self.assertEqual(PostfixTranslator().translate("(5 + 3) * 12 / 3"), "5 3 + 12 * 3 /")
+        self.assertEqual(LispTranslator().translate("2 + 3 * 5"), "(+ 2 (* 3 5))")
+        with self.assertRaises(ParserError):
+            LispTranslator().translate("{nothing}")
+
+
+if __name__ == "__main__":
+    unittest.main()
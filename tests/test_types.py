@@ -0,0 +1,73 @@
+import operator
+import unittest
+
+from spi import ToReal, make_interpreter, INTEGER, REAL, BOOLEAN
+from helpers import BACKENDS, analyze
+
+DECLARATIONS = "program p; var a, b : integer; r, s : real; "
+
+
+def statements(text):
+    return analyze(DECLARATIONS + "begin " + text + " end.").block_node.compound_statement.children
+
+
+class StaticTypeTest(unittest.TestCase):
+    def test_expression_types(self):
+        cases = [
+            ("a := a div b + 1", INTEGER),
+            ("r := a / b", REAL),
+            ("r := a * r - 1", REAL),
+            ("r := -s", REAL),
+            ("if (a > 1) and not (r <= s) then a := 1", BOOLEAN),
+            ("if a * 2 = b then a := 1", BOOLEAN),
+        ]
+        for text, expected in cases:
+            node = statements(text)[0]
+            expression = node.condition if hasattr(node, "condition") else node.right
+            self.assertEqual(expression.type, expected, text)
+
+    def test_operations_are_chosen_at_analysis_time(self):
+        assign = statements("a := a div b; r := a / b; r := r + a")
+        self.assertIs(assign[0].right.operation, operator.floordiv)
+        self.assertIs(assign[1].right.operation, operator.truediv)
+        self.assertIs(assign[2].right.operation, operator.add)
+
+    def test_integer_values_are_converted_to_real(self):
+        text = "program p; var r, t : real; procedure q(x : real); begin t := x end; begin r := 2; q(3) end."
+        assign, call = analyze(text).block_node.compound_statement.children
+        self.assertIsInstance(assign.right, ToReal)
+        self.assertIsInstance(call.actual_params[0], ToReal)
+        for backend in BACKENDS:
+            interpreter = make_interpreter(analyze(text), backend)
+            interpreter.interpret()
+            self.assertEqual([type(value) for value in interpreter.GLOBAL_MEMORY.values()], [float, float], backend)
+
+    def test_invalid_programs_are_rejected_before_running(self):
+        cases = [
+            ("r := r div s", "Error: Operator 'DIV' cannot be applied to REAL and REAL"),
+            ("a := r div 2", "Error: Operator 'DIV' cannot be applied to REAL and INTEGER"),
+            ("a := a / b", "Error: Cannot assign REAL to INTEGER variable 'a'"),
+            ("a := a > b", "Error: Cannot assign BOOLEAN to INTEGER variable 'a'"),
+            ("if a then a := 1", "Error: Condition must be BOOLEAN, got INTEGER"),
+            ("while r + 1 do r := 1", "Error: Condition must be BOOLEAN, got REAL"),
+            ("a := -(a > b)", "Error: Operator '-' cannot be applied to BOOLEAN"),
+            ("if not a then a := 1", "Error: Operator 'NOT' cannot be applied to INTEGER"),
+            ("if (a > 1) + (b > 1) then a := 1", "Error: Operator '+' cannot be applied to BOOLEAN and BOOLEAN"),
+            ("if a and b then a := 1", "Error: Operator 'AND' cannot be applied to INTEGER and INTEGER"),
+            ("for r := 1 to 2 do a := 1", "Error: FOR control variable 'r' must be INTEGER, got REAL"),
+            ("for a := 1 to r do b := 1", "Error: FOR loop bounds must be INTEGER, got REAL"),
+            ("for a := 1 to 2 do a := 1", "Error: Cannot assign to FOR control variable 'a'"),
+        ]
+        for text, message in cases:
+            with self.assertRaises(Exception, msg=text) as context:
+                statements(text)
+            self.assertEqual(str(context.exception), message, text)
+
+    def test_real_argument_for_integer_parameter_is_rejected(self):
+        with self.assertRaises(Exception) as context:
+            analyze("program p; var r : real; procedure q(n : integer); begin end; begin r := 1.5; q(r) end.")
+        self.assertEqual(str(context.exception), "Error: Argument 1 of procedure 'q' must be INTEGER, got REAL")
+
+
+if __name__ == "__main__":
+    unittest.main()
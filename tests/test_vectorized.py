@@ -0,0 +1,57 @@
+import unittest
+
+from vectorized import np, parse_expression, evaluate, Unvectorizable, VectorizedEvaluator
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class VectorizedTest(unittest.TestCase):
+    def test_large_unsigned_column_falls_back_to_rows(self):
+        columns = {"u": np.array([2 ** 63, 5], dtype=np.uint64)}
+        with self.assertRaises(Unvectorizable):
+            VectorizedEvaluator(columns)
+        self.assertEqual(evaluate(parse_expression("u + 1"), columns).tolist(), [2 ** 63 + 1, 6])
+
+    def test_small_unsigned_column_is_vectorized(self):
+        columns = {"u": np.array([3, 5], dtype=np.uint64)}
+        result = evaluate(parse_expression("u div 2 - 4"), columns, fallback=False)
+        self.assertEqual(result.tolist(), [-3, -2])
+
+    def test_boolean_columns_are_vectorized(self):
+        columns = {"p": np.array([True, False, True, False]), "q": np.array([True, True, False, False]),
+                   "a": np.array([1, 2, 3, 4])}
+        result = evaluate(parse_expression("not p and q or (a > 3)"), columns, fallback=False)
+        self.assertEqual(result.dtype, np.bool_)
+        self.assertEqual(result.tolist(), [False, True, False, True])
+
+    def test_type_errors_are_rejected_before_evaluating(self):
+        columns = {"r": np.array([1.5, 2.5]), "a": np.array([1, 2]), "p": np.array([True, False])}
+        cases = [
+            ("r div 2", "Error: Operator 'DIV' cannot be applied to REAL and INTEGER"),
+            ("a div r", "Error: Operator 'DIV' cannot be applied to INTEGER and REAL"),
+            ("p + 1", "Error: Operator '+' cannot be applied to BOOLEAN and INTEGER"),
+            ("not a", "Error: Operator 'NOT' cannot be applied to INTEGER"),
+            ("a and p", "Error: Operator 'AND' cannot be applied to INTEGER and BOOLEAN"),
+        ]
+        for text, message in cases:
+            for fallback in (True, False):
+                with self.assertRaises(Exception, msg=text) as context:
+                    evaluate(parse_expression(text), columns, fallback=fallback)
+                self.assertEqual(str(context.exception), message, text)
+
+    def test_mixed_arithmetic_matches_the_row_loop(self):
+        columns = {"a": np.array([7, -7, 3]), "r": np.array([0.5, 2.0, -1.25])}
+        node = parse_expression("a div 2 + a / 4 * r - -a")
+        vectorized = evaluate(node, columns, fallback=False)
+        self.assertEqual(vectorized.tolist(), [7 // 2 + 7 / 4 * 0.5 + 7, -7 // 2 - 7 / 4 * 2.0 - 7,
+                                               3 // 2 + 3 / 4 * -1.25 + 3])
+
+    def test_division_by_zero_falls_back_to_rows(self):
+        columns = {"a": np.array([4, 0])}
+        with self.assertRaises(Unvectorizable):
+            evaluate(parse_expression("8 div a"), columns, fallback=False)
+        with self.assertRaises(ZeroDivisionError):
+            evaluate(parse_expression("8 div a"), columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
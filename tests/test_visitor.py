@@ -0,0 +1,86 @@
+import unittest
+
+from spi import NodeVisitor, StacklessNodeVisitor, Interpreter, StacklessInterpreter, Num, BinOp, Token,\
+    INTEGER_CONST, PLUS
+from profiler import ProfilingInterpreter
+
+
+def num(value):
+    return Num(Token(INTEGER_CONST, value))
+
+
+class Counter(NodeVisitor):
+    def visit_Num(self, node):
+        return "num"
+
+
+class Doubler(Counter):
+    def visit_BinOp(self, node):
+        return "binop"
+
+
+class Collector(StacklessNodeVisitor):
+    def visit_BinOp(self, node):
+        left = yield node.left
+        right = yield node.right
+        return left + right
+
+    def visit_Num(self, node):
+        return [node.value]
+
+
+class DispatchTableTest(unittest.TestCase):
+    def test_every_subclass_gets_its_own_table(self):
+        for cls in (Counter, Doubler, Collector, Interpreter, StacklessInterpreter, ProfilingInterpreter):
+            self.assertIn("_dispatch_table", vars(cls), cls.__name__)
+        self.assertIsNot(Counter._dispatch_table, Doubler._dispatch_table)
+        self.assertIsNot(Interpreter._dispatch_table, StacklessInterpreter._dispatch_table)
+        self.assertIsNot(Interpreter._dispatch_table, ProfilingInterpreter._dispatch_table)
+
+    def test_resolved_visitors_are_cached_per_class(self):
+        counter = Counter()
+        self.assertEqual(counter.visit(num(1)), "num")
+        self.assertIs(Counter._dispatch_table[Num], Counter.visit_Num)
+        self.assertNotIn(Num, Doubler._dispatch_table)
+        self.assertEqual(Doubler().visit(num(1)), "num")
+        self.assertIs(Doubler._dispatch_table[Num], Counter.visit_Num)
+
+    def test_subclass_override_does_not_leak_into_the_base(self):
+        tree = BinOp(num(1), Token(PLUS, "+"), num(2))
+        self.assertEqual(Doubler().visit(tree), "binop")
+        with self.assertRaises(Exception) as context:
+            Counter().visit(tree)
+        self.assertEqual(str(context.exception), "No visit_BinOp method")
+        self.assertIs(Counter._dispatch_table[BinOp], NodeVisitor.generic_visit)
+        self.assertIs(Doubler._dispatch_table[BinOp], Doubler.visit_BinOp)
+
+    def test_interpreter_overrides(self):
+        self.assertIs(Interpreter.resolve_visitor(BinOp), Interpreter.visit_BinOp)
+        self.assertIs(StacklessInterpreter.resolve_visitor(BinOp), StacklessInterpreter.visit_BinOp)
+        self.assertIsNot(StacklessInterpreter.visit_BinOp, Interpreter.visit_BinOp)
+        # the profiler keeps the tree interpreter's visitors and wraps them in its own visit
+        self.assertIs(ProfilingInterpreter.resolve_visitor(BinOp), Interpreter.visit_BinOp)
+        self.assertIsNot(ProfilingInterpreter.visit, Interpreter.visit)
+
+    def test_lookup_visitor_resolves_on_first_use(self):
+        counter = Counter()
+        Counter._dispatch_table.clear()
+        self.assertIs(counter.lookup_visitor(num(1)), Counter.visit_Num)
+        self.assertIs(Counter._dispatch_table[Num], Counter.visit_Num)
+
+    def test_generic_visit_fallback(self):
+        class Fallback(NodeVisitor):
+            def generic_visit(self, node):
+                return type(node).__name__
+        self.assertEqual(Fallback().visit(num(1)), "Num")
+        self.assertIs(Fallback._dispatch_table[Num], Fallback.generic_visit)
+
+    def test_stackless_visitor_resumes_generators(self):
+        tree = num(1)
+        for value in range(2, 2000):
+            tree = BinOp(tree, Token(PLUS, "+"), num(value))
+        self.assertEqual(Collector().visit(tree), list(range(1, 2000)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from vm import BytecodeCompiler, VirtualMachine, LOAD_CONST, STORE_GLOBAL, STORE_FAST, STORE_DEREF
+from helpers import analyze, run
+
+PROGRAMS = [
+    """program Arithmetic;
+    var a, b, q : integer; x, y : real;
+    begin
+       a := 7; b := -3;
+       q := a div b + a * b - -a;
+       x := a / 2 + 0.25;
+       y := (x - q) * 2.5 / (b + 0.5)
+    end.""",
+    """program Control;
+    var i, s, p, n : integer;
+    begin
+       s := 0; p := 1; n := 0;
+       for i := 1 to 10 do
+          if (i div 2 * 2 = i) and not (i > 8) then s := s + i else p := p * 2;
+       for i := 5 downto 1 do n := n * 10 + i;
+       while (s > 0) or (p < 0) do s := s - 7;
+       if (p > 10) or (p div 0 = 1) then n := n + 1
+    end.""",
+    """program Nested;
+    var total, count : integer;
+    procedure Outer(n : integer);
+       var acc : integer;
+       procedure Inner(k : integer);
+       begin
+          acc := acc + k;
+          count := count + 1
+       end;
+    begin
+       acc := n;
+       Inner(n * 2);
+       Inner(acc);
+       total := total + acc
+    end;
+    begin
+       total := 0; count := 0;
+       Outer(1); Outer(5)
+    end.""",
+    """program Recursive;
+    var result : integer;
+    procedure Fib(n : integer);
+       var saved : integer;
+    begin
+       if n < 2 then result := result + n
+       else begin saved := n; Fib(saved - 1); Fib(saved - 2) end
+    end;
+    begin
+       result := 0;
+       Fib(12)
+    end.""",
+]
+
+FAILING = [
+    "program p; var a, b : integer; begin a := 1; b := a div (a - 1); a := 2 end.",
+    "program p; var a, b : integer; begin b := a + 1 end.",
+]
+
+
+class VirtualMachineTest(unittest.TestCase):
+    def test_memory_matches_the_tree_interpreter(self):
+        for text in PROGRAMS:
+            expected = run(analyze(text), "tree")
+            self.assertIsInstance(expected, dict)
+            self.assertEqual(run(analyze(text), "vm"), expected, text)
+
+    def test_errors_match_the_tree_interpreter(self):
+        for text in FAILING:
+            self.assertEqual(run(analyze(text), "vm"), run(analyze(text), "tree"), text)
+
+    def test_program_can_run_again(self):
+        machine = VirtualMachine(BytecodeCompiler().compile(analyze(PROGRAMS[3])))
+        machine.interpret()
+        first = dict(machine.GLOBAL_MEMORY)
+        machine.interpret()
+        self.assertEqual(dict(machine.GLOBAL_MEMORY), first)
+        self.assertEqual(first, {"result": 144})
+
+    def test_constants_are_pooled(self):
+        code = BytecodeCompiler().compile(analyze("program p; var a, b : integer; begin a := 3; b := a + 3 * 3 end."))
+        self.assertEqual(code.constants, (3,))
+        self.assertEqual([arg for block in code.blocks for op, arg in block if op == LOAD_CONST], [0, 0, 0])
+
+    def test_variables_use_slot_instructions(self):
+        code = BytecodeCompiler().compile(analyze(PROGRAMS[2]))
+        total, count = code.names.index("total"), code.names.index("count")
+        self.assertIn((STORE_FAST, total), code.instructions)
+        outer = code.procedures[0]
+        inner = outer.procedures[0]
+        self.assertEqual((outer.name, inner.name), ("outer", "inner"))
+        acc = outer.names.index("acc")
+        self.assertIn((STORE_FAST, acc), outer.instructions)
+        self.assertIn((STORE_GLOBAL, total), outer.instructions)
+        self.assertIn((STORE_DEREF, (outer.level, acc, "acc")), inner.instructions)
+        self.assertIn((STORE_GLOBAL, count), inner.instructions)
+
+    def test_disassembly_names_slots(self):
+        listing = str(BytecodeCompiler().compile(analyze(PROGRAMS[2])))
+        self.assertIn("Code outer (level 2", listing)
+        self.assertIn("STORE_FAST", listing)
+        self.assertIn("(acc)", listing)
+
+
+if __name__ == "__main__":
+    unittest.main()
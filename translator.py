@@ -0,0 +1,156 @@
+import argparse
+import sys
+
+from spi import BulkLexer, StacklessParser, LexerError, ParserError, LEXEME_PATTERN, PUNCTUATION, EOF_TOKEN,\
+    INTEGER_CONST, REAL_CONST, ID, PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, EQUAL, NOT_EQUAL, LESS_THAN,\
+    LESS_EQUAL, GREATER_THAN, GREATER_EQUAL, AND, OR, EOF
+
+BINARY_NAMES = {
+    PLUS: "+",
+    MINUS: "-",
+    MULTIPLY: "*",
+    FLOAT_DIV: "/",
+    INTEGER_DIV: "div",
+    EQUAL: "=",
+    NOT_EQUAL: "<>",
+    LESS_THAN: "<",
+    LESS_EQUAL: "<=",
+    GREATER_THAN: ">",
+    GREATER_EQUAL: ">=",
+    AND: "and",
+    OR: "or",
+}
+
+OPERANDS = (INTEGER_CONST, REAL_CONST, ID)
+
+
+class ExpressionTranslator(StacklessParser):
+    # the grammar is StacklessParser.expr(); a subclass is the emitter for one target, naming the unary
+    # operators and building text in unary_node() and binary_node()
+    binary_names = BINARY_NAMES
+    unary_names = {}
+    comment = "# %s"
+
+    def __init__(self):
+        self.lexer = BulkLexer(None)
+        self.known = dict(PUNCTUATION)
+        self.token_index = None
+        self.current_token = EOF_TOKEN
+        self.line = None
+        self.failed = 0
+
+    def error(self, expected=None):
+        raise ParserError(self.current_token, None, expected, self.line)
+
+    def operand(self):
+        token = self.current_token
+        if token.type in OPERANDS:
+            self.eat(token.type)
+            return str(token.value)
+        self.eat(ID)
+
+    def tokens(self, text):
+        known = self.known
+        tokens = []
+        for lexeme in LEXEME_PATTERN.findall(text):
+            token = known.get(lexeme)
+            if token is None:
+                try:
+                    token = self.lexer.classify(lexeme)
+                except LexerError as error:
+                    raise LexerError(error.character, error.offset, self.line) from None
+                if token is None:
+                    continue
+                known[lexeme] = token
+            tokens.append(token)
+        return tokens
+
+    def translate_line(self, text, line=1):
+        # None for a line without an expression
+        self.line = line
+        tokens = self.tokens(text)
+        if not tokens:
+            return None
+        tokens.append(EOF_TOKEN)
+        lexer = self.lexer
+        lexer.tokens = tokens
+        lexer.pos = 0
+        self.current_token = lexer.get_next_token()
+        result = self.expr()
+        if self.current_token.type != EOF:
+            self.error()
+        return result
+
+    def translate(self, text):
+        result = self.translate_line(text)
+        if result is None:
+            self.error()
+        return result
+
+    def translate_stream(self, source, output, chunk_size=1 << 16, diagnostics=None):
+        if diagnostics is None:
+            diagnostics = sys.stderr
+        translate_line = self.translate_line
+        comment = self.comment
+        line = 0
+        count = 0
+        while True:
+            lines = source.readlines(chunk_size)
+            if not lines:
+                return count
+            # one output line per input line: a blank line stays blank and a malformed one becomes a
+            # comment in the target's syntax holding the error
+            results = []
+            for text in lines:
+                line += 1
+                try:
+                    result = translate_line(text, line)
+                except (ParserError, LexerError) as error:
+                    diagnostics.write("%s\n" % error)
+                    self.failed += 1
+                    result = comment % error
+                else:
+                    if result is None:
+                        result = ""
+                    else:
+                        count += 1
+                results.append(result)
+            output.write("\n".join(results))
+            output.write("\n")
+
+
+def main(translator_class, description):
+    arg_parser = argparse.ArgumentParser(description=description)
+    arg_parser.add_argument("file", nargs="?",
+                            help="file with one expression per line, or - for standard input; without it "
+                                 "expressions are read from the prompt")
+    arg_parser.add_argument("-o", "--output", help="write the translations to this file instead of stdout")
+    args = arg_parser.parse_args()
+    translator = translator_class()
+
+    if args.file is not None:
+        source = sys.stdin if args.file == "-" else open(args.file)
+        output = open(args.output, "w") if args.output else sys.stdout
+        try:
+            translator.translate_stream(source, output)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not sys.stdout:
+                output.close()
+        if translator.failed:
+            sys.exit(1)
+        return
+
+    while True:
+        try:
+            text = input("spi> ")
+        except EOFError:
+            break
+        if not text:
+            continue
+
+        try:
+            print(translator.translate(text))
+        except (ParserError, LexerError) as e:
+            print(e)
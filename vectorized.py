@@ -0,0 +1,249 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from spi import NodeVisitor, Lexer, Parser, SemanticAnalyzer, ScopedSymbolTable, VarSymbol, BuiltinTypeSymbol, EOF,\
+    INTEGER, REAL, BOOLEAN, PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, EQUAL, NOT_EQUAL, LESS_THAN, LESS_EQUAL,\
+    GREATER_THAN, GREATER_EQUAL, AND, OR, NOT
+
+COMPARISONS = {
+    EQUAL: "equal",
+    NOT_EQUAL: "not_equal",
+    LESS_THAN: "less",
+    LESS_EQUAL: "less_equal",
+    GREATER_THAN: "greater",
+    GREATER_EQUAL: "greater_equal",
+}
+
+COLUMN_TYPES = {
+    "b": BOOLEAN,
+    "i": INTEGER,
+    "u": INTEGER,
+    "f": REAL,
+}
+
+INT64_LIMIT = 2 ** 63
+
+
+class Unvectorizable(Exception):
+    pass
+
+
+def parse_expression(text):
+    parser = Parser(Lexer(text))
+    node = parser.expr()
+    if parser.current_token.type != EOF:
+        parser.error()
+    return node
+
+
+def column_type(name, column):
+    if np is not None:
+        kind = np.asarray(column).dtype.kind
+        if kind in COLUMN_TYPES:
+            return COLUMN_TYPES[kind]
+    values = list(column)
+    if values and all(isinstance(value, bool) for value in values):
+        return BOOLEAN
+    if any(isinstance(value, bool) or not isinstance(value, (int, float)) for value in values):
+        raise Exception("Error: Column '%s' must hold INTEGER, REAL or BOOLEAN values" % name)
+    if all(isinstance(value, int) for value in values):
+        return INTEGER
+    return REAL
+
+
+def check_types(node, columns):
+    analyzer = SemanticAnalyzer()
+    scope = ScopedSymbolTable(scope_name="columns", scope_level=1, enclosing_scope=analyzer.current_scope)
+    for name, column in columns.items():
+        scope.insert(VarSymbol(name, BuiltinTypeSymbol(column_type(name, column))))
+    analyzer.enter_scope(scope)
+    return analyzer.visit(node)
+
+
+class RowEvaluator(NodeVisitor):
+    def __init__(self, row):
+        self.row = row
+
+    def visit_Num(self, node):
+        return node.value
+
+    def visit_Var(self, node):
+        try:
+            return self.row[node.value]
+        except KeyError:
+            raise NameError(repr(node.value))
+
+    def visit_UnaryOp(self, node):
+        if node.op.type == MINUS:
+            return -self.visit(node.expr)
+        elif node.op.type == NOT:
+            return not self.visit(node.expr)
+        return +self.visit(node.expr)
+
+    def visit_BinOp(self, node):
+        op_type = node.op.type
+        left = self.visit(node.left)
+        if op_type == AND:
+            return left and self.visit(node.right)
+        elif op_type == OR:
+            return left or self.visit(node.right)
+        right = self.visit(node.right)
+        if op_type == PLUS:
+            return left + right
+        elif op_type == MINUS:
+            return left - right
+        elif op_type == MULTIPLY:
+            return left * right
+        elif op_type == FLOAT_DIV:
+            return left / right
+        elif op_type == INTEGER_DIV:
+            return left // right
+        elif op_type == EQUAL:
+            return left == right
+        elif op_type == NOT_EQUAL:
+            return left != right
+        elif op_type == LESS_THAN:
+            return left < right
+        elif op_type == LESS_EQUAL:
+            return left <= right
+        elif op_type == GREATER_THAN:
+            return left > right
+        elif op_type == GREATER_EQUAL:
+            return left >= right
+
+
+class VectorizedEvaluator(NodeVisitor):
+    def __init__(self, columns):
+        if np is None:
+            raise Unvectorizable("numpy is not installed")
+        self.columns = {}
+        for name, column in columns.items():
+            column = np.asarray(column)
+            if column.dtype.kind not in "biuf":
+                raise Unvectorizable("column %r has unsupported dtype %s" % (name, column.dtype))
+            if column.dtype.kind == "u" and column.size and int(column.max()) >= INT64_LIMIT:
+                raise Unvectorizable("column %r has values that do not fit in 64-bit signed integers" % name)
+            if column.dtype.kind == "u":
+                column = column.astype(np.int64)
+            self.columns[name] = column
+
+    def evaluate(self, node, rows):
+        with np.errstate(over="ignore", invalid="ignore"):
+            result = self.visit(node)
+        if np.ndim(result) == 0:
+            return np.full(rows, result)
+        return result
+
+    @staticmethod
+    def magnitude(value):
+        if np.ndim(value) == 0:
+            return abs(int(value))
+        if value.size == 0:
+            return 0
+        return max(abs(int(value.min())), abs(int(value.max())))
+
+    @staticmethod
+    def is_integer(value):
+        return np.asarray(value).dtype.kind == "i"
+
+    def check_overflow(self, left, right, op_type):
+        if not (self.is_integer(left) and self.is_integer(right)):
+            return
+        left_magnitude = self.magnitude(left)
+        right_magnitude = self.magnitude(right)
+        if op_type == MULTIPLY:
+            bound = left_magnitude * right_magnitude
+        else:
+            bound = left_magnitude + right_magnitude
+        if bound >= INT64_LIMIT:
+            raise Unvectorizable("integer result may not fit in 64 bits")
+
+    def visit_Num(self, node):
+        value = node.value
+        if isinstance(value, int):
+            if abs(value) >= INT64_LIMIT:
+                raise Unvectorizable("integer constant %d does not fit in 64 bits" % value)
+            return np.int64(value)
+        return np.float64(value)
+
+    def visit_Var(self, node):
+        try:
+            return self.columns[node.value]
+        except KeyError:
+            raise NameError(repr(node.value))
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.expr)
+        if node.op.type == MINUS:
+            if self.is_integer(operand) and self.magnitude(operand) >= INT64_LIMIT - 1:
+                raise Unvectorizable("integer negation may overflow")
+            return np.negative(operand)
+        elif node.op.type == NOT:
+            if np.asarray(operand).dtype.kind != "b":
+                raise Unvectorizable("NOT applied to a non-boolean column")
+            return np.logical_not(operand)
+        return operand
+
+    def visit_BinOp(self, node):
+        op_type = node.op.type
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if op_type in COMPARISONS:
+            return getattr(np, COMPARISONS[op_type])(left, right)
+        if op_type in (AND, OR):
+            if np.asarray(left).dtype.kind != "b" or np.asarray(right).dtype.kind != "b":
+                raise Unvectorizable("%s applied to a non-boolean column" % op_type)
+            if op_type == AND:
+                return np.logical_and(left, right)
+            return np.logical_or(left, right)
+        if op_type in (PLUS, MINUS, MULTIPLY):
+            self.check_overflow(left, right, op_type)
+            if op_type == PLUS:
+                return np.add(left, right)
+            elif op_type == MINUS:
+                return np.subtract(left, right)
+            return np.multiply(left, right)
+        if np.any(np.equal(right, 0)):
+            raise Unvectorizable("division by zero in at least one row")
+        if op_type == FLOAT_DIV:
+            return np.true_divide(left, right)
+        elif op_type == INTEGER_DIV:
+            if self.is_integer(left) and self.is_integer(right) and self.magnitude(left) >= INT64_LIMIT - 1:
+                raise Unvectorizable("integer division may overflow")
+            return np.floor_divide(left, right)
+        raise Unvectorizable("unsupported operator %s" % op_type)
+
+
+def row_count(columns):
+    counts = set(len(column) for column in columns.values())
+    if len(counts) > 1:
+        raise ValueError("Columns have different lengths: %s" % sorted(counts))
+    return counts.pop() if counts else 1
+
+
+def evaluate_rows(node, columns):
+    names = list(columns)
+    results = []
+    for values in zip(*(columns[name] for name in names)) if names else [()]:
+        row = {name: value.item() if hasattr(value, "item") else value for name, value in zip(names, values)}
+        results.append(RowEvaluator(row).visit(node))
+    if np is not None:
+        # numpy would turn integers beyond int64 into floats, so keep them as Python ints
+        if any(isinstance(value, int) and abs(value) >= INT64_LIMIT for value in results):
+            return np.array(results, dtype=object)
+        return np.array(results)
+    return results
+
+
+def evaluate(node, columns, fallback=True):
+    rows = row_count(columns)
+    # type errors are reported as spi reports them instead of being left to whichever evaluator runs
+    check_types(node, columns)
+    try:
+        return VectorizedEvaluator(columns).evaluate(node, rows)
+    except Unvectorizable:
+        if not fallback:
+            raise
+    return evaluate_rows(node, columns)
@@ -0,0 +1,403 @@
+from collections import OrderedDict
+
+from spi import NodeVisitor, PLUS, MINUS, MULTIPLY, FLOAT_DIV, INTEGER_DIV, EQUAL, NOT_EQUAL, LESS_THAN,\
+    LESS_EQUAL, GREATER_THAN, GREATER_EQUAL, AND, OR, NOT
+
+LOAD_FAST, STORE_FAST, LOAD_GLOBAL, STORE_GLOBAL, LOAD_DEREF, STORE_DEREF, LOAD_CONST, BINARY_ADD,\
+    BINARY_SUBTRACT, BINARY_MULTIPLY, BINARY_FLOAT_DIV, BINARY_INTEGER_DIV, UNARY_NEGATIVE, CALL_PROCEDURE,\
+    RETURN, COMPARE_EQUAL, COMPARE_NOT_EQUAL, COMPARE_LESS, COMPARE_LESS_EQUAL, COMPARE_GREATER,\
+    COMPARE_GREATER_EQUAL, UNARY_NOT, JUMP, POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE, JUMP_IF_FALSE_OR_POP,\
+    JUMP_IF_TRUE_OR_POP, GET_RANGE, FOR_ITER, FOR_NEXT, TO_REAL = range(31)
+
+OPNAMES = (
+    "LOAD_FAST", "STORE_FAST", "LOAD_GLOBAL", "STORE_GLOBAL", "LOAD_DEREF", "STORE_DEREF", "LOAD_CONST",
+    "BINARY_ADD", "BINARY_SUBTRACT", "BINARY_MULTIPLY", "BINARY_FLOAT_DIV", "BINARY_INTEGER_DIV", "UNARY_NEGATIVE",
+    "CALL_PROCEDURE", "RETURN", "COMPARE_EQUAL", "COMPARE_NOT_EQUAL", "COMPARE_LESS", "COMPARE_LESS_EQUAL",
+    "COMPARE_GREATER", "COMPARE_GREATER_EQUAL", "UNARY_NOT", "JUMP", "POP_JUMP_IF_FALSE", "POP_JUMP_IF_TRUE",
+    "JUMP_IF_FALSE_OR_POP", "JUMP_IF_TRUE_OR_POP", "GET_RANGE", "FOR_ITER", "FOR_NEXT", "TO_REAL"
+)
+
+BINARY_OPCODES = {
+    PLUS: BINARY_ADD,
+    MINUS: BINARY_SUBTRACT,
+    MULTIPLY: BINARY_MULTIPLY,
+    FLOAT_DIV: BINARY_FLOAT_DIV,
+    INTEGER_DIV: BINARY_INTEGER_DIV,
+    EQUAL: COMPARE_EQUAL,
+    NOT_EQUAL: COMPARE_NOT_EQUAL,
+    LESS_THAN: COMPARE_LESS,
+    LESS_EQUAL: COMPARE_LESS_EQUAL,
+    GREATER_THAN: COMPARE_GREATER,
+    GREATER_EQUAL: COMPARE_GREATER_EQUAL,
+}
+
+JUMP_OPCODES = (JUMP, POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, FOR_ITER,
+                FOR_NEXT)
+
+
+GLOBAL_SCOPE_LEVEL = 1
+
+
+class Code(object):
+    def __init__(self, name, level, names, frame_size, param_slots=()):
+        self.name = name
+        self.level = level
+        self.names = names
+        self.slot_names = list(names) + ["-"] * (frame_size - len(names))
+        self.frame_size = frame_size
+        self.param_slots = param_slots
+        self.blank_frame = (None,) * frame_size
+        self.instructions = []
+        self.blocks = [self.instructions]
+        self.constants = ()
+        self.procedures = []
+        self.pool = []
+
+    def __str__(self):
+        lines = ["Code %s (level %d, %d slots)" % (self.name, self.level, self.frame_size)]
+        labels = {id(block): index for index, block in enumerate(self.blocks)}
+        pc = 0
+        for block in self.blocks:
+            lines.append("  block %d:" % labels[id(block)])
+            for op, arg in block:
+                lines.append(self.format_instruction(pc, op, arg, labels))
+                pc += 1
+        for procedure in self.procedures:
+            lines.append("")
+            lines.append(str(procedure))
+        return "\n".join(lines)
+
+    def format_instruction(self, pc, op, arg, labels):
+        if op == LOAD_CONST:
+            return "%4d %-20s %d (%r)" % (pc, OPNAMES[op], arg, self.constants[arg])
+        elif op in (LOAD_FAST, STORE_FAST):
+            return "%4d %-20s %d (%s)" % (pc, OPNAMES[op], arg, self.slot_names[arg])
+        elif op in (LOAD_GLOBAL, STORE_GLOBAL, GET_RANGE):
+            return "%4d %-20s %d" % (pc, OPNAMES[op], arg)
+        elif op in (LOAD_DEREF, STORE_DEREF):
+            level, slot, name = arg
+            return "%4d %-20s %d.%d (%s)" % (pc, OPNAMES[op], level, slot, name)
+        elif op == CALL_PROCEDURE:
+            return "%4d %-20s %s" % (pc, OPNAMES[op], arg.name)
+        elif op in JUMP_OPCODES:
+            return "%4d %-20s block %d" % (pc, OPNAMES[op], labels[id(arg)])
+        return "%4d %s" % (pc, OPNAMES[op])
+
+    __repr__ = __str__
+
+
+class BytecodeCompiler(NodeVisitor):
+    def __init__(self):
+        self.code = None
+        self.global_code = None
+        self.instructions = []
+        self.constants = []
+        self._constant_index = {}
+        self._procedures = {}
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def emit(self, op, arg=0):
+        self.instructions.append((op, arg))
+
+    def new_block(self):
+        return []
+
+    def use_block(self, block):
+        if not self.instructions or self.instructions[-1][0] not in (JUMP, RETURN):
+            self.emit(JUMP, block)
+        self.code.blocks.append(block)
+        self.instructions = block
+
+    def emit_variable(self, var_node, fast_op, global_op, deref_op):
+        level, slot = var_node.address
+        if level == self.code.level:
+            self.code.slot_names[slot] = var_node.value
+            self.emit(fast_op, slot)
+        elif level == GLOBAL_SCOPE_LEVEL:
+            self.global_code.slot_names[slot] = var_node.value
+            self.emit(global_op, slot)
+        else:
+            self.emit(deref_op, (level, slot, var_node.value))
+
+    def compile_body(self, code, node):
+        enclosing = self.code, self.instructions, self.constants, self._constant_index
+        self.code = code
+        self.instructions = code.instructions
+        self.constants = []
+        self._constant_index = {}
+        self.visit(node)
+        self.emit(RETURN)
+        code.constants = tuple(self.constants)
+        self.code, self.instructions, self.constants, self._constant_index = enclosing
+        return code
+
+    def compile(self, tree):
+        return self.visit(tree)
+
+    def visit_Program(self, node):
+        code = self.global_code = Code(node.program_name, GLOBAL_SCOPE_LEVEL, node.var_names, node.frame_size)
+        return self.compile_body(code, node.block_node)
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        self.visit(node.compound_statement)
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_ProcedureDecl(self, node):
+        code = Code(node.proc_name, self.code.level + 1, node.var_names, node.frame_size,
+                    tuple(param.var_node.address[1] for param in node.params))
+        self._procedures[node.block_node] = code
+        self.code.procedures.append(code)
+        self.compile_body(code, node.block_node)
+
+    def visit_ProcedureCall(self, node):
+        for param in node.actual_params:
+            self.visit(param)
+        self.emit(CALL_PROCEDURE, self._procedures[node.proc_symbol.block_ast])
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Assign(self, node):
+        self.visit(node.right)
+        self.emit_variable(node.left, STORE_FAST, STORE_GLOBAL, STORE_DEREF)
+
+    def visit_If(self, node):
+        end = self.new_block()
+        self.visit(node.condition)
+        if node.else_statement is None:
+            self.emit(POP_JUMP_IF_FALSE, end)
+            self.visit(node.then_statement)
+        else:
+            orelse = self.new_block()
+            self.emit(POP_JUMP_IF_FALSE, orelse)
+            self.visit(node.then_statement)
+            self.emit(JUMP, end)
+            self.use_block(orelse)
+            self.visit(node.else_statement)
+        self.use_block(end)
+
+    def visit_While(self, node):
+        body = self.new_block()
+        test = self.new_block()
+        self.emit(JUMP, test)
+        self.use_block(body)
+        self.visit(node.body)
+        self.use_block(test)
+        self.visit(node.condition)
+        self.emit(POP_JUMP_IF_TRUE, body)
+
+    def visit_For(self, node):
+        body = self.new_block()
+        end = self.new_block()
+        self.visit(node.start)
+        self.visit(node.stop)
+        self.emit(GET_RANGE, node.step)
+        self.emit(FOR_ITER, end)
+        self.use_block(body)
+        self.emit_variable(node.var_node, STORE_FAST, STORE_GLOBAL, STORE_DEREF)
+        self.visit(node.body)
+        self.emit(FOR_NEXT, body)
+        self.use_block(end)
+
+    def visit_Var(self, node):
+        self.emit_variable(node, LOAD_FAST, LOAD_GLOBAL, LOAD_DEREF)
+
+    def visit_Num(self, node):
+        self.emit(LOAD_CONST, self.constant(node.value))
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.expr)
+        if node.op.type == MINUS:
+            self.emit(UNARY_NEGATIVE)
+        elif node.op.type == NOT:
+            self.emit(UNARY_NOT)
+
+    def visit_ToReal(self, node):
+        self.visit(node.expr)
+        self.emit(TO_REAL)
+
+    def visit_BinOp(self, node):
+        op_type = node.op.type
+        self.visit(node.left)
+        if op_type in (AND, OR):
+            end = self.new_block()
+            self.emit(JUMP_IF_FALSE_OR_POP if op_type == AND else JUMP_IF_TRUE_OR_POP, end)
+            self.visit(node.right)
+            self.use_block(end)
+            return
+        self.visit(node.right)
+        self.emit(BINARY_OPCODES[op_type])
+
+
+class VirtualMachine(object):
+    def __init__(self, code):
+        self.code = code
+        self.GLOBAL_MEMORY = OrderedDict()
+
+    def run(self, memory):
+        code = self.code
+        global_names = code.slot_names
+        instructions = iter(code.instructions)
+        constants = code.constants
+        frame = memory
+        frames = [None, memory]
+        call_stack = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        while True:
+            for op, arg in instructions:
+                if op == LOAD_FAST:
+                    value = frame[arg]
+                    if value is None:
+                        raise NameError(repr(code.slot_names[arg]))
+                    push(value)
+                elif op == LOAD_CONST:
+                    push(constants[arg])
+                elif op == STORE_FAST:
+                    frame[arg] = pop()
+                elif op == BINARY_ADD:
+                    right = pop()
+                    stack[-1] += right
+                elif op == BINARY_SUBTRACT:
+                    right = pop()
+                    stack[-1] -= right
+                elif op == BINARY_MULTIPLY:
+                    right = pop()
+                    stack[-1] *= right
+                elif op == BINARY_FLOAT_DIV:
+                    right = pop()
+                    stack[-1] /= right
+                elif op == BINARY_INTEGER_DIV:
+                    right = pop()
+                    stack[-1] //= right
+                elif op == FOR_NEXT:
+                    value = next(stack[-1], None)
+                    if value is not None:
+                        push(value)
+                        instructions = iter(arg)
+                        break
+                    pop()
+                elif op == COMPARE_LESS:
+                    right = pop()
+                    stack[-1] = stack[-1] < right
+                elif op == COMPARE_LESS_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] <= right
+                elif op == COMPARE_GREATER:
+                    right = pop()
+                    stack[-1] = stack[-1] > right
+                elif op == COMPARE_GREATER_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] >= right
+                elif op == COMPARE_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] == right
+                elif op == COMPARE_NOT_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] != right
+                elif op == POP_JUMP_IF_FALSE:
+                    if not pop():
+                        instructions = iter(arg)
+                        break
+                elif op == POP_JUMP_IF_TRUE:
+                    if pop():
+                        instructions = iter(arg)
+                        break
+                elif op == JUMP:
+                    instructions = iter(arg)
+                    break
+                elif op == LOAD_GLOBAL:
+                    value = memory[arg]
+                    if value is None:
+                        raise NameError(repr(global_names[arg]))
+                    push(value)
+                elif op == STORE_GLOBAL:
+                    memory[arg] = pop()
+                elif op == LOAD_DEREF:
+                    level, slot, name = arg
+                    value = frames[level][slot]
+                    if value is None:
+                        raise NameError(repr(name))
+                    push(value)
+                elif op == STORE_DEREF:
+                    level, slot, name = arg
+                    frames[level][slot] = pop()
+                elif op == UNARY_NEGATIVE:
+                    stack[-1] = -stack[-1]
+                elif op == UNARY_NOT:
+                    stack[-1] = not stack[-1]
+                elif op == TO_REAL:
+                    stack[-1] = float(stack[-1])
+                elif op == JUMP_IF_FALSE_OR_POP:
+                    if not stack[-1]:
+                        instructions = iter(arg)
+                        break
+                    pop()
+                elif op == JUMP_IF_TRUE_OR_POP:
+                    if stack[-1]:
+                        instructions = iter(arg)
+                        break
+                    pop()
+                elif op == GET_RANGE:
+                    stop = pop()
+                    start = pop()
+                    push(iter(range(start, stop + arg, arg)))
+                elif op == FOR_ITER:
+                    value = next(stack[-1], None)
+                    if value is None:
+                        pop()
+                        instructions = iter(arg)
+                        break
+                    push(value)
+                elif op == CALL_PROCEDURE:
+                    callee = arg
+                    pool = callee.pool
+                    callee_frame = pool.pop() if pool else [None] * callee.frame_size
+                    for slot in reversed(callee.param_slots):
+                        callee_frame[slot] = pop()
+                    level = callee.level
+                    if level < len(frames):
+                        saved_frame = frames[level]
+                        frames[level] = callee_frame
+                    else:
+                        saved_frame = None
+                        frames.append(callee_frame)
+                    call_stack.append((code, instructions, frame, saved_frame))
+                    code = callee
+                    instructions = iter(code.instructions)
+                    constants = code.constants
+                    frame = callee_frame
+                    break
+                elif op == RETURN:
+                    if not call_stack:
+                        return
+                    frame[:] = code.blank_frame
+                    code.pool.append(frame)
+                    caller, instructions, frame, saved_frame = call_stack.pop()
+                    frames[code.level] = saved_frame
+                    code = caller
+                    constants = code.constants
+                    break
+
+    def interpret(self):
+        memory = [None] * self.code.frame_size
+        self.run(memory)
+        self.GLOBAL_MEMORY = OrderedDict(
+            (name, value) for name, value in zip(self.code.names, memory) if value is not None
+        )